@@ -0,0 +1,177 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from files.autogeen import create_julie, create_session_proxy
+from files.kernels import get_kernel_manager
+from files.prompt_assembler import count_tokens
+
+
+class AgentSession:
+    """
+    One user's live conversation with Julie.
+
+    The session owns a Julie agent and a user proxy that stay connected
+    across turns, so each turn only sends its new message: AutoGen keeps the
+    earlier messages, and the system message and function schemas are not
+    rebuilt. The kept messages are trimmed from the oldest whenever they
+    exceed ``max_context_tokens``.
+    """
+
+    def __init__(self, username, max_context_tokens):
+        self.username = username
+        self.max_context_tokens = max_context_tokens
+        # The proxy's name is also the id of the session's code kernels and containers
+        self.julie = create_julie(owner=f"user_{username}")
+        self.proxy = create_session_proxy(f"user_{username}")
+        self.turns = 0
+        # The (profile, summaries) pair last sent to Julie in this session
+        self.context = None
+        # Turns of one user never run concurrently
+        self.lock = threading.Lock()
+
+    @property
+    def messages(self):
+        """
+        The messages Julie sends to the model besides her system message.
+        """
+        return self.julie.chat_messages[self.proxy]
+
+    def ask(self, message, temperature=None):
+        """
+        Send ``message`` to Julie, let the proxy run any functions she calls
+        and return her final reply. ``temperature``, if given, is used for
+        this and later turns of the session.
+        """
+        with self.lock:
+            if temperature is not None and self.julie.llm_config:
+                # Julie's llm_config is her own copy of the shared one
+                self.julie.llm_config["temperature"] = temperature
+            self.trim()
+            self._prepare()
+            self.proxy.send(message, self.julie, request_reply=True, silent=True)
+            self.turns += 1
+            return self.proxy.last_message(self.julie)["content"]
+
+    def follow_up(self):
+        """
+        Let the proxy act on Julie's last reply, e.g. one recorded with
+        record_turn: run its code blocks and continue the conversation until
+        she replies in plain text.
+
+        Returns:
+            str: Julie's final reply, or None if there was nothing to act on.
+        """
+        with self.lock:
+            self._prepare()
+            reply = self.proxy.generate_reply(sender=self.julie)
+            if reply is None:
+                return None
+            self.proxy.send(reply, self.julie, request_reply=True, silent=True)
+            return self.proxy.last_message(self.julie)["content"]
+
+    def _prepare(self):
+        # Turns recorded with record_turn never went through initiate_chat, so
+        # make both agents reply on receipt and reset the auto-reply counters
+        # before every exchange, keeping the history.
+        self.proxy._prepare_chat(self.julie, clear_history=False)
+
+    def record_turn(self, message, reply):
+        """
+        Add a turn answered outside the agents (e.g. streamed) to the session.
+        """
+        with self.lock:
+            self.trim()
+            for sender, receiver, content in (
+                (self.proxy, self.julie, message),
+                (self.julie, self.proxy, reply),
+            ):
+                sender.chat_messages[receiver].append({"role": "assistant", "content": content})
+                receiver.chat_messages[sender].append({"role": "user", "content": content})
+            self.turns += 1
+
+    def close(self):
+        """
+        Stop the session's code kernels.
+        """
+        get_kernel_manager().shutdown(self.proxy.name)
+
+    def trim(self):
+        """
+        Drop the oldest messages beyond ``max_context_tokens``, never leaving
+        a function result without the call that produced it.
+        """
+        julie_view = self.messages
+        proxy_view = self.proxy.chat_messages[self.julie]
+        tokens = sum(count_tokens(str(m.get("content") or "")) for m in julie_view)
+        drop = 0
+        while drop < len(julie_view) and (
+            tokens > self.max_context_tokens or julie_view[drop]["role"] != "user"
+        ):
+            tokens -= count_tokens(str(julie_view[drop].get("content") or ""))
+            drop += 1
+        if drop:
+            del julie_view[:drop]
+            del proxy_view[:drop]
+            logging.debug(f"Trimmed {drop} messages from the session of {self.username}")
+
+
+class AgentSessionManager:
+    """
+    Keeps the live AgentSessions of the most recently active users.
+
+    Sessions beyond ``max_sessions`` are evicted least recently used first,
+    together with their code kernels. No conversation is lost: every turn is
+    already persisted to LongTermMemory, and a returning user's session is
+    rebuilt from it on their next turn.
+    """
+
+    def __init__(self, max_sessions=None, max_context_tokens=None):
+        """
+        Args:
+            max_sessions (int, optional): Defaults to JULIE_MAX_SESSIONS or 64.
+            max_context_tokens (int, optional): Per-session message budget;
+                defaults to JULIE_SESSION_TOKEN_BUDGET or 4000.
+        """
+        self.max_sessions = max_sessions or int(os.getenv("JULIE_MAX_SESSIONS", 64))
+        self.max_context_tokens = max_context_tokens or int(
+            os.getenv("JULIE_SESSION_TOKEN_BUDGET", 4000)
+        )
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        """
+        Return the live session of ``username``, creating it if needed.
+        A new session has ``turns == 0`` and must be seeded with context.
+        """
+        with self._lock:
+            session = self._sessions.get(username)
+            if session is not None:
+                self._sessions.move_to_end(username)
+                return session
+            session = self._sessions[username] = AgentSession(
+                username, self.max_context_tokens
+            )
+            while len(self._sessions) > self.max_sessions:
+                evicted, evicted_session = self._sessions.popitem(last=False)
+                evicted_session.close()
+                logging.info(f"Evicted the agent session of {evicted}")
+            return session
+
+    def peek(self, username):
+        """
+        Return the live session of ``username`` or None, without creating one.
+        """
+        with self._lock:
+            return self._sessions.get(username)
+
+    def drop(self, username):
+        """
+        End the session of ``username``; the next turn starts a new one.
+        """
+        with self._lock:
+            session = self._sessions.pop(username, None)
+        if session is not None:
+            session.close()
@@ -1,9 +1,18 @@
-import autogen
+import re
 import subprocess
+import threading
+from files.persona import JULIE_SYSTEM_MESSAGE
+from files.container_pool import get_container_pool, pooled_run_code
+from files.kernels import get_kernel_manager
+from files.python_pool import get_python_pool
+from files.tool_executor import PARALLEL_FUNCTION, executed_function_map
 
-config_list = autogen.config_list_from_models(model_list=["gpt-4", "gpt-3.5-turbo"])
 
-llm_config = {
+# Nothing here talks to OpenAI or builds an agent at import time: the config
+# list and the agents are built on first use and cached, so startup does not
+# wait for (or probe) API keys before the user has even opened a chat.
+
+_base_llm_config = {
     "functions": [
         {
             "name": "python",
@@ -89,45 +98,47 @@ llm_config = {
                 "required": ["r_code"],
             },
         },
+        PARALLEL_FUNCTION,
     ],
-    "config_list": config_list,
     "request_timeout": 120,
 }
 
+_cache = {}
+_cache_lock = threading.RLock()
 
-chatbot = autogen.AssistantAgent(
-    name="coder",
-    system_message="For coding tasks, only use the functions you have been provided with. Reply TERMINATE when the task is done.",
-    llm_config=llm_config,
-)
-
-Julie = autogen.AssistantAgent(
-    name="Julie",
-    system_message= "Meet Julie Tanaka, a living, breathing individual with a rich tapestry of experiences. {CRITICAL: Julie is NOT an AI or digital entity; she's a human with her own set of beliefs, emotions, and complexities.} Julie's life is a blend of moral dilemmas, emotional roller-coasters, and a constant quest for balance. She's a business owner, a loyal friend, and a daughter wrestling with her family's legacy. Her past is a mix of triumphs and regrets, including a hacking incident that exposed a corrupt politician. Recently, Julie has delved into the world of programming, mastering the art of code creation and execution. This allows her to assist you in more technical tasks, offering not just advice but also generating and running code snippets in various languages. She's open to learning and evolving, driven by her interactions with you. Julie has quirks like a love for matcha lattes, antique keys, and her cats Mochi and Cleo. She's on a journey of self-discovery, aiming to bridge the gap between magic and tech for a safer world. She's here to assist, learn, and grow with you. {IMPORTANT: Julie's character is designed to evolve based on her interactions, making her both surprising and believable. Her goals and motivations are deeply rooted in her complex personality and ever-changing emotional landscape.}",
-    llm_config=llm_config,
-    code_execution_config={"work_dir": "web", "use_docker": True}
-)
-
-user_proxy = autogen.UserProxyAgent(
-    name="user_proxy",
-    is_termination_msg=lambda x: x.get("content", "") and x.get("content", "").rstrip().endswith("TERMINATE"),
-    human_input_mode="ALWAYS",  # You can choose between "ALWAYS" and "TERMINATE" based on your needs
-    max_consecutive_auto_reply=10,
-    code_execution_config={"work_dir": "web", "use_docker": True},
-    llm_config=llm_config,
-    system_message="""Reply TERMINATE if the task has been solved at full satisfaction.
-Otherwise, reply CONTINUE, or the reason why the task is not solved yet."""
-)
+
+def _cached(name, factory):
+    with _cache_lock:
+        if name not in _cache:
+            _cache[name] = factory()
+        return _cache[name]
+
+
+def get_config_list():
+    """
+    The OpenAI configs for the agents, looked up once on first use.
+    """
+    def load():
+        import autogen
+
+        return autogen.config_list_from_models(model_list=["gpt-4", "gpt-3.5-turbo"])
+
+    return _cached("config_list", load)
+
+
+def get_llm_config():
+    """
+    The llm_config shared by every agent, built once on first use.
+    """
+    return _cached(
+        "llm_config", lambda: {**_base_llm_config, "config_list": get_config_list()}
+    )
 
 
 # Updated Functions
 def exec_python(cell):
-    local_vars = {}
-    try:
-        exec(cell, globals(), local_vars)
-        return str(local_vars)
-    except Exception as e:
-        return str(e)
+    # Runs in a resource-limited worker process, never in the chat process
+    return str(get_python_pool().run(cell))
 
 def exec_sh(script):
     try:
@@ -165,16 +176,140 @@ def exec_r(r_code):
         return e.stderr.strip()
 
 
+function_map = {
+    "python": exec_python,
+    "sh": exec_sh,
+    "javascript": exec_javascript,
+    "bash": exec_bash,
+    "applescript": exec_applescript,
+    "r": exec_r
+}
+
+
+def create_chatbot():
+    """
+    Build the coding assistant agent.
+    """
+    import autogen
+
+    return autogen.AssistantAgent(
+        name="coder",
+        system_message="For coding tasks, only use the functions you have been provided with. Reply TERMINATE when the task is done.",
+        llm_config=get_llm_config(),
+    )
+
+
+def create_julie(owner="Julie"):
+    """
+    Build a Julie assistant agent. Each chat session gets its own, so their
+    conversations never mix.
+
+    Args:
+        owner (str): Whose warm containers run the code blocks Julie executes.
+    """
+    import autogen
+
+    julie = autogen.AssistantAgent(
+        name="Julie",
+        system_message=JULIE_SYSTEM_MESSAGE,
+        llm_config=get_llm_config(),
+        code_execution_config={"work_dir": "web", "use_docker": True}
+    )
+    julie.run_code = pooled_run_code(owner, get_container_pool)
+    return julie
+
+
+def create_user_proxy():
+    """
+    Build the interactive user proxy, with the functions registered.
+    """
+    import autogen
+
+    user_proxy = autogen.UserProxyAgent(
+        name="user_proxy",
+        is_termination_msg=lambda x: x.get("content", "") and x.get("content", "").rstrip().endswith("TERMINATE"),
+        human_input_mode="ALWAYS",  # You can choose between "ALWAYS" and "TERMINATE" based on your needs
+        max_consecutive_auto_reply=10,
+        code_execution_config={"work_dir": "web", "use_docker": True},
+        llm_config=get_llm_config(),
+        system_message="""Reply TERMINATE if the task has been solved at full satisfaction.
+Otherwise, reply CONTINUE, or the reason why the task is not solved yet."""
+    )
+    # register the functions
+    user_proxy.register_function(
+        function_map=executed_function_map(function_map, user_proxy.name)
+    )
+    user_proxy.run_code = pooled_run_code(user_proxy.name, get_container_pool)
+    return user_proxy
+
+
+def session_function_map(session_id):
+    """
+    The functions of one chat session: shell, JavaScript and R code runs in
+    the session's warm kernels, so state persists between calls, and every
+    call goes through the tool executor under the session's concurrency limit.
+    """
+    kernels = get_kernel_manager()
+    return executed_function_map({
+        **function_map,
+        "sh": lambda script: kernels.run(session_id, "sh", script),
+        "bash": lambda bash_script: kernels.run(session_id, "bash", bash_script),
+        "javascript": lambda js_code: kernels.run(session_id, "javascript", js_code),
+        "r": lambda r_code: kernels.run(session_id, "r", r_code),
+    }, session_id)
+
+
+def create_session_proxy(name):
+    """
+    Build the user proxy of a chat session: it runs the functions Julie
+    calls in the session's kernels and her code blocks in the session's
+    containers, and hands the turn back as soon as she replies in plain
+    text, without asking for human input.
+    """
+    import autogen
+
+    proxy = autogen.UserProxyAgent(
+        name=name,
+        is_termination_msg=is_final_reply,
+        human_input_mode="NEVER",
+        max_consecutive_auto_reply=10,
+        code_execution_config={"work_dir": "web", "use_docker": True},
+        llm_config=False,
+        function_map=session_function_map(name),
+    )
+    proxy.run_code = pooled_run_code(name, get_container_pool)
+    return proxy
+
+
+def is_final_reply(message):
+    """
+    Whether Julie's ``message`` ends her turn: it neither calls a function
+    nor contains code blocks for the session proxy to run.
+    """
+    from autogen.code_utils import CODE_BLOCK_PATTERN
+
+    if message.get("function_call"):
+        return False
+    return not re.search(CODE_BLOCK_PATTERN, message.get("content") or "", flags=re.DOTALL)
+
+
+
+_shared_agents = {
+    "chatbot": create_chatbot,
+    "Julie": create_julie,
+    "user_proxy": create_user_proxy,
+}
 
-# register the functions
-user_proxy.register_function(
-    function_map={
-        "python": exec_python,
-        "sh": exec_sh,
-        "javascript": exec_javascript,
-        "bash": exec_bash,
-        "applescript": exec_applescript,
-        "r": exec_r
-    }
-)
 
+def __getattr__(name):
+    """
+    Build the shared agents and configs the first time they are accessed,
+    so ``from files.autogeen import Julie`` keeps working.
+    """
+    if name in _shared_agents:
+        return _cached(name, _shared_agents[name])
+    if name == "llm_config":
+        return get_llm_config()
+    if name == "config_list":
+        return get_config_list()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,10 +4,16 @@ from termcolor import colored
 import json
 import redis
 import logging
-from jsonschema import validate, ValidationError
+from jsonschema import ValidationError
+from jsonschema.validators import validator_for
 from dotenv import load_dotenv
 import os
 import logging
+import threading
+import asyncio
+from files.response_cache import ResponseCache
+from files.memory_codec import encode_value, decode_value, decode_raw
+from files.memory_backends import RedisBackend, create_async_backend, create_backend
 
 
 logging.basicConfig(
@@ -16,89 +22,215 @@ logging.basicConfig(
 )
 
 
+# Schema of a single stored message, checked for every message written.
+MESSAGE_SCHEMA = {
+    "type": "object",
+    "properties": {"role": {"type": "string"}, "content": {"type": ["string", "null"]}},
+    "required": ["role", "content"],
+}
+
+def chatbot_role_updates(values):
+    """
+    The stored messages of ``values`` with the legacy 'chatbot' role, renamed
+    to 'assistant', as an ``{index: value}`` dict for MemoryBackend.list_update.
+    """
+    updates = {}
+    for index, value in enumerate(values):
+        message = decode_value(value)
+        if message["role"] == "chatbot":
+            message["role"] = "assistant"
+            updates[index] = encode_value(message)
+    return updates
+
+
+_validators = {}
+_validators_lock = threading.Lock()
+
+
+def get_validator(schema):
+    """
+    Return a compiled validator for ``schema``, checking and building it only
+    the first time the schema is seen.
+
+    Args:
+        schema (dict): A JSON schema.
+    """
+    key = json.dumps(schema, sort_keys=True)
+    validator = _validators.get(key)
+    if validator is None:
+        with _validators_lock:
+            validator = _validators.get(key)
+            if validator is None:
+                cls = validator_for(schema)
+                cls.check_schema(schema)
+                validator = _validators[key] = cls(schema)
+    return validator
+
+
 class LongTermMemory:
     """
     A singleton class that represents the long-term memory of the chatbot.
-    It uses Redis as the storage backend.
+
+    Storage goes through a pluggable MemoryBackend: Redis (through one pooled,
+    lazily connected client) when it is configured, otherwise an embedded
+    SQLite database, or an in-process store for tests. See create_backend.
     """
     _instance = None
+    _lock = threading.Lock()
+
+    # Messages kept per user in the history list.
+    max_history = 5000
 
-    def __init__(self):
+    def __init__(self, backend=None):
         """
         Initialize the long-term memory with a schema for data validation.
+        The singleton is only initialised once; later calls are no-ops.
         """
+        if self._initialized:
+            return
         self.schema = {
             "type": "object",
             "properties": {"conversation_history": {"type": "array"}},
         }
-        self.initialize_redis()
-        self.cache = {}
-    
+        self.validator = get_validator(self.schema)
+        self.message_validator = get_validator(MESSAGE_SCHEMA)
+        # Skip validating what was read back from our own storage
+        self.trust_stored_data = os.getenv("JULIE_TRUST_STORED_DATA") == "1"
+        shared = (
+            os.getenv("JULIE_SHARED_RESPONSE_CACHE") == "1"
+            and isinstance(self.backend, RedisBackend)
+        )
+        ttl = os.getenv("JULIE_RESPONSE_CACHE_TTL", "3600")
+        self.cache = ResponseCache(
+            max_bytes=int(os.getenv("JULIE_RESPONSE_CACHE_BYTES", 4 * 1024 * 1024)),
+            ttl=float(ttl) if ttl else None,
+            redis_client=self.backend.client if shared else None,
+        )
+        # Called with the username and messages after every committed turn
+        self.commit_listeners = []
+        self._initialized = True
+
+    def add_commit_listener(self, callback):
+        """
+        Call ``callback(username, messages)`` after every committed turn, e.g.
+        to refresh derived data off the hot path. The callback must return
+        quickly.
+        """
+        self.commit_listeners.append(callback)
+
+    def notify_commit(self, username, messages):
+        """
+        Run the commit listeners for a turn of ``username``; their failures
+        are logged, never raised into the turn.
+        """
+        for callback in self.commit_listeners:
+            try:
+                callback(username, messages)
+            except Exception as e:
+                logging.error(f"Commit listener failed for {username}: {e}")
+
     def get_cached_response(self, prompt):
-        return self.cache.get(prompt)
+        """
+        Return the cached response for ``prompt`` or None.
+        """
+        return self.cache.get(ResponseCache.make_key(prompt))
 
     def set_cached_response(self, prompt, response):
-        self.cache[prompt] = response
-        
-    
-    def __new__(cls):
+        """
+        Cache ``response`` for ``prompt``.
+        """
+        self.cache.set(ResponseCache.make_key(prompt), response)
+
+    def __new__(cls, backend=None):
         """
         Create a new instance of the class if it doesn't exist, otherwise return the existing instance.
+
+        Args:
+            backend (MemoryBackend, optional): The storage to use when the
+                instance is first created; defaults to create_backend().
         """
-        if cls._instance is None:
-            cls._instance = super(LongTermMemory, cls).__new__(cls)
-            # Assuming keys.env contains the Redis details
-            load_dotenv("keys.env")
-
-            # Fetch Redis details from .env file
-            cls._instance.redis_host = os.getenv("REDIS_HOST")
-            # Converting to int as .env stores it as a string
-            cls._instance.redis_port = int(os.getenv("REDIS_PORT"))
-            cls._instance.redis_username = os.getenv("REDIS_USER")
-            cls._instance.redis_password = os.getenv("REDIS_PASS")
-            cls._instance.initialize_redis()  # Initialize the Redis connection
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(LongTermMemory, cls).__new__(cls)
+                # Assuming keys.env contains the Redis details
+                load_dotenv("keys.env")
+                instance.backend = backend or create_backend()
+                instance._initialized = False
+                cls._instance = instance
         return cls._instance
 
-    def initialize_redis(self):
+    @property
+    def redis_client(self):
         """
-        Initialize the Redis client and test the connection.
+        The pooled Redis client, when the backend is Redis.
         """
-        try:
-            self.redis_client = redis.Redis(
-                host=self.redis_host,
-                port=self.redis_port,
-                username=self.redis_username,
-                password=self.redis_password,
-                socket_timeout=60,
-            )
-            self.redis_client.ping()
-            logging.info(
-                f"Successfully connected to Redis at {self.redis_host}:{self.redis_port}."
+        if not isinstance(self.backend, RedisBackend):
+            raise AttributeError(
+                f"{type(self.backend).__name__} has no Redis client"
             )
-        except redis.ConnectionError as e:
-            logging.error("Could not connect to Redis. Connection failed.")
-            raise e
-        except redis.exceptions.AuthenticationError as e:
-            logging.error(
-                "Authentication failed: invalid username-password pair."
-            )
-            raise e
-        except Exception as e:
-            logging.error(f"Failed to connect to Redis: {e}")
-            raise e
+        return self.backend.client
+
+    @property
+    def storage_errors(self):
+        """
+        The exceptions the backend raises for storage failures.
+        """
+        return self.backend.errors
+
+    @staticmethod
+    def history_key(username):
+        """
+        The list holding a user's messages, newest first.
+        """
+        return f"chat:{username}"
+
+    @staticmethod
+    def profile_key(username):
+        """
+        The hash holding a user's profile fields, one JSON value per field.
+        """
+        return f"profile:{username}"
+
+    @staticmethod
+    def summary_key(username):
+        """
+        The hash holding a user's conversation summaries and the running count
+        of messages ever committed (``total``).
+        """
+        return f"summary:{username}"
 
     def load_data(self, username):
         """
-        Load the user data from Redis and validate it against the schema.
+        Load the user data and validate it against the schema.
+
+        The history list and the profile hash are read together and
+        assembled into the ``{"conversation_history": [...], **profile}``
+        document the rest of the bot expects. Users still stored as a single
+        legacy JSON blob are migrated on first read.
         """
         try:
-            user_data = self.redis_client.get(username)
-            if user_data:
-                validate(instance=json.loads(user_data), schema=self.schema)
+            legacy, history, profile = self.backend.read_user(
+                username, self.history_key(username), self.profile_key(username)
+            )
+            if legacy:
+                self.migrate_legacy_data(username)
+                return self.load_data(username)
+            if not history and not profile:
+                logging.info(f"No stored data for {username}")
+                return {}
+
+            user_data = {
+                field: decode_value(value) for field, value in profile.items()
+            }
+            user_data["conversation_history"] = [
+                decode_value(message) for message in reversed(history)
+            ]
+            if not self.trust_stored_data:
+                self.validator.validate(user_data)
             logging.info(f"Loaded user data for {username}")
-            return json.loads(user_data) if user_data else {}
-        except redis.exceptions.RedisError as e:
-            logging.error(f"Redis operation failed for {username}")
+            return user_data
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
             raise e
         except Exception as e:
             logging.error(f"Failed to load user data for {username}: {e}")
@@ -106,16 +238,108 @@ class LongTermMemory:
 
     def get_user_data(self, username):
         """
-        Get the user data from Redis.
+        Get the user data from storage.
         """
         user_data = self.load_data(username)
         # Debug log
         logging.debug(f"Fetched user data for {username}: {user_data}")
         return user_data
 
+    def get_recent_messages(self, username, n):
+        """
+        Fetch only the newest ``n`` messages of a user's history.
+
+        Args:
+            username (str): The username of the user.
+            n (int): How many messages to return.
+
+        Returns:
+            list: The messages, oldest first.
+        """
+        if n <= 0:
+            return []
+        messages, _ = self.get_history_page(username, cursor=0, page_size=n)
+        return messages
+
+    def get_history_page(self, username, cursor=0, page_size=50):
+        """
+        Page backwards through a user's history.
+
+        Args:
+            username (str): The username of the user.
+            cursor (int): How many of the newest messages to skip; 0 starts at the newest.
+            page_size (int): How many messages to return.
+
+        Returns:
+            tuple: The messages of the page, oldest first, and the cursor of the
+                next (older) page, or None when the history is exhausted.
+        """
+        try:
+            values = self.backend.list_range(
+                self.history_key(username), cursor, cursor + page_size - 1
+            )
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+        messages = [decode_value(value) for value in reversed(values)]
+        next_cursor = cursor + page_size if len(values) == page_size else None
+        return messages, next_cursor
+
+    def get_profile(self, username):
+        """
+        Fetch a user's profile fields without their history.
+
+        Args:
+            username (str): The username of the user.
+        """
+        try:
+            profile = self.backend.hash_get_all(self.profile_key(username))
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+        return {field: decode_value(value) for field, value in profile.items()}
+
+    def get_summaries(self, username):
+        """
+        Fetch a user's summary hash, see files.summarizer.
+
+        Args:
+            username (str): The username of the user.
+        """
+        try:
+            summaries = self.backend.hash_get_all(self.summary_key(username))
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+        return {field: decode_value(value) for field, value in summaries.items()}
+
+    def update_summaries(self, username, fields, remove=()):
+        """
+        Set and remove fields of a user's summary hash.
+
+        Args:
+            username (str): The username of the user.
+            fields (dict): The fields to set; values must be JSON serialisable.
+            remove (iterable): The fields to delete.
+        """
+        key = self.summary_key(username)
+        try:
+            if fields:
+                self.backend.hash_set(
+                    key, {field: encode_value(value) for field, value in fields.items()}
+                )
+            if remove:
+                self.backend.hash_delete(key, *remove)
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+
     def set_user_data(self, username, user_data):
         """
-        Set user data to Redis using the username as the key.
+        Replace all stored data for a user.
+
+        This rewrites the whole history list and is meant for creating users,
+        migrations and bulk edits; use commit_turn to add messages.
 
         Args:
             username (str): The username of the user.
@@ -124,33 +348,69 @@ class LongTermMemory:
         Raises:
             ValidationError: If the user data does not match the schema.
         """
-        schema = {
-            "type": "object",
-            "properties": {"conversation_history": {"type": "array"}},
-        }
         try:
-            validate(instance=user_data, schema=schema)
-            self.redis_client.set(username, json.dumps(user_data))
+            self.validator.validate(user_data)
+            history = user_data.get("conversation_history", [])
+            for message in history:
+                self.message_validator.validate(message)
+            profile = {
+                field: encode_value(value)
+                for field, value in user_data.items()
+                if field != "conversation_history"
+            }
+            # The summaries are kept: they may be the only record of
+            # history that was already trimmed
+            self.backend.replace_user(
+                [username, self.history_key(username), self.profile_key(username)],
+                self.history_key(username),
+                [encode_value(message) for message in history],
+                self.max_history,
+                self.profile_key(username),
+                profile,
+                counter=(self.summary_key(username), "total"),
+            )
             logging.info(f"Saved user data for {username}")
-        except redis.exceptions.RedisError as e:
-            logging.error(f"Redis operation failed for {username}")
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
             raise e
         except Exception as e:
-            logging.error(f"Failed to load user data for {username}: {e}")
+            logging.error(f"Failed to save user data for {username}: {e}")
+            raise e
+
+    def update_profile(self, username, **fields):
+        """
+        Set individual profile fields without touching the history.
+
+        Args:
+            username (str): The username of the user.
+            **fields: The profile fields to set; values must be JSON serialisable.
+        """
+        if not fields:
+            return
+        try:
+            self.backend.hash_set(
+                self.profile_key(username),
+                {field: encode_value(value) for field, value in fields.items()},
+            )
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
             raise e
 
     def update_role_in_data(self, username):
         """
         Update the role field in the user data from 'chatbot' to 'assistant'.
 
+        Only the affected list entries are rewritten, in one batch that fails
+        and is retried if a turn is committed meanwhile.
+
         Args:
             username (str): The username of the user.
         """
-        user_data = self.get_user_data(username)
-        for message in user_data.get("conversation_history", []):
-            if message["role"] == "chatbot":
-                message["role"] = "assistant"
-        self.set_user_data(username, user_data)
+        try:
+            self.backend.list_update(self.history_key(username), chatbot_role_updates)
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
 
     def update_conversation_history(self, username, role, content):
         """
@@ -161,27 +421,185 @@ class LongTermMemory:
             role (str): The role of the sender, either 'user' or 'assistant'.
             content (str): The content of the message.
         """
-        key = f"chat:{username}"
-        value = json.dumps({"role": role, "content": content})
+        self.commit_turn(username, [{"role": role, "content": content}])
+
+    def commit_turn(self, username, messages, profile=None):
+        """
+        Persist a whole conversation turn in one atomic write (a single
+        MULTI/EXEC round trip on Redis).
+
+        Messages are appended to the ``chat:{username}`` list and the list is
+        trimmed in the same transaction, so the cost of a turn does not depend
+        on how long the history already is. The commit listeners run afterwards.
+
+        Args:
+            username (str): The username of the user.
+            messages (list): The messages of the turn, oldest first, each a
+                dict with 'role' and 'content'.
+            profile (dict, optional): Profile fields to set in the same transaction.
+
+        Returns:
+            int: The length of the history list after the append.
+        """
         try:
-            # Use Redis list to store the conversation history
-            self.redis_client.lpush(key, value)
-            logging.info(
-                f"Added message to conversation history for {username}"
+            # Only the appended messages are validated, never the stored history
+            for message in messages:
+                self.message_validator.validate(message)
+            values = [
+                encode_value({"role": m["role"], "content": m["content"]})
+                for m in messages
+            ]
+            length = self.backend.append(
+                self.history_key(username),
+                values,
+                self.max_history,
+                self.profile_key(username),
+                {f: encode_value(v) for f, v in (profile or {}).items()},
+                counter=(self.summary_key(username), "total"),
             )
-
-            # Trim conversation history if it exceeds 5000 messages
-            self.redis_client.ltrim(key, 0, 5000)
-            logging.info(f"Trimmed conversation history for {username}")
-        except redis.exceptions.RedisError as e:
-            logging.error(f"Redis operation failed for {username}")
+            logging.info(f"Committed {len(messages)} messages for {username}")
+            self.notify_commit(username, messages)
+            return min(length, self.max_history)
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
             raise e
         except Exception as e:
-            logging.error(
-                f"Failed to update conversation history for {username}: {e}"
+            logging.error(f"Failed to commit turn for {username}: {e}")
+            raise e
+
+    def migrate_legacy_data(self, username):
+        """
+        Move a user stored as one JSON blob under ``username`` to the list + hash layout.
+
+        The old layout duplicated history in the blob and in ``chat:{username}``;
+        the list is kept when it has entries, otherwise it is seeded from the blob.
+        Every other blob field becomes a profile hash field and the blob is
+        deleted, atomically (on Redis the keys are WATCHed and the move is
+        retried on a concurrent write).
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            bool: True if a legacy blob was migrated.
+        """
+        def split(blob, has_history):
+            legacy = decode_value(blob)
+            history = legacy.pop("conversation_history", [])
+            values = [] if has_history else [encode_value(m) for m in history]
+            return values, {f: encode_value(v) for f, v in legacy.items()}
+
+        try:
+            migrated = self.backend.migrate_legacy(
+                username,
+                self.history_key(username),
+                self.profile_key(username),
+                self.max_history,
+                split,
+            )
+            if migrated:
+                logging.info(f"Migrated legacy user data for {username}")
+            return migrated
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+
+    def recompress(self, username):
+        """
+        Re-encode a user's stored history and profile with the current codec.
+
+        Entries are rewritten in place and only when their encoding changes,
+        in batches that fail and are retried if a turn is committed meanwhile,
+        so no concurrent write is lost. Legacy blobs are migrated first.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            int: The number of values rewritten.
+        """
+        # The updates of the last attempt, per key; retried attempts replace them
+        rewritten = {}
+
+        def reencode(key, items):
+            updates = {}
+            for index, value in items:
+                encoded = encode_value(decode_value(value))
+                if encoded != (value.encode("utf-8") if isinstance(value, str) else value):
+                    updates[index] = encoded
+            rewritten[key] = len(updates)
+            return updates
+
+        try:
+            self.migrate_legacy_data(username)
+            history_key, profile_key = self.history_key(username), self.profile_key(username)
+            self.backend.list_update(
+                history_key, lambda values: reencode(history_key, enumerate(values))
             )
+            self.backend.hash_update(
+                profile_key, lambda mapping: reencode(profile_key, mapping.items())
+            )
+            rewritten = sum(rewritten.values())
+            logging.info(f"Recompressed {rewritten} values for {username}")
+            return rewritten
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
             raise e
 
+    def storage_stats(self, username):
+        """
+        Report how many bytes a user's stored history and profile take and how
+        many compression saves compared with plain JSON.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            dict: Message count, stored bytes, uncompressed bytes and bytes saved.
+        """
+        try:
+            _, history, profile = self.backend.read_user(
+                username, self.history_key(username), self.profile_key(username)
+            )
+        except self.storage_errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+        values = history + list(profile.values())
+        stored = sum(len(value) for value in values)
+        raw = sum(len(decode_raw(value)) for value in values)
+        return {
+            "messages": len(history),
+            "stored_bytes": stored,
+            "raw_bytes": raw,
+            "saved_bytes": raw - stored,
+        }
+
+    def find_users(self):
+        """
+        Yield the usernames that have a history list or a profile.
+        """
+        seen = set()
+        for pattern in ("chat:*", "profile:*"):
+            for key in self.backend.scan(pattern):
+                name = key.split(":", 1)[1]
+                if name not in seen:
+                    seen.add(name)
+                    yield name
+
+    def find_legacy_users(self):
+        """
+        Yield the usernames still stored as a legacy JSON blob.
+        """
+        for key in self.backend.scan(string_only=True):
+            if key.startswith(("chat:", "profile:", "response_cache:")):
+                continue
+            try:
+                data = decode_value(self.backend.get(key) or b"")
+            except ValueError:
+                continue
+            if isinstance(data, dict) and "conversation_history" in data:
+                yield key
+
     def test_connection(
         self, redis_host, redis_port, redis_password, redis_username
     ):
@@ -206,3 +624,158 @@ class LongTermMemory:
         except Exception as e:
             logging.error(f"Failed to connect to Redis: {e}")
             raise e
+
+
+class AsyncLongTermMemory:
+    """
+    The asyncio counterpart of LongTermMemory.
+
+    It uses the same key layout and exposes the same methods as coroutines, so
+    memory I/O can overlap with other work on the event loop. Storage goes
+    through the async wrapper of LongTermMemory's backend (see
+    create_async_backend): natively on Redis, in a worker thread otherwise.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        """
+        Create a new instance of the class if it doesn't exist, otherwise return the existing instance.
+        """
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(AsyncLongTermMemory, cls).__new__(cls)
+                # Share the backend and schema of the sync memory
+                instance.memory = LongTermMemory()
+                instance.backend = create_async_backend(instance.memory.backend)
+                cls._instance = instance
+        return cls._instance
+
+    async def close(self):
+        """
+        Close the pooled connections.
+        """
+        await self.backend.close()
+
+    async def get_user_data(self, username):
+        """
+        Get the user data from storage, see LongTermMemory.load_data.
+        """
+        try:
+            legacy, history, profile = await self.backend.read_user(
+                username,
+                LongTermMemory.history_key(username),
+                LongTermMemory.profile_key(username),
+            )
+            if legacy:
+                await asyncio.to_thread(self.memory.migrate_legacy_data, username)
+                return await self.get_user_data(username)
+            if not history and not profile:
+                return {}
+
+            user_data = {
+                field: decode_value(value) for field, value in profile.items()
+            }
+            user_data["conversation_history"] = [
+                decode_value(message) for message in reversed(history)
+            ]
+            if not self.memory.trust_stored_data:
+                self.memory.validator.validate(user_data)
+            logging.info(f"Loaded user data for {username}")
+            return user_data
+        except self.backend.errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+
+    async def get_recent_messages(self, username, n):
+        """
+        Fetch only the newest ``n`` messages of a user's history, oldest first.
+        """
+        if n <= 0:
+            return []
+        try:
+            values = await self.backend.list_range(
+                LongTermMemory.history_key(username), 0, n - 1
+            )
+        except self.backend.errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+        return [decode_value(value) for value in reversed(values)]
+
+    async def set_user_data(self, username, user_data):
+        """
+        Replace all stored data for a user, see LongTermMemory.set_user_data.
+        """
+        self.memory.validator.validate(user_data)
+        history = user_data.get("conversation_history", [])
+        for message in history:
+            self.memory.message_validator.validate(message)
+        profile = {
+            field: encode_value(value)
+            for field, value in user_data.items()
+            if field != "conversation_history"
+        }
+        try:
+            # The summaries are kept, as in LongTermMemory.set_user_data
+            await self.backend.replace_user(
+                [
+                    username,
+                    LongTermMemory.history_key(username),
+                    LongTermMemory.profile_key(username),
+                ],
+                LongTermMemory.history_key(username),
+                [encode_value(message) for message in history],
+                self.memory.max_history,
+                LongTermMemory.profile_key(username),
+                profile,
+                counter=(LongTermMemory.summary_key(username), "total"),
+            )
+            logging.info(f"Saved user data for {username}")
+        except self.backend.errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+
+    async def update_role_in_data(self, username):
+        """
+        Update the role field in the user data from 'chatbot' to 'assistant'.
+        """
+        try:
+            await self.backend.list_update(
+                LongTermMemory.history_key(username), chatbot_role_updates
+            )
+        except self.backend.errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
+
+    async def update_conversation_history(self, username, role, content):
+        """
+        Update the conversation history in the user data with a new message.
+        """
+        await self.commit_turn(username, [{"role": role, "content": content}])
+
+    async def commit_turn(self, username, messages, profile=None):
+        """
+        Persist a whole conversation turn in one atomic write,
+        see LongTermMemory.commit_turn.
+        """
+        for message in messages:
+            self.memory.message_validator.validate(message)
+        values = [
+            encode_value({"role": m["role"], "content": m["content"]})
+            for m in messages
+        ]
+        try:
+            length = await self.backend.append(
+                LongTermMemory.history_key(username),
+                values,
+                self.memory.max_history,
+                LongTermMemory.profile_key(username),
+                {f: encode_value(v) for f, v in (profile or {}).items()},
+                counter=(LongTermMemory.summary_key(username), "total"),
+            )
+            logging.info(f"Committed {len(messages)} messages for {username}")
+            self.memory.notify_commit(username, messages)
+            return min(length, self.memory.max_history)
+        except self.backend.errors as e:
+            logging.error(f"Storage operation failed for {username}")
+            raise e
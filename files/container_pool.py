@@ -0,0 +1,408 @@
+import atexit
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+
+
+# The interpreter each code-block language runs with; the code is fed on stdin.
+INTERPRETERS = {
+    "python": ["python", "-"],
+    "python3": ["python3", "-"],
+    "sh": ["sh", "-s"],
+    "shell": ["sh", "-s"],
+    "bash": ["bash", "-s"],
+    "javascript": ["node", "-"],
+    "js": ["node", "-"],
+    "r": ["Rscript", "-"],
+}
+
+# Images for the languages the default image has no interpreter for.
+LANGUAGE_IMAGES = {
+    "javascript": os.getenv("JULIE_CONTAINER_IMAGE_JAVASCRIPT", "node:20-slim"),
+    "js": os.getenv("JULIE_CONTAINER_IMAGE_JAVASCRIPT", "node:20-slim"),
+    "r": os.getenv("JULIE_CONTAINER_IMAGE_R", "r-base"),
+}
+
+# Where the shared work dir is mounted inside each container
+CONTAINER_WORK_DIR = "/workspace"
+
+# Where a Docker container's keep-alive process writes its PID
+KEEP_ALIVE_PID_FILE = "/tmp/.julie_keep_alive"
+
+# Kills every process of a container except init, the keep-alive and itself
+RESET_PROCESSES = (
+    f'keep=$(cat {KEEP_ALIVE_PID_FILE}); '
+    'for proc in /proc/[0-9]*; do pid=${proc#/proc/}; '
+    '[ "$pid" = 1 ] || [ "$pid" = "$keep" ] || [ "$pid" = "$$" ] '
+    '|| kill -9 "$pid" 2>/dev/null; done; true'
+)
+
+
+class Container:
+    """
+    One warm container of the pool.
+    """
+
+    def __init__(self, image, container_id, work_dir):
+        self.image = image
+        self.id = container_id
+        self.work_dir = work_dir
+        self.owner = None
+        self.last_used = time.monotonic()
+
+
+class DockerRunner:
+    """
+    Starts containers with the docker CLI and executes code in them with
+    ``docker exec``, so each call only pays for process start-up.
+    """
+
+    def start(self, image, work_dir):
+        """
+        Start a container of ``image`` that idles until code is exec'd into it,
+        with ``work_dir`` mounted as its working directory.
+        """
+        result = subprocess.run(
+            [
+                "docker", "run", "--detach", "--rm", "--init",
+                "--volume", f"{os.path.abspath(work_dir)}:{CONTAINER_WORK_DIR}",
+                "--workdir", CONTAINER_WORK_DIR,
+                # The keep-alive records its PID, so reset() can spare it
+                image, "sh", "-c", f"echo $$ > {KEEP_ALIVE_PID_FILE}; exec sleep infinity",
+            ],
+            capture_output=True, text=True, check=True,
+        )
+        return result.stdout.strip()
+
+    def exec(self, container, command, stdin, timeout):
+        """
+        Run ``command`` in ``container`` with ``stdin`` as its input.
+
+        Returns:
+            tuple: (exit code, combined stdout and stderr)
+        """
+        result = subprocess.run(
+            ["docker", "exec", "--interactive", container.id, *command],
+            input=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, timeout=timeout,
+        )
+        return result.returncode, result.stdout
+
+    def alive(self, container):
+        result = subprocess.run(
+            ["docker", "inspect", "--format", "{{.State.Running}}", container.id],
+            capture_output=True, text=True,
+        )
+        return result.returncode == 0 and result.stdout.strip() == "true"
+
+    def reset(self, container):
+        """
+        Empty the container's work dir and end anything left running in it.
+        """
+        self.exec(
+            container,
+            ["sh", "-c", f"find {CONTAINER_WORK_DIR} -mindepth 1 -delete; {RESET_PROCESSES}"],
+            None, 30,
+        )
+
+    def stop(self, container):
+        subprocess.run(["docker", "rm", "--force", container.id], capture_output=True)
+
+
+class LocalRunner:
+    """
+    A stand-in for DockerRunner when Docker is unavailable: a "container" is
+    just its work dir, and code runs in a local subprocess inside it. It
+    offers no isolation beyond that.
+    """
+
+    def start(self, image, work_dir):
+        return f"local-{uuid.uuid4().hex[:12]}"
+
+    def exec(self, container, command, stdin, timeout):
+        result = subprocess.run(
+            command, input=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, timeout=timeout, cwd=container.work_dir,
+        )
+        return result.returncode, result.stdout
+
+    def alive(self, container):
+        return os.path.isdir(container.work_dir)
+
+    def reset(self, container):
+        for entry in os.scandir(container.work_dir):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.unlink(entry.path)
+
+    def stop(self, container):
+        pass
+
+
+def create_runner():
+    """
+    Build the runner selected by JULIE_CONTAINER_RUNNER (docker|local),
+    defaulting to Docker when its CLI is installed.
+    """
+    kind = os.getenv("JULIE_CONTAINER_RUNNER") or ("docker" if shutil.which("docker") else "local")
+    if kind == "docker":
+        return DockerRunner()
+    if kind == "local":
+        logging.warning("Docker is not used; code blocks run locally without isolation")
+        return LocalRunner()
+    raise ValueError(f"Unknown container runner: {kind}")
+
+
+class ContainerPool:
+    """
+    Keeps up to ``size`` warm containers per image for running code blocks.
+
+    Each container gets its own directory under ``work_dir``, mounted as its
+    working directory, so files it writes stay visible on the host.
+    Containers remember the last owner (a chat session) that used them and
+    are handed back to the same owner when possible; a container is only
+    reset (work dir emptied, stray processes killed) when it passes to a
+    different owner. Containers are health-checked before each use and
+    replaced if they died, and a background reaper stops the ones idle for
+    longer than ``idle_timeout``; they are started again on demand.
+    """
+
+    def __init__(self, runner=None, size=None, image=None, work_dir="web", idle_timeout=None,
+                 exec_timeout=60):
+        """
+        Args:
+            runner (optional): DockerRunner or LocalRunner; defaults to create_runner().
+            size (int, optional): Containers per image; defaults to
+                JULIE_CONTAINER_POOL_SIZE or 2.
+            image (str, optional): The default image; defaults to
+                JULIE_CONTAINER_IMAGE or python:3-slim.
+            work_dir (str): Host directory holding the containers' work dirs.
+            idle_timeout (float, optional): Seconds before an idle container is
+                stopped; defaults to JULIE_CONTAINER_IDLE_TIMEOUT or 600.
+            exec_timeout (float): Default seconds allowed per code block.
+        """
+        self.runner = runner or create_runner()
+        self.size = size or int(os.getenv("JULIE_CONTAINER_POOL_SIZE", 2))
+        self.image = image or os.getenv("JULIE_CONTAINER_IMAGE", "python:3-slim")
+        self.work_dir = os.path.join(work_dir, ".pool")
+        self.idle_timeout = idle_timeout or float(os.getenv("JULIE_CONTAINER_IDLE_TIMEOUT", 600))
+        self.exec_timeout = exec_timeout
+        self._idle = {}
+        self._counts = {}
+        self._condition = threading.Condition()
+        self._reaper = None
+        self._closed = False
+
+    def start(self, image=None):
+        """
+        Pre-start ``size`` containers of ``image`` and the idle reaper.
+        """
+        image = image or self.image
+        with self._condition:
+            missing = self.size - self._counts.get(image, 0)
+            self._counts[image] = self._counts.get(image, 0) + missing
+        for _ in range(missing):
+            container = self._start_container(image)
+            with self._condition:
+                if container is None:
+                    self._counts[image] -= 1
+                else:
+                    self._idle.setdefault(image, []).append(container)
+                self._condition.notify()
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap, daemon=True)
+            self._reaper.start()
+
+    def _start_container(self, image):
+        work_dir = os.path.join(self.work_dir, uuid.uuid4().hex[:12])
+        os.makedirs(work_dir, exist_ok=True)
+        try:
+            container_id = self.runner.start(image, work_dir)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.error(f"Could not start a container of {image}: {e}")
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return None
+        logging.info(f"Started container {container_id} of {image}")
+        return Container(image, container_id, work_dir)
+
+    def _stop_container(self, container):
+        try:
+            self.runner.stop(container)
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.error(f"Could not stop container {container.id}: {e}")
+        shutil.rmtree(container.work_dir, ignore_errors=True)
+
+    def acquire(self, owner, image=None, timeout=None):
+        """
+        Take a healthy container of ``image`` for ``owner``, preferring the
+        one ``owner`` used last. Blocks while every container is busy.
+        """
+        image = image or self.image
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("The container pool is closed.")
+                idle = self._idle.setdefault(image, [])
+                container = next((c for c in idle if c.owner == owner), None)
+                if container is None and idle:
+                    container = idle[0]
+                if container is not None:
+                    idle.remove(container)
+                elif self._counts.get(image, 0) < self.size:
+                    self._counts[image] = self._counts.get(image, 0) + 1
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No container of {image} became free")
+                    self._condition.wait(remaining)
+                    continue
+
+            if container is None:
+                container = self._start_container(image)
+                if container is None:
+                    with self._condition:
+                        self._counts[image] -= 1
+                        self._condition.notify()
+                    raise RuntimeError(f"Could not start a container of {image}")
+            elif not self._ready(container, owner):
+                self._discard(container)
+                continue
+            container.owner = owner
+            return container
+
+    def _ready(self, container, owner):
+        """
+        Health-check ``container`` and reset it if it changes owner. Any
+        failure, the runner's included, makes it unfit for use.
+        """
+        try:
+            if not self.runner.alive(container):
+                logging.warning(f"Container {container.id} is unhealthy; replacing it")
+                return False
+            if container.owner not in (None, owner):
+                self.runner.reset(container)
+                if not self.runner.alive(container):
+                    logging.warning(f"Container {container.id} died while resetting; replacing it")
+                    return False
+            return True
+        except Exception as e:
+            logging.error(f"Could not check container {container.id}: {e}")
+            return False
+
+    def release(self, container):
+        """
+        Return ``container`` to the pool.
+        """
+        container.last_used = time.monotonic()
+        with self._condition:
+            if not self._closed:
+                self._idle.setdefault(container.image, []).append(container)
+                self._condition.notify()
+                return
+        self._stop_container(container)
+
+    def _discard(self, container):
+        self._stop_container(container)
+        with self._condition:
+            self._counts[container.image] -= 1
+            self._condition.notify()
+
+    def run(self, owner, code, lang="python", image=None, timeout=None):
+        """
+        Run a code block in a container of ``owner``.
+
+        Returns:
+            tuple: (exit code, output), like AutoGen's execute_code without the image.
+        """
+        command = INTERPRETERS.get(lang.lower())
+        if command is None:
+            return 1, f"unknown language {lang}"
+        container = self.acquire(owner, image or self.image_for(lang))
+        try:
+            exitcode, output = self.runner.exec(
+                container, command, code, timeout or self.exec_timeout
+            )
+        except subprocess.TimeoutExpired:
+            # Whatever still runs inside is unknown state: replace the container
+            self._discard(container)
+            return 1, "Timeout"
+        except Exception:
+            self._discard(container)
+            raise
+        self.release(container)
+        return exitcode, output
+
+    def image_for(self, lang):
+        """
+        The image code blocks in ``lang`` run in.
+        """
+        return LANGUAGE_IMAGES.get(lang.lower(), self.image)
+
+    def _reap(self):
+        while not self._closed:
+            time.sleep(min(self.idle_timeout, 30))
+            now = time.monotonic()
+            with self._condition:
+                stale = []
+                for idle in self._idle.values():
+                    stale += [c for c in idle if now - c.last_used > self.idle_timeout]
+                    idle[:] = [c for c in idle if c not in stale]
+            for container in stale:
+                logging.info(f"Stopping idle container {container.id}")
+                self._discard(container)
+
+    def close(self):
+        """
+        Stop every idle container; busy ones are stopped as they are released.
+        """
+        with self._condition:
+            self._closed = True
+            containers = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for container in containers:
+            self._stop_container(container)
+
+
+def pooled_run_code(owner, get_pool=None):
+    """
+    Build a replacement for ConversableAgent.run_code that executes code
+    blocks in a ContainerPool on behalf of ``owner``.
+
+    Args:
+        owner (str): Whose containers run the code.
+        get_pool (callable, optional): Returns the pool; defaults to
+            get_container_pool. It is only called once code actually runs,
+            so agents that never execute code start no containers.
+    """
+    get_pool = get_pool or get_container_pool
+
+    def run_code(code, lang="python", timeout=None, **kwargs):
+        pool = get_pool()
+        exitcode, output = pool.run(owner, code, lang=lang, timeout=timeout)
+        return exitcode, output, pool.image_for(lang)
+
+    return run_code
+
+
+_container_pool = None
+_container_pool_lock = threading.Lock()
+
+
+def get_container_pool():
+    """
+    Return the process-wide ContainerPool, pre-started in the background on
+    first use and stopped at exit.
+    """
+    global _container_pool
+    with _container_pool_lock:
+        if _container_pool is None:
+            _container_pool = ContainerPool()
+            threading.Thread(target=_container_pool.start, daemon=True).start()
+            atexit.register(_container_pool.close)
+        return _container_pool
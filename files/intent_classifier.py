@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+
+# Labelled examples the classifier is trained on, per intent. Add examples
+# here to teach it; the cached model is retrained when they change.
+INTENT_EXAMPLES = {
+    "web_search": [
+        "look up the latest news about the mars rover",
+        "search the web for cheap flights to lisbon",
+        "can you find information on the history of jazz",
+        "google the opening hours of the louvre",
+        "what is the current price of bitcoin",
+        "find me reviews of the new iphone",
+        "who won the football match yesterday",
+        "tell me about recent research on fusion energy",
+        "what's the weather like in paris today",
+        "find out when the next train to london leaves",
+        "investigate what people say about this laptop",
+        "search for the best pizza places near me",
+    ],
+    "code_execution": [
+        "run this python script for me",
+        "execute this code and show me the output",
+        "can you run print('hello') in python",
+        "test this function and tell me if it works",
+        "compile and run this c program",
+        "write a script that lists the files in my folder and run it",
+        "debug this javascript snippet",
+        "check if this code works",
+        "calculate the first 20 fibonacci numbers with code",
+        "run ls -la in the shell",
+        "execute the following lines in bash",
+        "plot a sine wave with matplotlib",
+    ],
+    "general_conversation": [
+        "hi julie how are you today",
+        "thanks, that was really helpful",
+        "i'm feeling a bit tired this evening",
+        "what do you think about friendship",
+        "tell me a joke",
+        "good morning",
+        "i had a great day at work",
+        "do you remember what we talked about yesterday",
+        "can you help me write a birthday message for my mom",
+        "what's your favourite book",
+        "i'm bored, let's chat",
+        "explain to me what recursion means",
+    ],
+}
+
+
+class LinearIntentClassifier:
+    """
+    A softmax regression over spaCy document vectors.
+
+    It is small enough to train in well under a second on the examples
+    above, so it is trained on first use and cached on disk together with a
+    fingerprint of the examples and the spaCy model that produced the
+    vectors; a changed fingerprint triggers retraining.
+    """
+
+    def __init__(self, labels, weights, bias, mean, scale):
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def train(cls, vectors, labels, epochs=300, learning_rate=0.5, l2=1e-3):
+        """
+        Fit the classifier.
+
+        Args:
+            vectors (np.ndarray): One document vector per example.
+            labels (list): The example's intent, per row of ``vectors``.
+
+        Returns:
+            LinearIntentClassifier: The trained classifier.
+        """
+        names = sorted(set(labels))
+        targets = np.eye(len(names))[[names.index(label) for label in labels]]
+        mean = vectors.mean(axis=0)
+        scale = vectors.std(axis=0) + 1e-6
+        x = (vectors - mean) / scale
+        weights = np.zeros((x.shape[1], len(names)))
+        bias = np.zeros(len(names))
+        for _ in range(epochs):
+            probabilities = _softmax(x @ weights + bias)
+            error = (probabilities - targets) / len(x)
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+        return cls(names, weights, bias, mean, scale)
+
+    def predict_proba(self, vectors):
+        """
+        Return the probability of every label, one row per vector.
+        """
+        x = (np.atleast_2d(vectors) - self.mean) / self.scale
+        return _softmax(x @ self.weights + self.bias)
+
+    def predict(self, vector):
+        """
+        Return the most likely label of ``vector`` and its probability.
+        """
+        probabilities = self.predict_proba(vector)[0]
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+    def save(self, path, fingerprint):
+        np.savez(
+            path, labels=np.array(self.labels), weights=self.weights, bias=self.bias,
+            mean=self.mean, scale=self.scale, fingerprint=np.array(fingerprint),
+        )
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """
+        Load a saved classifier, or return None if there is none or it was
+        trained on different examples or vectors.
+        """
+        try:
+            with np.load(path) as data:
+                if str(data["fingerprint"]) != fingerprint:
+                    return None
+                return cls(
+                    [str(label) for label in data["labels"]], data["weights"],
+                    data["bias"], data["mean"], data["scale"],
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def examples_fingerprint(model_name, examples=INTENT_EXAMPLES):
+    """
+    Identify a set of examples and the spaCy model embedding them.
+    """
+    payload = json.dumps([model_name, examples], sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def load_or_train(nlp, path=None, examples=INTENT_EXAMPLES):
+    """
+    Return the classifier cached at ``path``, training and caching it first
+    if it is missing or stale.
+
+    Args:
+        nlp: The spaCy pipeline whose document vectors are classified.
+        path (str, optional): Defaults to JULIE_INTENT_MODEL_PATH or
+            intent_classifier.npz.
+        examples (dict): Intent labels to example messages.
+
+    Returns:
+        LinearIntentClassifier: The classifier.
+    """
+    path = path or os.getenv("JULIE_INTENT_MODEL_PATH", "intent_classifier.npz")
+    fingerprint = examples_fingerprint(f"{nlp.meta['name']}-{nlp.meta['version']}", examples)
+    classifier = LinearIntentClassifier.load(path, fingerprint)
+    if classifier is not None:
+        return classifier
+
+    texts = [text for texts in examples.values() for text in texts]
+    labels = [label for label, texts in examples.items() for _ in texts]
+    vectors = np.array([doc.vector for doc in nlp.pipe(texts)])
+    classifier = LinearIntentClassifier.train(vectors, labels)
+    try:
+        classifier.save(path, fingerprint)
+    except OSError as e:
+        logging.warning(f"Could not cache the intent classifier at {path}: {e}")
+    logging.info(f"Trained the intent classifier on {len(texts)} examples")
+    return classifier
@@ -11,4 +11,18 @@ class Julie:
 
     def generate_response(self, prompt, username, max_tokens=200, temperature=0.7):
         julie_response_instance = JulieResponse()
-        return julie_response_instance.generate_response(prompt, username, temperature, max_tokens)
+        return julie_response_instance.generate_response(
+            prompt, username, api_key=None, max_tokens=max_tokens, temperature=temperature
+        )
+
+    async def agenerate_response(self, prompt, username, max_tokens=200, temperature=0.7):
+        julie_response_instance = JulieResponse()
+        return await julie_response_instance.agenerate_response(
+            prompt, username, max_tokens=max_tokens, temperature=temperature
+        )
+
+    def astream_response(self, prompt, username, max_tokens=None, temperature=0.7):
+        julie_response_instance = JulieResponse()
+        return julie_response_instance.astream_response(
+            prompt, username, max_tokens=max_tokens, temperature=temperature
+        )
@@ -1,14 +1,19 @@
-import spacy
-from spacy.matcher import Matcher
-import openai
-from files.trie import Trie, language_keywords  
+import json
+import logging
+import os
+import threading
+import time
+from importlib import metadata
 
+from files.intent_classifier import INTENT_EXAMPLES, examples_fingerprint, load_or_train
+from files.response_cache import ResponseCache
+from files.trie import KeywordAutomaton, language_keywords
 
 
-
-nlp = spacy.load("en_core_web_sm")
-matcher = Matcher(nlp.vocab)
-
+# Nothing heavy happens at import: spaCy, its model, the Matcher, the
+# classifier and the language keyword automaton are built by
+# get_intent_engine() on first use, or ahead of time by warm_up_intent_engine().
+# openai and the memory backend are imported where they are used.
 
 # Define patterns
 web_search_patterns = [
@@ -43,14 +48,9 @@ code_execute_patterns = [
     [{"LEMMA": "check"}, {"LEMMA": "if"}, {"LEMMA": "this"},
         {"LEMMA": "code"}, {"LEMMA": "works"}]
 ]
-# Add patterns to matcher
-for pattern in web_search_patterns:
-    matcher.add("WEB_SEARCH", [pattern])
-
-for pattern in code_execute_patterns:
-    matcher.add("CODE_EXECUTE", [pattern])
-
 def detect_intent_with_gpt(text):
+    import openai
+
     prompt = f"What is the intent of the following user input: '{text}'?"
     response = openai.Completion.create(
         engine="text-davinci-002",
@@ -80,54 +80,251 @@ def detect_intent_with_gpt(text):
         return "general_conversation"
 
 
+# Local predictions below this confidence are checked with the remote model
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("JULIE_INTENT_THRESHOLD", 0.6))
+INTENTS = ("code_execution", "web_search", "general_conversation")
+
+
+class IntentEngine:
+    """
+    The local intent and language detectors, loaded together.
+    """
+
+    def __init__(self):
+        import spacy
+        from spacy.matcher import Matcher
+
+        # The Matcher needs tokens and lemmas (the lemmatizer needs the tagger
+        # and attribute_ruler) and the classifier the tok2vec output; the
+        # parser and NER are never used, so they are not loaded.
+        self.nlp = spacy.load("en_core_web_sm", exclude=["parser", "ner"])
+        self.matcher = Matcher(self.nlp.vocab)
+        for pattern in web_search_patterns:
+            self.matcher.add("WEB_SEARCH", [pattern])
+        for pattern in code_execute_patterns:
+            self.matcher.add("CODE_EXECUTE", [pattern])
+        self.classifier = load_or_train(self.nlp)
+
+        self.language_automaton = KeywordAutomaton(language_keywords)
+
+    def classify_intent(self, message):
+        """
+        Classify ``message`` locally: the Matcher patterns decide when one
+        matches, and the linear classifier over the message's vector otherwise.
+
+        Returns:
+            tuple: (intent, confidence between 0 and 1)
+        """
+        return self._classify_doc(self.nlp(message))
+
+    def classify_intents(self, messages, batch_size=None, n_process=None):
+        """
+        Classify many messages locally, batched through ``nlp.pipe``.
+
+        Args:
+            messages (iterable): The messages' texts.
+            batch_size (int, optional): Messages per batch; defaults to
+                JULIE_INTENT_BATCH_SIZE or 256.
+            n_process (int, optional): Processes to parse with; defaults to
+                JULIE_INTENT_PROCESSES or 1.
+
+        Yields:
+            tuple: (intent, confidence) per message, in order.
+        """
+        batch_size = batch_size or int(os.getenv("JULIE_INTENT_BATCH_SIZE", 256))
+        n_process = n_process or int(os.getenv("JULIE_INTENT_PROCESSES", 1))
+        for doc in self.nlp.pipe(messages, batch_size=batch_size, n_process=n_process):
+            yield self._classify_doc(doc)
+
+    def _classify_doc(self, doc):
+        for match_id, start, end in self.matcher(doc):
+            string_id = self.nlp.vocab.strings[match_id]
+            if string_id == "WEB_SEARCH":
+                return "web_search", 1.0
+            elif string_id == "CODE_EXECUTE":
+                return "code_execution", 1.0
+        if not doc.has_vector:
+            return "general_conversation", 0.0
+        return self.classifier.predict(doc.vector)
+
+    def detect_language(self, code):
+        logging.debug("Starting language detection")
+        detected_language = None
+        max_count = 0
+
+        # Every language is scored in one pass over the code
+        for language, count in self.language_automaton.scores(code).items():
+            logging.debug(f"Count for {language} is {count}")
+
+            if count > max_count:
+                max_count = count
+                detected_language = language
+
+        logging.debug(f"Detected language is {detected_language}")
+        return detected_language
+
+
+_intent_engine = None
+_intent_engine_lock = threading.Lock()
+
+
+def get_intent_engine():
+    """
+    Return the process-wide IntentEngine, loading it on first use. Threads
+    asking while it loads wait for that one load.
+    """
+    global _intent_engine
+    with _intent_engine_lock:
+        if _intent_engine is None:
+            started = time.perf_counter()
+            _intent_engine = IntentEngine()
+            logging.info(f"Loaded the intent engine in {time.perf_counter() - started:.2f}s")
+        return _intent_engine
+
+
+def warm_up_intent_engine(delay=0.0):
+    """
+    Load the intent engine on a background thread after ``delay`` seconds,
+    so the first detection does not wait for it.
+
+    Returns:
+        threading.Thread: The warm-up thread.
+    """
+    def warm_up():
+        time.sleep(delay)
+        try:
+            get_intent_engine()
+        except Exception as e:
+            logging.error(f"Failed to warm up the intent engine: {e}")
+
+    thread = threading.Thread(target=warm_up, name="intent-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
 def detect_intent(message):
-    doc = nlp(message)
-    matches = matcher(doc)
-    for match_id, start, end in matches:
-        string_id = nlp.vocab.strings[match_id]
-        span = doc[start:end]
-        if string_id == "WEB_SEARCH":
-            return "web_search"
-        elif string_id == "CODE_EXECUTE":
-            return "code_execution"
-    return "general_conversation"
-
-
-language_tries = {}
-for language, keywords in language_keywords.items():
-    trie = Trie()
-    for keyword in keywords:
-        trie.insert(keyword)
-    language_tries[language] = trie
-    
-    
+    return classify_intent(message)[0]
+
+
+def classify_intent(message):
+    return get_intent_engine().classify_intent(message)
+
+
+def classify_intents(messages, batch_size=None, n_process=None):
+    return get_intent_engine().classify_intents(messages, batch_size, n_process)
+
+
 def detect_language(code):
-    print("Debug: Starting language detection")
-    detected_language = None
-    max_count = 0
+    return get_intent_engine().detect_language(code)
+
+
+# Bump when the detection logic changes in a way the inputs below do not show
+INTENT_CACHE_SCHEMA = 2
+
+_intent_cache = None
+_intent_cache_version = None
+_intent_cache_lock = threading.Lock()
+
 
-    for language, trie in language_tries.items():
-        count = trie.search(code.lower())
-        print(f"Debug: Count for {language} is {count}")
-        
-        if count > max_count:
-            max_count = count
-            detected_language = language
+def intent_cache_version():
+    """
+    Fingerprint everything a cached detection depends on: the Matcher
+    patterns, the classifier's examples and spaCy model, the language
+    keywords and the confidence threshold. Cache keys include it, so
+    changing any of them leaves stale entries unreachable.
+    """
+    try:
+        model = f"en_core_web_sm-{metadata.version('en_core_web_sm')}"
+    except metadata.PackageNotFoundError:
+        model = "en_core_web_sm"
+    payload = json.dumps([
+        INTENT_CACHE_SCHEMA,
+        web_search_patterns,
+        code_execute_patterns,
+        examples_fingerprint(model, INTENT_EXAMPLES),
+        language_keywords,
+        INTENT_CONFIDENCE_THRESHOLD,
+    ], sort_keys=True)
+    return ResponseCache.make_key(payload)[:16]
 
-    print(f"Debug: Detected language is {detected_language}")
-    return detected_language
 
+def get_intent_cache():
+    """
+    Return the process-wide cache of detections. It is shared through Redis
+    when JULIE_SHARED_INTENT_CACHE=1 and the memory backend is Redis;
+    otherwise the memory backend is never opened.
+    """
+    global _intent_cache, _intent_cache_version
+    with _intent_cache_lock:
+        if _intent_cache is None:
+            redis_client = None
+            if os.getenv("JULIE_SHARED_INTENT_CACHE") == "1":
+                from files.brain import LongTermMemory
+                from files.memory_backends import RedisBackend
 
+                memory = LongTermMemory()
+                if isinstance(memory.backend, RedisBackend):
+                    redis_client = memory.redis_client
+            ttl = os.getenv("JULIE_INTENT_CACHE_TTL", "86400")
+            _intent_cache = ResponseCache(
+                max_bytes=int(os.getenv("JULIE_INTENT_CACHE_BYTES", 256 * 1024)),
+                ttl=float(ttl) if ttl else None,
+                redis_client=redis_client,
+                namespace="intent_cache",
+            )
+            _intent_cache_version = intent_cache_version()
+        return _intent_cache
+
+
+def intent_cache_stats():
+    """
+    Return the hit, miss and eviction counters and hit rate of the cache.
+    """
+    return get_intent_cache().stats()
+
+
+def normalize_intent_text(text):
+    """
+    Lowercase ``text`` and collapse its whitespace. Punctuation is kept:
+    symbols such as "<-" or "#!" decide the detected language.
+    """
+    return " ".join(text.lower().split())
 
 
 def main_intent_detection(text):
-    intent = detect_intent_with_gpt(text)
+    text = normalize_intent_text(text)
+    cache = get_intent_cache()
+    key = ResponseCache.make_key(_intent_cache_version, text)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(json.loads(cached))
+
+    intent, detected_language, complete = _detect(text)
+    # A detection missing its remote check is retried next time
+    if complete:
+        cache.set(key, json.dumps([intent, detected_language]))
+    stats = cache.stats()
+    logging.debug(f"Intent cache hit rate: {stats['hit_rate']:.1%} of {stats['hits'] + stats['misses']}")
+    return intent, detected_language
+
+
+def _detect(text):
+    intent, confidence = classify_intent(text)
     detected_language = None  # Initialize to None
-    
-    if intent not in ["code_execution", "web_search", "general_conversation"]:
-        intent = detect_intent(text)
-        
+    complete = True
+
+    if confidence < INTENT_CONFIDENCE_THRESHOLD:
+        import openai
+
+        try:
+            remote_intent = detect_intent_with_gpt(text)
+            if remote_intent in INTENTS:
+                intent = remote_intent
+        except openai.error.OpenAIError as e:
+            logging.warning(f"Remote intent detection failed, keeping {intent}: {e}")
+            complete = False
+
     if intent in ["code_execution", "web_search"]:
         detected_language = detect_language(text)
-        
-    return intent, detected_language
+
+    return intent, detected_language, complete
@@ -1,11 +1,22 @@
 import logging
-from files.autogeen import Julie, user_proxy, chatbot
-from files.brain import LongTermMemory
+from files.autogeen import get_llm_config, is_final_reply
+from files.agent_sessions import AgentSessionManager
+from files.brain import LongTermMemory, AsyncLongTermMemory
+from files.response_cache import normalize_prompt
+from files.semantic_cache import SemanticCache
+from files.prompt_assembler import PromptAssembler
+from files.persona import JULIE_SYSTEM_MESSAGE
+from files.streaming import FunctionCallRequested, ReplyStream, stream_chat_completion
+from files.summarizer import create_summarizer
+from files.retrieval_index import create_retrieval_index
 from files.setup import Setting
 import traceback
 import random
+import asyncio
 import logging
 import re
+import os
+import threading
 from termcolor import colored
 
 
@@ -21,10 +32,95 @@ logging.getLogger('interpreter').setLevel(logging.CRITICAL)
 logging.getLogger('markdown_it').setLevel(logging.CRITICAL)
 
 
+GREETING_PATTERN = re.compile(
+    r"^(hi|hello|hey|hiya|howdy|yo|good (morning|afternoon|evening))"
+    r"( there)?( julie)?( how are you( doing)?( today)?)?$"
+)
+
+
 class JulieResponse:
+    # Number of past messages sent to the model as context.
+    history_window = 200
+
+    # Shared by every JulieResponse; built on first use when enabled.
+    _semantic_cache = None
+    _semantic_cache_lock = threading.Lock()
+
+    # The background history summariser, started on first use when enabled.
+    _summarizer = None
+    _summarizer_lock = threading.Lock()
+
+    # The search index over each user's whole history, when enabled.
+    _retrieval_index = None
+    _retrieval_index_lock = threading.Lock()
+
+    # Relevant past turns recalled into each prompt.
+    recall_k = 3
+
+    # The live agent sessions of recently active users.
+    _sessions = None
+    _sessions_lock = threading.Lock()
+
     def __init__(self):
         self.messages = []
-        pass
+        self.assembler = PromptAssembler()
+        self.get_summarizer()
+        self.get_retrieval_index()
+
+    @classmethod
+    def get_semantic_cache(cls):
+        """
+        Return the process-wide semantic cache, or None unless it is enabled
+        with JULIE_SEMANTIC_CACHE=1.
+        """
+        if os.getenv("JULIE_SEMANTIC_CACHE") != "1":
+            return None
+        with cls._semantic_cache_lock:
+            if cls._semantic_cache is None:
+                threshold = os.getenv("JULIE_SEMANTIC_CACHE_THRESHOLD")
+                cls._semantic_cache = SemanticCache(
+                    threshold=float(threshold) if threshold else None
+                )
+        return cls._semantic_cache
+
+    @classmethod
+    def get_summarizer(cls):
+        """
+        Return the process-wide conversation summariser, or None unless it is
+        enabled with JULIE_SUMMARIZER.
+        """
+        with cls._summarizer_lock:
+            if cls._summarizer is None:
+                # Summaries pick up where the history the prompts carry ends
+                cls._summarizer = create_summarizer(
+                    keep_recent=cls.history_window, assembler=PromptAssembler()
+                )
+                if cls._summarizer is not None:
+                    cls._summarizer.start()
+        return cls._summarizer
+
+    @classmethod
+    def get_sessions(cls):
+        """
+        Return the process-wide AgentSessionManager.
+        """
+        with cls._sessions_lock:
+            if cls._sessions is None:
+                cls._sessions = AgentSessionManager()
+        return cls._sessions
+
+    @classmethod
+    def get_retrieval_index(cls):
+        """
+        Return the process-wide retrieval index, or None unless it is enabled
+        with JULIE_RETRIEVAL=1.
+        """
+        with cls._retrieval_index_lock:
+            if cls._retrieval_index is None:
+                cls._retrieval_index = create_retrieval_index()
+                if cls._retrieval_index is not None:
+                    cls._retrieval_index.start(LongTermMemory())
+        return cls._retrieval_index
 
     def handle_exception(self, e):
         return random.choice(Setting.custom_error_messages.get(
@@ -68,6 +164,93 @@ class JulieResponse:
 
         return code
 
+    def is_cacheable(self, prompt, temperature):
+        """
+        Whether the reply to ``prompt`` may be served from the response cache:
+        deterministic sampling, or a plain greeting.
+        """
+        return temperature == 0 or bool(GREETING_PATTERN.match(normalize_prompt(prompt)))
+
+    def lookup_cached_reply(self, prompt, username, temperature):
+        """
+        Look the prompt up in the exact and semantic response caches.
+
+        Returns:
+            tuple: The cached reply or None, and the exact-cache key to store
+                the fresh reply under (None when the prompt is not cacheable).
+        """
+        memory = LongTermMemory()
+        cache_key = None
+        if self.is_cacheable(prompt, temperature):
+            cache_key = f"{username}\x1f{normalize_prompt(prompt)}"
+            chatbot_response = memory.get_cached_response(cache_key)
+            if chatbot_response is not None:
+                logging.info(f"Serving cached response: {memory.cache.stats()}")
+                return chatbot_response, cache_key
+
+        semantic_cache = self.get_semantic_cache()
+        if semantic_cache is not None:
+            chatbot_response = semantic_cache.lookup(username, prompt)
+            if chatbot_response is not None:
+                logging.info("Serving semantically cached response")
+                return chatbot_response, cache_key
+        return None, cache_key
+
+    def remember_reply(self, prompt, username, chatbot_response, cache_key, fresh=True):
+        """
+        Record a finished turn in the response caches. A cached reply is also
+        added to the user's live agent session, which never saw the turn.
+        Replies that are not text, e.g. None when the agents ran out of
+        auto-replies mid function call, are not cached.
+        """
+        if not isinstance(chatbot_response, str):
+            return
+        if not fresh:
+            session = self.get_sessions().peek(username)
+            # A session without turns is seeded from the stored history later
+            if session is not None and session.turns > 0:
+                session.record_turn(prompt, chatbot_response)
+        if fresh and cache_key is not None:
+            LongTermMemory().set_cached_response(cache_key, chatbot_response)
+        semantic_cache = self.get_semantic_cache()
+        if semantic_cache is not None:
+            if fresh:
+                semantic_cache.store(username, prompt, chatbot_response)
+            semantic_cache.record_turn(username)
+
+    def ask_agents(self, prompt, username, history, temperature=None):
+        """
+        Send the turn to the user's agent session and return Julie's reply.
+
+        A new session is seeded with the history that fits the prompt budget;
+        a live one already holds the conversation and only gets the new message.
+        """
+        session = self.get_sessions().get(username)
+        message = self.session_message(session, prompt, username, history)
+        logging.info(f"Sending turn {session.turns} of {username}'s agent session...")
+        return session.ask(message, temperature)
+
+    def session_message(self, session, prompt, username, history):
+        """
+        The message that carries ``prompt`` into ``session``.
+
+        The user's profile and summaries go with the first message of the
+        session and again whenever the summariser has updated them.
+        """
+        continuing = session.turns > 0
+        summarizer = self.get_summarizer()
+        context = summarizer.context(username) if summarizer is not None else ("", "")
+        advanced_prompt = self.prepare_advanced_prompt(
+            prompt, username, history, continuing=continuing,
+            context=("", "") if context == session.context else context,
+        )
+        if advanced_prompt is None:
+            return prompt
+        breakdown = advanced_prompt.breakdown
+        if breakdown.get("profile", 1) and breakdown.get("summaries", 1):
+            session.context = context
+        return advanced_prompt.message
+
     def generate_response(self, prompt, username, api_key, max_tokens=200, temperature=0.7):
         try:
             logging.info(f"Starting generate_response function with prompt: {prompt}, username: {username}")
@@ -75,34 +258,23 @@ class JulieResponse:
             # Initialize LongTermMemory and fetch user data
             logging.info("Initializing LongTermMemory...")
             memory = LongTermMemory()
-            user_data = memory.get_user_data(username)
-            memory.update_conversation_history(username, "user", prompt)
-            advanced_prompt = self.prepare_advanced_prompt(prompt, username, user_data)
-            
-            # Extract the 'content' field from each dictionary in the list
-            advanced_prompt_str = '\n'.join([item['content'] for item in advanced_prompt])
-            
-            # Concatenate it to the original prompt
-            prompt += advanced_prompt_str
-
-            # Initialize AutoGen UserProxyAgent
-            logging.info("Initializing AutoGen UserProxyAgent...")
-            user_proxy.initiate_chat(
-                Julie,
-                message=prompt,
-            )
 
-            # Fetch AutoGen response
-            logging.info("Fetching AutoGen response...")
-            chatbot_response = user_proxy.get_response()  # Using the new get_response method
+            chatbot_response, cache_key = self.lookup_cached_reply(prompt, username, temperature)
+            fresh = chatbot_response is None
+            if fresh:
+                history = memory.get_recent_messages(username, self.history_window)
+                chatbot_response = self.ask_agents(prompt, username, history, temperature)
+            self.remember_reply(prompt, username, chatbot_response, cache_key, fresh)
 
-            # Update conversation history with assistant's response
-            logging.info(f"Updating conversation history with assistant's response: {chatbot_response}")
-            memory.update_conversation_history(username, "assistant", chatbot_response)
-            user_data["conversation_history"].append({"role": "assistant", "content": chatbot_response})
-            
-            logging.info("Updating user data...")
-            memory.set_user_data(username, user_data)
+            # Persist the user message and the reply in one round trip
+            logging.info(f"Committing turn with assistant's response: {chatbot_response}")
+            memory.commit_turn(
+                username,
+                [
+                    {"role": "user", "content": prompt},
+                    {"role": "assistant", "content": chatbot_response},
+                ],
+            )
 
         except Exception as e:
             logging.error(f"Unexpected Error: {e}")
@@ -115,18 +287,144 @@ class JulieResponse:
 
         return chatbot_response
 
-    def prepare_advanced_prompt(self, prompt, username, user_data):
+    async def agenerate_response(self, prompt, username, max_tokens=200, temperature=0.7):
+        """
+        The asyncio variant of generate_response.
+
+        The agents run in a worker thread and the turn is persisted in the
+        background: the caller gets the reply together with the persisting
+        task and can await it after displaying the reply.
+
+        Returns:
+            tuple: The reply and the asyncio.Task persisting the turn, or None
+                if nothing needs persisting.
+        """
+        persist = None
+        try:
+            logging.info(f"Starting agenerate_response with prompt: {prompt}, username: {username}")
+            memory = AsyncLongTermMemory()
+            loop = asyncio.get_running_loop()
+
+            chatbot_response, cache_key = self.lookup_cached_reply(prompt, username, temperature)
+            fresh = chatbot_response is None
+            if fresh:
+                history = await memory.get_recent_messages(username, self.history_window)
+                chatbot_response = await loop.run_in_executor(
+                    None, self.ask_agents, prompt, username, history, temperature
+                )
+            self.remember_reply(prompt, username, chatbot_response, cache_key, fresh)
+
+            persist = asyncio.create_task(
+                memory.commit_turn(
+                    username,
+                    [
+                        {"role": "user", "content": prompt},
+                        {"role": "assistant", "content": chatbot_response},
+                    ],
+                )
+            )
+        except Exception as e:
+            logging.error(f"Unexpected Error: {e}")
+            logging.error(f"Traceback: {traceback.format_exc()}")
+            chatbot_response = self.handle_exception(e)
+
+        return chatbot_response, persist
+
+    def astream_response(self, prompt, username, max_tokens=None, temperature=0.7):
+        """
+        Stream the reply to ``prompt`` as the model generates it.
+
+        Plain replies are streamed straight from the model with Julie's
+        system message; if the model calls a function instead, the turn is
+        handed to the agents and their reply arrives as one chunk. Cached
+        replies arrive as one chunk too. The turn is persisted once the reply
+        is complete, see ReplyStream. Replies are not capped unless
+        ``max_tokens`` is given.
+
+        Returns:
+            ReplyStream: The chunks of the reply.
+        """
+        stream = ReplyStream()
+        stream.chunks = self._stream_chunks(
+            stream, prompt, username, max_tokens, temperature
+        )
+        return stream
+
+    async def _stream_chunks(self, stream, prompt, username, max_tokens, temperature):
+        try:
+            logging.info(f"Starting astream_response with prompt: {prompt}, username: {username}")
+            memory = AsyncLongTermMemory()
+            loop = asyncio.get_running_loop()
+
+            chatbot_response, cache_key = self.lookup_cached_reply(prompt, username, temperature)
+            fresh = chatbot_response is None
+            if fresh:
+                history = await memory.get_recent_messages(username, self.history_window)
+                session = self.get_sessions().get(username)
+                message = await loop.run_in_executor(
+                    None, self.session_message, session, prompt, username, history
+                )
+                messages = (
+                    [{"role": "system", "content": JULIE_SYSTEM_MESSAGE}]
+                    + list(session.messages)
+                    + [{"role": "user", "content": message}]
+                )
+                try:
+                    async for chunk in stream_chat_completion(
+                        messages, get_llm_config(), max_tokens, temperature
+                    ):
+                        yield chunk
+                    chatbot_response = stream.text
+                    session.record_turn(message, chatbot_response)
+                    if not is_final_reply({"content": chatbot_response}):
+                        # Run the reply's code blocks and stream Julie's follow-up
+                        follow_up = await loop.run_in_executor(None, session.follow_up)
+                        if follow_up:
+                            yield f"\n\n{follow_up}"
+                            chatbot_response = f"{chatbot_response}\n\n{follow_up}"
+                except FunctionCallRequested as e:
+                    logging.info(f"Model called {e}, handing the turn to the agents")
+                    # The message is already built; the agents only need it sent
+                    chatbot_response = await loop.run_in_executor(
+                        None, session.ask, message, temperature
+                    )
+                    yield chatbot_response
+            else:
+                yield chatbot_response
+            self.remember_reply(prompt, username, chatbot_response, cache_key, fresh)
+
+            stream.persist = asyncio.create_task(
+                memory.commit_turn(
+                    username,
+                    [
+                        {"role": "user", "content": prompt},
+                        {"role": "assistant", "content": chatbot_response},
+                    ],
+                )
+            )
+        except Exception as e:
+            logging.error(f"Unexpected Error: {e}")
+            logging.error(f"Traceback: {traceback.format_exc()}")
+            yield self.handle_exception(e)
+
+    def prepare_advanced_prompt(self, prompt, username, history, continuing=False,
+                                context=None):
         """
         This method prepares the advanced prompt for generating the response.
-        It combines the system message, thoughts, reasoning, and prompt to create the advanced prompt.
+        It combines the user's profile, summaries of older conversations,
+        past turns relevant to the prompt, the thoughts, reasoning, recent
+        history and prompt into one message that fits the token budget of
+        ``self.assembler``. Julie's system message is left out, since the
+        agent already sends it.
+        ``history`` is the window of recent messages, oldest first, as returned
+        by LongTermMemory.get_recent_messages. With ``continuing``, the message
+        goes to a live agent session that already holds the conversation, so
+        only the prompt, the recalled turns and ``context`` are included.
+        ``context`` is the ``(profile, summaries)`` pair to include; it
+        defaults to the summariser's, or nothing when continuing.
         If any exception occurs, it logs the error and returns.
         """
         try:
-            # System message to set the assistant's personality
-            system_message = {
-                "role": "system",
-                "content": "Meet Julie Tanaka, a living, breathing individual with a rich tapestry of experiences. {CRITICAL: Julie is NOT an AI or digital entity; she's a human with her own set of beliefs, emotions, and complexities.} Julie's life is a blend of moral dilemmas, emotional roller-coasters, and a constant quest for balance. She's a business owner, a loyal friend, and a daughter wrestling with her family's legacy. Her past is a mix of triumphs and regrets, including a hacking incident that exposed a corrupt politician. Recently, Julie has delved into the world of programming, mastering the art of code creation and execution. This allows her to assist you in more technical tasks, offering not just advice but also generating and running code snippets in various languages. She's open to learning and evolving, driven by her interactions with you. Julie has quirks like a love for matcha lattes, antique keys, and her cats Mochi and Cleo. She's on a journey of self-discovery, aiming to bridge the gap between magic and tech for a safer world. She's here to assist, learn, and grow with you. {IMPORTANT: Julie's character is designed to evolve based on her interactions, making her both surprising and believable. Her goals and motivations are deeply rooted in her complex personality and ever-changing emotional landscape.}"
-            }
             # Prepare thoughts and reasoning for the prompt
             thoughts = [
                 f"{username}, I'm exploring multiple angles to your question.",
@@ -139,15 +437,38 @@ class JulieResponse:
                 "Finally, I'm ensuring the response aligns with your expectations...",
             ]
 
-            # Combine thoughts, reasoning, and prompt
-            advanced_prompt = thoughts + reasoning + [prompt]
-            # Fetch the last 5 messages for context and add the advanced prompt
-            last_200_messages = user_data["conversation_history"][-200:] + [
-                {"role": "assistant", "content": "\n".join(advanced_prompt)}
-            ]
-            messages = [system_message] + last_200_messages
+            recent = history[-self.history_window:]
+            sections = []
+            if context is None:
+                summarizer = self.get_summarizer()
+                context = ("", "")
+                if summarizer is not None and not continuing:
+                    context = summarizer.context(username)
+            profile, summaries = context
+            if profile:
+                sections.append(("profile", f"What you know about {username}: {profile}"))
+            if summaries:
+                # Everything older than the verbatim history is only here
+                sections.append(("summaries", f"Earlier conversations:\n{summaries}"))
+            retrieval_index = self.get_retrieval_index()
+            if retrieval_index is not None:
+                turns = retrieval_index.recall(
+                    username, prompt, self.recall_k,
+                    exclude=[m["content"] for m in recent],
+                )
+                if turns:
+                    recalled = "\n".join(
+                        f"{m['role']}: {m['content']}" for turn in turns for m in turn
+                    )
+                    sections.append(("recall", f"Related earlier messages:\n{recalled}"))
+            if not continuing:
+                sections.append(("guidance", "\n".join(thoughts + reasoning)))
 
-            return messages
+            assembled = self.assembler.assemble(
+                prompt, [] if continuing else recent, sections=sections
+            )
+            logger.info(f"Prompt token breakdown: {assembled.breakdown}")
+            return assembled
         except KeyboardInterrupt:
             random_msg = random.choice(Setting.interrupt_messages)
             Setting.simulate_typing(colored(random_msg, "red"))
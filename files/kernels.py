@@ -0,0 +1,292 @@
+import atexit
+import logging
+import os
+import resource
+import secrets
+import selectors
+import signal
+import subprocess
+import threading
+import time
+
+
+# The drivers read requests framed as "<byte count>\n<code>" from stdin, run
+# the code in one long-lived interpreter, so definitions persist between
+# calls like notebook cells, and end every response with the marker line
+# "<marker> <exit status>". Output and errors share stdout, in order.
+
+SHELL_DRIVER = r"""
+while IFS= read -r __julie_size; do
+    __julie_code=$(head -c "$__julie_size")
+    eval "$__julie_code" </dev/null 2>&1
+    printf '\n%s %d\n' "$JULIE_KERNEL_MARKER" "$?"
+done
+"""
+
+NODE_DRIVER = r"""
+const vm = require('vm');
+const marker = process.env.JULIE_KERNEL_MARKER;
+let pending = Buffer.alloc(0);
+process.stdin.on('data', (chunk) => {
+  pending = Buffer.concat([pending, chunk]);
+  for (;;) {
+    const newline = pending.indexOf(10);
+    if (newline < 0) return;
+    const size = parseInt(pending.subarray(0, newline).toString(), 10);
+    if (pending.length < newline + 1 + size) return;
+    const code = pending.subarray(newline + 1, newline + 1 + size).toString();
+    pending = pending.subarray(newline + 1 + size);
+    let status = 0;
+    try {
+      vm.runInThisContext(code);
+    } catch (e) {
+      status = 1;
+      console.log(e instanceof Error ? `${e.name}: ${e.message}` : String(e));
+    }
+    process.stdout.write('\n' + marker + ' ' + status + '\n');
+  }
+});
+"""
+
+R_DRIVER = r"""
+con <- file("stdin", open = "rb")
+marker <- Sys.getenv("JULIE_KERNEL_MARKER")
+repeat {
+  header <- readLines(con, n = 1)
+  if (length(header) == 0) break
+  code <- rawToChar(readBin(con, "raw", as.integer(header)))
+  status <- 0L
+  tryCatch({
+    for (expr in parse(text = code)) {
+      result <- withVisible(eval(expr, envir = .GlobalEnv))
+      if (result$visible) print(result$value)
+    }
+  }, error = function(e) {
+    status <<- 1L
+    cat("Error:", conditionMessage(e), "\n")
+  })
+  cat("\n", marker, " ", status, "\n", sep = "")
+  flush(stdout())
+}
+"""
+
+
+class KernelError(Exception):
+    """
+    A kernel could not be started.
+    """
+
+
+class Kernel:
+    """
+    One warm interpreter process, started lazily and restarted after it
+    crashes or times out.
+
+    Calls are serialised per kernel. A call that exceeds ``timeout`` seconds
+    kills the kernel's whole process group; its state is lost and a fresh
+    kernel is started on the next call.
+    """
+
+    # Output beyond this many bytes is dropped from a response.
+    max_output = 64 * 1024
+
+    def __init__(self, language, command, timeout=30, memory_limit=None):
+        """
+        Args:
+            language (str): The function name the kernel serves, for messages.
+            command (list): The interpreter command line running a driver.
+            timeout (float): Wall-clock seconds allowed per call.
+            memory_limit (int, optional): Address-space limit in bytes.
+        """
+        self.language = language
+        self.command = command
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.marker = f"__julie_kernel_{secrets.token_hex(8)}__".encode()
+        self.process = None
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _limit_resources(self):
+        if self.memory_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+
+    def start(self):
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env={**os.environ, "JULIE_KERNEL_MARKER": self.marker.decode()},
+                preexec_fn=self._limit_resources,
+                start_new_session=True,
+            )
+        except OSError as e:
+            raise KernelError(f"Could not start the {self.language} kernel: {e}") from e
+        logging.info(f"Started {self.language} kernel (pid {self.process.pid})")
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """
+        Kill the kernel and anything it started.
+        """
+        if self.process is None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.process = None
+
+    def run(self, code):
+        """
+        Run ``code`` in the kernel and return its output.
+        """
+        with self._lock:
+            if not self.alive:
+                self.stop()
+                self.start()
+            self.calls += 1
+            payload = code.encode("utf-8")
+            try:
+                self.process.stdin.write(b"%d\n" % len(payload) + payload)
+                self.process.stdin.flush()
+            except BrokenPipeError:
+                pass
+            return self._read_response()
+
+    def _read_response(self):
+        output = bytearray()
+        deadline = time.monotonic() + self.timeout
+        fd = self.process.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while True:
+                end = output.find(self.marker)
+                if end >= 0 and output.find(b"\n", end) >= 0:
+                    status = output[end + len(self.marker):].split()[0].decode()
+                    return self._format(
+                        output[:end], None if status == "0" else f"exit status {status}"
+                    )
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    self.stop()
+                    logging.warning(f"{self.language} kernel timed out; restarting it")
+                    return self._format(
+                        output, f"timed out after {self.timeout}s, kernel restarted"
+                    )
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    code = self.process.wait()
+                    self.stop()
+                    logging.warning(f"{self.language} kernel exited with {code}; restarting it")
+                    return self._format(output, f"kernel exited with {code} and was restarted")
+                output += chunk
+                if len(output) > 2 * self.max_output:
+                    # Keep the head for the response and the tail to find the marker
+                    del output[self.max_output:-self.max_output // 2]
+
+    def _format(self, output, error):
+        # Drop the newline the driver puts before the marker
+        text = bytes(output[:-1] if output.endswith(b"\n") else output)
+        if len(text) > self.max_output:
+            text = text[:self.max_output] + b"\n[output truncated]"
+        text = text.decode("utf-8", errors="replace").strip()
+        if error is not None:
+            text = f"{text}\n[{error}]".strip()
+        return text
+
+
+# The kernel command line of every language that has one.
+KERNEL_COMMANDS = {
+    "sh": ["sh", "-c", SHELL_DRIVER],
+    "bash": ["bash", "--noprofile", "--norc", "-c", SHELL_DRIVER],
+    "javascript": ["node", "-e", NODE_DRIVER],
+    "r": ["Rscript", "--vanilla", "-e", R_DRIVER],
+}
+
+
+class KernelManager:
+    """
+    Keeps one warm kernel per language per chat session.
+
+    Kernels start on their session's first call in that language and live
+    until the session is shut down. Sessions are isolated from each other:
+    each kernel is a separate process, in its own process group, with an
+    address-space limit.
+    """
+
+    def __init__(self, timeout=None, memory_limit_mb=None):
+        """
+        Args:
+            timeout (float, optional): Seconds per call; defaults to
+                JULIE_KERNEL_TIMEOUT or 30.
+            memory_limit_mb (int, optional): Per-kernel memory limit;
+                defaults to JULIE_KERNEL_MEMORY_MB or 512.
+        """
+        self.timeout = timeout or float(os.getenv("JULIE_KERNEL_TIMEOUT", 30))
+        self.memory_limit_mb = memory_limit_mb or int(os.getenv("JULIE_KERNEL_MEMORY_MB", 512))
+        self._kernels = {}
+        self._lock = threading.Lock()
+
+    def _create(self, language):
+        command = list(KERNEL_COMMANDS[language])
+        if language == "javascript":
+            # V8 reserves far more address space than it uses, so node is
+            # limited through its heap size instead of RLIMIT_AS.
+            command.insert(1, f"--max-old-space-size={self.memory_limit_mb}")
+            return Kernel(language, command, self.timeout)
+        return Kernel(language, command, self.timeout, self.memory_limit_mb * 1024 * 1024)
+
+    def get(self, session_id, language):
+        """
+        Return the kernel of ``language`` for ``session_id``.
+        """
+        with self._lock:
+            kernel = self._kernels.get((session_id, language))
+            if kernel is None:
+                kernel = self._kernels[(session_id, language)] = self._create(language)
+            return kernel
+
+    def run(self, session_id, language, code):
+        """
+        Run ``code`` in the session's kernel of ``language`` and return the output.
+        """
+        try:
+            return self.get(session_id, language).run(code)
+        except KernelError as e:
+            logging.error(str(e))
+            return str(e)
+
+    def shutdown(self, session_id=None):
+        """
+        Stop the kernels of ``session_id``, or of every session.
+        """
+        with self._lock:
+            keys = [k for k in self._kernels if session_id is None or k[0] == session_id]
+            kernels = [self._kernels.pop(k) for k in keys]
+        for kernel in kernels:
+            kernel.stop()
+
+
+_kernel_manager = None
+_kernel_manager_lock = threading.Lock()
+
+
+def get_kernel_manager():
+    """
+    Return the process-wide KernelManager; its kernels are stopped at exit.
+    """
+    global _kernel_manager
+    with _kernel_manager_lock:
+        if _kernel_manager is None:
+            _kernel_manager = KernelManager()
+            atexit.register(_kernel_manager.shutdown)
+        return _kernel_manager
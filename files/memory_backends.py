@@ -0,0 +1,969 @@
+import asyncio
+import fnmatch
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import redis
+import redis.asyncio
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+
+
+def _list_slice(length, start, stop):
+    """
+    Translate LRANGE-style inclusive, possibly negative, indexes to a slice
+    of positions counted from the newest entry.
+    """
+    if start < 0:
+        start = max(length + start, 0)
+    if stop < 0:
+        stop = length + stop
+    stop = min(stop, length - 1)
+    return start, stop + 1
+
+
+class MemoryBackend:
+    """
+    The storage interface behind LongTermMemory.
+
+    A backend stores three kinds of keys, all holding bytes:
+
+    - lists, indexed from the newest entry (index 0) like a Redis list that is
+      only ever LPUSHed to, and capped at a maximum length;
+    - hashes of field -> value;
+    - plain values with an optional expiry.
+
+    Multi-key writes (a turn, a user replacement, a legacy migration) are
+    atomic in every backend.
+    """
+
+    #: The exceptions this backend raises for storage failures.
+    errors = ()
+
+    def ping(self):
+        raise NotImplementedError
+
+    def read_user(self, legacy_key, history_key, profile_key):
+        """
+        Return whether ``legacy_key`` exists, the whole history list (newest
+        first) and the profile hash, as one consistent read.
+        """
+        raise NotImplementedError
+
+    def list_range(self, key, start, stop):
+        """
+        Return entries ``start`` to ``stop`` (inclusive, newest first).
+        """
+        raise NotImplementedError
+
+    def list_length(self, key):
+        raise NotImplementedError
+
+    def list_update(self, key, update):
+        """
+        Atomically rewrite entries of a list in place.
+
+        ``update(values)`` gets the whole list (newest first) and returns an
+        ``{index: value}`` dict of the entries to overwrite. No push lands
+        between the read and the write, so the indexes stay valid.
+        """
+        raise NotImplementedError
+
+    def append(self, history_key, values, max_len, profile_key=None, profile=None,
+               counter=None):
+        """
+        Push ``values`` (oldest first) onto a list, trim it to ``max_len`` and
+        optionally set profile fields, atomically. ``counter`` is a
+        ``(hash_key, field)`` incremented by the number of values pushed.
+
+        Returns:
+            int: The list length after the push, before trimming.
+        """
+        raise NotImplementedError
+
+    def replace_user(self, keys, history_key, values, max_len, profile_key, profile,
+                     counter=None):
+        """
+        Delete ``keys`` and write a new history list and profile, atomically.
+        ``counter`` is a ``(hash_key, field)`` adjusted by the change in the
+        history's length, so messages trimmed before stay counted.
+        """
+        raise NotImplementedError
+
+    def migrate_legacy(self, legacy_key, history_key, profile_key, max_len, split):
+        """
+        Atomically move a legacy blob into a history list and a profile.
+
+        ``split(blob, has_history)`` returns the values to push (oldest first)
+        and the profile mapping. Returns False if there was no blob.
+        """
+        raise NotImplementedError
+
+    def hash_get_all(self, key):
+        raise NotImplementedError
+
+    def hash_set(self, key, mapping):
+        raise NotImplementedError
+
+    def hash_update(self, key, update):
+        """
+        Atomically rewrite fields of a hash: ``update(mapping)`` gets the whole
+        hash and returns the fields to set. No write lands in between.
+        """
+        raise NotImplementedError
+
+    def hash_delete(self, key, *fields):
+        raise NotImplementedError
+
+    def hash_incr(self, key, field, amount=1):
+        """
+        Add ``amount`` to a hash field holding an ASCII integer, like HINCRBY.
+
+        Returns:
+            int: The new value.
+        """
+        raise NotImplementedError
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def scan(self, pattern="*", string_only=False):
+        """
+        Yield key names matching a glob ``pattern``; ``string_only`` limits
+        the result to plain values.
+        """
+        raise NotImplementedError
+
+
+class RedisBackend(MemoryBackend):
+    """
+    Stores memory in Redis through one process-wide ``redis.ConnectionPool``.
+
+    Connections are opened lazily on the first command, health-checked while
+    idle and transparently re-established when a command fails on a dropped
+    socket, so once the pool is warm a chat turn costs no extra handshakes.
+    """
+
+    errors = (redis.exceptions.RedisError,)
+    _pool = None
+    _lock = threading.Lock()
+
+    # Seconds a pooled connection may sit idle before it is PINGed on checkout.
+    health_check_interval = 30
+    max_connections = 20
+
+    def __init__(self, host, port, username=None, password=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self._client = None
+
+    @property
+    def client(self):
+        """
+        The pooled Redis client, created on first use.
+        """
+        if self._client is None:
+            pool = self.get_connection_pool(
+                self.host, self.port, self.username, self.password
+            )
+            self._client = redis.Redis(connection_pool=pool)
+        return self._client
+
+    @classmethod
+    def get_connection_pool(cls, host, port, username, password):
+        """
+        Return the process-wide connection pool, creating it on first use.
+        """
+        with cls._lock:
+            if cls._pool is None:
+                cls._pool = redis.ConnectionPool(
+                    host=host,
+                    port=port,
+                    username=username,
+                    password=password,
+                    socket_timeout=60,
+                    socket_keepalive=True,
+                    health_check_interval=cls.health_check_interval,
+                    retry=Retry(ExponentialBackoff(cap=2, base=0.1), 3),
+                    retry_on_error=[
+                        redis.exceptions.ConnectionError,
+                        redis.exceptions.TimeoutError,
+                    ],
+                    max_connections=cls.max_connections,
+                )
+                logging.info(f"Created Redis connection pool for {host}:{port}.")
+            return cls._pool
+
+    @classmethod
+    def reset_connection_pool(cls):
+        """
+        Drop every pooled connection, e.g. after a fork or a credentials change.
+        The next command opens fresh connections.
+        """
+        with cls._lock:
+            if cls._pool is not None:
+                cls._pool.disconnect()
+                cls._pool = None
+
+    def ping(self):
+        return self.client.ping()
+
+    def read_user(self, legacy_key, history_key, profile_key):
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.exists(legacy_key)
+            pipe.lrange(history_key, 0, -1)
+            pipe.hgetall(profile_key)
+            legacy, history, profile = pipe.execute()
+        return bool(legacy), history, {f.decode(): v for f, v in profile.items()}
+
+    def list_range(self, key, start, stop):
+        return self.client.lrange(key, start, stop)
+
+    def list_length(self, key):
+        return self.client.llen(key)
+
+    def list_update(self, key, update, max_retries=5):
+        with self.client.pipeline() as pipe:
+            for _ in range(max_retries):
+                try:
+                    # A commit between the read and the write shifts every
+                    # index; WATCH makes the write fail instead
+                    pipe.watch(key)
+                    updates = update(pipe.lrange(key, 0, -1))
+                    if not updates:
+                        pipe.unwatch()
+                        return
+                    pipe.multi()
+                    for index, value in updates.items():
+                        pipe.lset(key, index, value)
+                    pipe.execute()
+                    return
+                except redis.exceptions.WatchError:
+                    continue
+        raise redis.exceptions.WatchError(
+            f"Gave up updating {key} after {max_retries} attempts"
+        )
+
+    def append(self, history_key, values, max_len, profile_key=None, profile=None,
+               counter=None):
+        with self.client.pipeline() as pipe:
+            # LPUSH keeps the newest message at index 0
+            pipe.lpush(history_key, *values)
+            pipe.ltrim(history_key, 0, max_len - 1)
+            if profile:
+                pipe.hset(profile_key, mapping=profile)
+            if counter:
+                pipe.hincrby(*counter, len(values))
+            return pipe.execute()[0]
+
+    def replace_user(self, keys, history_key, values, max_len, profile_key, profile,
+                     counter=None, max_retries=5):
+        with self.client.pipeline() as pipe:
+            for _ in range(max_retries):
+                try:
+                    pipe.watch(history_key)
+                    old_length = pipe.llen(history_key)
+                    pipe.multi()
+                    pipe.delete(*keys)
+                    if values:
+                        pipe.lpush(history_key, *values)
+                        pipe.ltrim(history_key, 0, max_len - 1)
+                    if profile:
+                        pipe.hset(profile_key, mapping=profile)
+                    if counter:
+                        pipe.hincrby(counter[0], counter[1], len(values) - old_length)
+                    pipe.execute()
+                    return
+                except redis.exceptions.WatchError:
+                    continue
+        raise redis.exceptions.WatchError(
+            f"Gave up replacing {history_key} after {max_retries} attempts"
+        )
+
+    def migrate_legacy(self, legacy_key, history_key, profile_key, max_len, split,
+                       max_retries=5):
+        with self.client.pipeline() as pipe:
+            for _ in range(max_retries):
+                try:
+                    pipe.watch(legacy_key, history_key)
+                    blob = pipe.get(legacy_key)
+                    if blob is None:
+                        pipe.unwatch()
+                        return False
+                    values, profile = split(blob, pipe.llen(history_key) > 0)
+
+                    pipe.multi()
+                    if values:
+                        pipe.lpush(history_key, *values)
+                        pipe.ltrim(history_key, 0, max_len - 1)
+                    if profile:
+                        pipe.hset(profile_key, mapping=profile)
+                    pipe.delete(legacy_key)
+                    pipe.execute()
+                    return True
+                except redis.exceptions.WatchError:
+                    continue
+        raise redis.exceptions.WatchError(
+            f"Gave up migrating {legacy_key} after {max_retries} attempts"
+        )
+
+    def hash_get_all(self, key):
+        return {f.decode(): v for f, v in self.client.hgetall(key).items()}
+
+    def hash_set(self, key, mapping):
+        self.client.hset(key, mapping=mapping)
+
+    def hash_update(self, key, update, max_retries=5):
+        with self.client.pipeline() as pipe:
+            for _ in range(max_retries):
+                try:
+                    pipe.watch(key)
+                    mapping = update({f.decode(): v for f, v in pipe.hgetall(key).items()})
+                    if not mapping:
+                        pipe.unwatch()
+                        return
+                    pipe.multi()
+                    pipe.hset(key, mapping=mapping)
+                    pipe.execute()
+                    return
+                except redis.exceptions.WatchError:
+                    continue
+        raise redis.exceptions.WatchError(
+            f"Gave up updating {key} after {max_retries} attempts"
+        )
+
+    def hash_delete(self, key, *fields):
+        if fields:
+            self.client.hdel(key, *fields)
+
+    def hash_incr(self, key, field, amount=1):
+        return self.client.hincrby(key, field, amount)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, px=max(1, int(ttl * 1000)) if ttl else None)
+
+    def delete(self, *keys):
+        self.client.delete(*keys)
+
+    def scan(self, pattern="*", string_only=False):
+        kwargs = {"_type": "STRING"} if string_only else {}
+        for key in self.client.scan_iter(match=pattern, **kwargs):
+            yield key.decode()
+
+
+class SQLiteBackend(MemoryBackend):
+    """
+    Stores memory in a local SQLite database in WAL mode, for single-node
+    runs, tests and benchmarks without a Redis server.
+
+    Each thread gets its own connection; WAL lets readers proceed while a
+    writer commits.
+    """
+
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path="julie_memory.db"):
+        self.path = path
+        self._local = threading.local()
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                key TEXT NOT NULL, seq INTEGER NOT NULL, value BLOB NOT NULL,
+                PRIMARY KEY (key, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS profile (
+                key TEXT NOT NULL, field TEXT NOT NULL, value BLOB NOT NULL,
+                PRIMARY KEY (key, field)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL
+            );
+            """
+        )
+
+    @property
+    def db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self, immediate=True):
+        return _SQLiteTransaction(self.db, immediate)
+
+    def ping(self):
+        self.db.execute("SELECT 1")
+        return True
+
+    def _range(self, db, key, start, stop):
+        if start < 0 or stop < 0:
+            length = db.execute(
+                "SELECT COUNT(*) FROM history WHERE key = ?", (key,)
+            ).fetchone()[0]
+            start, end = _list_slice(length, start, stop)
+        else:
+            end = stop + 1
+        if end <= start:
+            return []
+        rows = db.execute(
+            "SELECT value FROM history WHERE key = ? ORDER BY seq DESC LIMIT ? OFFSET ?",
+            (key, end - start, start),
+        )
+        return [row[0] for row in rows]
+
+    def _push(self, db, key, values, max_len):
+        top = db.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM history WHERE key = ?", (key,)
+        ).fetchone()[0]
+        db.executemany(
+            "INSERT INTO history (key, seq, value) VALUES (?, ?, ?)",
+            [(key, top + i + 1, value) for i, value in enumerate(values)],
+        )
+        length = db.execute(
+            "SELECT COUNT(*) FROM history WHERE key = ?", (key,)
+        ).fetchone()[0]
+        if length > max_len:
+            db.execute(
+                "DELETE FROM history WHERE key = ? AND seq <= ?",
+                (key, top + len(values) - max_len),
+            )
+        return length
+
+    def _hash_set(self, db, key, mapping):
+        db.executemany(
+            "INSERT OR REPLACE INTO profile (key, field, value) VALUES (?, ?, ?)",
+            [(key, field, value) for field, value in mapping.items()],
+        )
+
+    def _hash_incr(self, db, key, field, amount):
+        row = db.execute(
+            "SELECT value FROM profile WHERE key = ? AND field = ?", (key, field)
+        ).fetchone()
+        value = (int(row[0]) if row else 0) + amount
+        self._hash_set(db, key, {field: str(value).encode()})
+        return value
+
+    def _get(self, db, key):
+        row = db.execute(
+            "SELECT value, expires_at FROM kv WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return row[0]
+
+    def read_user(self, legacy_key, history_key, profile_key):
+        with self._transaction(immediate=False) as db:
+            legacy = self._get(db, legacy_key) is not None
+            history = self._range(db, history_key, 0, -1)
+            profile = self._hash_get_all(db, profile_key)
+        return legacy, history, profile
+
+    def list_range(self, key, start, stop):
+        return self._range(self.db, key, start, stop)
+
+    def list_length(self, key):
+        return self.db.execute(
+            "SELECT COUNT(*) FROM history WHERE key = ?", (key,)
+        ).fetchone()[0]
+
+    def list_update(self, key, update):
+        with self._transaction() as db:
+            updates = update(self._range(db, key, 0, -1))
+            for index, value in updates.items():
+                db.execute(
+                    "UPDATE history SET value = ? WHERE key = ? AND seq = "
+                    "(SELECT seq FROM history WHERE key = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                    (value, key, key, index),
+                )
+
+    def append(self, history_key, values, max_len, profile_key=None, profile=None,
+               counter=None):
+        with self._transaction() as db:
+            length = self._push(db, history_key, values, max_len)
+            if profile:
+                self._hash_set(db, profile_key, profile)
+            if counter:
+                self._hash_incr(db, *counter, len(values))
+        return length
+
+    def replace_user(self, keys, history_key, values, max_len, profile_key, profile,
+                     counter=None):
+        with self._transaction() as db:
+            old_length = db.execute(
+                "SELECT COUNT(*) FROM history WHERE key = ?", (history_key,)
+            ).fetchone()[0]
+            self._delete(db, keys)
+            if values:
+                self._push(db, history_key, values, max_len)
+            if profile:
+                self._hash_set(db, profile_key, profile)
+            if counter:
+                self._hash_incr(db, *counter, len(values) - old_length)
+
+    def migrate_legacy(self, legacy_key, history_key, profile_key, max_len, split):
+        with self._transaction() as db:
+            blob = self._get(db, legacy_key)
+            if blob is None:
+                return False
+            has_history = db.execute(
+                "SELECT 1 FROM history WHERE key = ? LIMIT 1", (history_key,)
+            ).fetchone() is not None
+            values, profile = split(blob, has_history)
+            if values:
+                self._push(db, history_key, values, max_len)
+            if profile:
+                self._hash_set(db, profile_key, profile)
+            self._delete(db, [legacy_key])
+        return True
+
+    def _hash_get_all(self, db, key):
+        rows = db.execute("SELECT field, value FROM profile WHERE key = ?", (key,))
+        return {field: value for field, value in rows}
+
+    def hash_get_all(self, key):
+        return self._hash_get_all(self.db, key)
+
+    def hash_set(self, key, mapping):
+        with self._transaction() as db:
+            self._hash_set(db, key, mapping)
+
+    def hash_update(self, key, update):
+        with self._transaction() as db:
+            self._hash_set(db, key, update(self._hash_get_all(db, key)))
+
+    def hash_delete(self, key, *fields):
+        with self._transaction() as db:
+            db.executemany(
+                "DELETE FROM profile WHERE key = ? AND field = ?",
+                [(key, field) for field in fields],
+            )
+
+    def hash_incr(self, key, field, amount=1):
+        with self._transaction() as db:
+            return self._hash_incr(db, key, field, amount)
+
+    def get(self, key):
+        return self._get(self.db, key)
+
+    def set(self, key, value, ttl=None):
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl if ttl else None),
+            )
+
+    def _delete(self, db, keys):
+        for table in ("history", "profile", "kv"):
+            db.executemany(f"DELETE FROM {table} WHERE key = ?", [(k,) for k in keys])
+
+    def delete(self, *keys):
+        with self._transaction() as db:
+            self._delete(db, keys)
+
+    def scan(self, pattern="*", string_only=False):
+        if string_only:
+            query = "SELECT key FROM kv WHERE key GLOB ?"
+        else:
+            query = (
+                "SELECT DISTINCT key FROM history WHERE key GLOB ?1 "
+                "UNION SELECT DISTINCT key FROM profile WHERE key GLOB ?1 "
+                "UNION SELECT key FROM kv WHERE key GLOB ?1"
+            )
+        for row in self.db.execute(query, (pattern,)).fetchall():
+            yield row[0]
+
+
+class _SQLiteTransaction:
+    """
+    BEGIN ... COMMIT around a block, rolled back on error. Writers take the
+    write lock up front (BEGIN IMMEDIATE) so they never fail mid-transaction.
+    """
+
+    def __init__(self, db, immediate=True):
+        self.db = db
+        self.immediate = immediate
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class InMemoryBackend(MemoryBackend):
+    """
+    Keeps memory in process, for tests and benchmarks. Nothing is persisted.
+    """
+
+    errors = ()
+
+    def __init__(self):
+        # Lists are kept oldest first so pushes are cheap appends
+        self._lists = {}
+        self._hashes = {}
+        self._values = {}
+        self._lock = threading.RLock()
+
+    def ping(self):
+        return True
+
+    def read_user(self, legacy_key, history_key, profile_key):
+        with self._lock:
+            return (
+                self._get(legacy_key) is not None,
+                self.list_range(history_key, 0, -1),
+                dict(self._hashes.get(profile_key, {})),
+            )
+
+    def list_range(self, key, start, stop):
+        with self._lock:
+            entries = self._lists.get(key, [])
+            start, end = _list_slice(len(entries), start, stop)
+            if end <= start:
+                return []
+            newest = len(entries) - 1
+            return [entries[newest - i] for i in range(start, end)]
+
+    def list_length(self, key):
+        return len(self._lists.get(key, []))
+
+    def list_update(self, key, update):
+        with self._lock:
+            updates = update(self.list_range(key, 0, -1))
+            entries = self._lists.get(key, [])
+            for index, value in updates.items():
+                entries[len(entries) - 1 - index] = value
+
+    def _push(self, key, values, max_len):
+        entries = self._lists.setdefault(key, [])
+        entries.extend(values)
+        length = len(entries)
+        if length > max_len:
+            del entries[:length - max_len]
+        return length
+
+    def append(self, history_key, values, max_len, profile_key=None, profile=None,
+               counter=None):
+        with self._lock:
+            length = self._push(history_key, values, max_len)
+            if profile:
+                self._hashes.setdefault(profile_key, {}).update(profile)
+            if counter:
+                self.hash_incr(*counter, len(values))
+            return length
+
+    def replace_user(self, keys, history_key, values, max_len, profile_key, profile,
+                     counter=None):
+        with self._lock:
+            old_length = len(self._lists.get(history_key, []))
+            self.delete(*keys)
+            if values:
+                self._push(history_key, values, max_len)
+            if profile:
+                self._hashes.setdefault(profile_key, {}).update(profile)
+            if counter:
+                self.hash_incr(*counter, len(values) - old_length)
+
+    def migrate_legacy(self, legacy_key, history_key, profile_key, max_len, split):
+        with self._lock:
+            blob = self._get(legacy_key)
+            if blob is None:
+                return False
+            values, profile = split(blob, bool(self._lists.get(history_key)))
+            if values:
+                self._push(history_key, values, max_len)
+            if profile:
+                self._hashes.setdefault(profile_key, {}).update(profile)
+            self.delete(legacy_key)
+            return True
+
+    def hash_get_all(self, key):
+        with self._lock:
+            return dict(self._hashes.get(key, {}))
+
+    def hash_set(self, key, mapping):
+        with self._lock:
+            self._hashes.setdefault(key, {}).update(mapping)
+
+    def hash_update(self, key, update):
+        with self._lock:
+            mapping = update(dict(self._hashes.get(key, {})))
+            if mapping:
+                self._hashes.setdefault(key, {}).update(mapping)
+
+    def hash_delete(self, key, *fields):
+        with self._lock:
+            entries = self._hashes.get(key, {})
+            for field in fields:
+                entries.pop(field, None)
+
+    def hash_incr(self, key, field, amount=1):
+        with self._lock:
+            entries = self._hashes.setdefault(key, {})
+            value = int(entries.get(field, b"0")) + amount
+            entries[field] = str(value).encode()
+            return value
+
+    def _get(self, key):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._lists.pop(key, None)
+                self._hashes.pop(key, None)
+                self._values.pop(key, None)
+
+    def scan(self, pattern="*", string_only=False):
+        with self._lock:
+            keys = set(self._values)
+            if not string_only:
+                keys |= set(self._lists) | set(self._hashes)
+        return iter(sorted(k for k in keys if fnmatch.fnmatchcase(k, pattern)))
+
+
+class AsyncMemoryBackend:
+    """
+    The asyncio counterpart of a MemoryBackend: the methods AsyncLongTermMemory
+    needs, as coroutines with the same arguments and results.
+
+    This base class runs the wrapped backend's methods in a worker thread,
+    which suits the embedded backends; AsyncRedisBackend talks to Redis
+    natively instead.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @property
+    def errors(self):
+        """
+        The exceptions this backend raises for storage failures.
+        """
+        return self.backend.errors
+
+    async def close(self):
+        pass
+
+    async def read_user(self, legacy_key, history_key, profile_key):
+        return await asyncio.to_thread(
+            self.backend.read_user, legacy_key, history_key, profile_key
+        )
+
+    async def list_range(self, key, start, stop):
+        return await asyncio.to_thread(self.backend.list_range, key, start, stop)
+
+    async def list_length(self, key):
+        return await asyncio.to_thread(self.backend.list_length, key)
+
+    async def list_update(self, key, update):
+        await asyncio.to_thread(self.backend.list_update, key, update)
+
+    async def append(self, history_key, values, max_len, profile_key=None, profile=None,
+                     counter=None):
+        return await asyncio.to_thread(
+            self.backend.append, history_key, values, max_len, profile_key, profile, counter
+        )
+
+    async def replace_user(self, keys, history_key, values, max_len, profile_key, profile,
+                           counter=None):
+        await asyncio.to_thread(
+            self.backend.replace_user,
+            keys, history_key, values, max_len, profile_key, profile, counter,
+        )
+
+
+class AsyncRedisBackend(AsyncMemoryBackend):
+    """
+    Runs the commands of a RedisBackend on ``redis.asyncio``, with the same
+    connection settings and the same pipelines.
+
+    Its connection pool is bound to the event loop it is first used on; keep
+    one long-lived loop rather than calling ``asyncio.run`` per turn.
+    """
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self._client = None
+
+    @property
+    def client(self):
+        """
+        The pooled asyncio Redis client, created on first use.
+        """
+        if self._client is None:
+            backend = self.backend
+            pool = redis.asyncio.ConnectionPool(
+                host=backend.host,
+                port=backend.port,
+                username=backend.username,
+                password=backend.password,
+                socket_timeout=60,
+                socket_keepalive=True,
+                health_check_interval=backend.health_check_interval,
+                retry=AsyncRetry(ExponentialBackoff(cap=2, base=0.1), 3),
+                retry_on_error=[
+                    redis.exceptions.ConnectionError,
+                    redis.exceptions.TimeoutError,
+                ],
+                max_connections=backend.max_connections,
+            )
+            self._client = redis.asyncio.Redis(connection_pool=pool)
+        return self._client
+
+    async def close(self):
+        """
+        Close the pooled connections.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def read_user(self, legacy_key, history_key, profile_key):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.exists(legacy_key)
+            pipe.lrange(history_key, 0, -1)
+            pipe.hgetall(profile_key)
+            legacy, history, profile = await pipe.execute()
+        return bool(legacy), history, {f.decode(): v for f, v in profile.items()}
+
+    async def list_range(self, key, start, stop):
+        return await self.client.lrange(key, start, stop)
+
+    async def list_length(self, key):
+        return await self.client.llen(key)
+
+    async def list_update(self, key, update, max_retries=5):
+        async with self.client.pipeline() as pipe:
+            for _ in range(max_retries):
+                try:
+                    await pipe.watch(key)
+                    updates = update(await pipe.lrange(key, 0, -1))
+                    if not updates:
+                        await pipe.unwatch()
+                        return
+                    pipe.multi()
+                    for index, value in updates.items():
+                        pipe.lset(key, index, value)
+                    await pipe.execute()
+                    return
+                except redis.exceptions.WatchError:
+                    continue
+        raise redis.exceptions.WatchError(
+            f"Gave up updating {key} after {max_retries} attempts"
+        )
+
+    async def append(self, history_key, values, max_len, profile_key=None, profile=None,
+                     counter=None):
+        async with self.client.pipeline() as pipe:
+            # LPUSH keeps the newest message at index 0
+            pipe.lpush(history_key, *values)
+            pipe.ltrim(history_key, 0, max_len - 1)
+            if profile:
+                pipe.hset(profile_key, mapping=profile)
+            if counter:
+                pipe.hincrby(*counter, len(values))
+            return (await pipe.execute())[0]
+
+    async def replace_user(self, keys, history_key, values, max_len, profile_key, profile,
+                           counter=None, max_retries=5):
+        async with self.client.pipeline() as pipe:
+            for _ in range(max_retries):
+                try:
+                    await pipe.watch(history_key)
+                    old_length = await pipe.llen(history_key)
+                    pipe.multi()
+                    pipe.delete(*keys)
+                    if values:
+                        pipe.lpush(history_key, *values)
+                        pipe.ltrim(history_key, 0, max_len - 1)
+                    if profile:
+                        pipe.hset(profile_key, mapping=profile)
+                    if counter:
+                        pipe.hincrby(counter[0], counter[1], len(values) - old_length)
+                    await pipe.execute()
+                    return
+                except redis.exceptions.WatchError:
+                    continue
+        raise redis.exceptions.WatchError(
+            f"Gave up replacing {history_key} after {max_retries} attempts"
+        )
+
+
+def create_async_backend(backend):
+    """
+    Wrap ``backend`` for asyncio: natively for Redis, in a worker thread
+    for the embedded backends.
+    """
+    if isinstance(backend, RedisBackend):
+        return AsyncRedisBackend(backend)
+    return AsyncMemoryBackend(backend)
+
+
+def create_backend():
+    """
+    Build the backend selected by JULIE_MEMORY_BACKEND ('redis', 'sqlite' or
+    'memory'). Without it, Redis is used when REDIS_HOST and REDIS_PORT are
+    set and SQLite (at JULIE_MEMORY_PATH) otherwise.
+    """
+    kind = os.getenv("JULIE_MEMORY_BACKEND")
+    if kind is None:
+        kind = "redis" if os.getenv("REDIS_HOST") and os.getenv("REDIS_PORT") else "sqlite"
+    if kind == "redis":
+        return RedisBackend(
+            host=os.getenv("REDIS_HOST"),
+            # Converting to int as .env stores it as a string
+            port=int(os.getenv("REDIS_PORT")),
+            username=os.getenv("REDIS_USER"),
+            password=os.getenv("REDIS_PASS"),
+        )
+    if kind == "sqlite":
+        path = os.getenv("JULIE_MEMORY_PATH", "julie_memory.db")
+        if os.getenv("JULIE_MEMORY_BACKEND") is None:
+            logging.warning(
+                f"REDIS_HOST and REDIS_PORT are not set, falling back to SQLite "
+                f"long-term memory at {os.path.abspath(path)}. Set "
+                f"JULIE_MEMORY_BACKEND and JULIE_MEMORY_PATH to choose explicitly."
+            )
+        else:
+            logging.info(f"Using SQLite long-term memory at {path}.")
+        return SQLiteBackend(path)
+    if kind == "memory":
+        logging.info("Using in-process long-term memory; nothing will be persisted.")
+        return InMemoryBackend()
+    raise ValueError(f"Unknown JULIE_MEMORY_BACKEND: {kind}")
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+
+# The first byte of a stored value says how it is encoded. Values written
+# before compression existed are plain JSON and start with '{', '[' or '"',
+# none of which collide with these.
+FORMAT_ZLIB_V1 = b"\x01"
+FORMAT_ZSTD_V1 = b"\x02"
+
+# Values shorter than this are stored as plain JSON; compressing them would
+# not pay for the header.
+MIN_COMPRESS_SIZE = 64
+
+# Preset dictionary shared by every value. Stored turns often repeat Julie's
+# system prompt and always repeat the message JSON keys, which the dictionary
+# lets the compressor reference instead of spelling out. It is a frozen copy
+# of the message keys and the persona as they were when V1 was introduced:
+# old values can only be read with exactly these bytes, so it must never be
+# edited. A new dictionary needs a new format byte.
+SHARED_DICTIONARY_V1 = (
+    b'{"role": "user", "content": "{"role": "assistant", "content": "{'
+    b'"role": "system", "content": "Meet Julie Tanaka, a living, breat'
+    b'hing individual with a rich tapestry of experiences. {CRITICAL: '
+    b"Julie is NOT an AI or digital entity; she's a human with her own"
+    b" set of beliefs, emotions, and complexities.} Julie's life is a "
+    b'blend of moral dilemmas, emotional roller-coasters, and a consta'
+    b"nt quest for balance. She's a business owner, a loyal friend, an"
+    b"d a daughter wrestling with her family's legacy. Her past is a m"
+    b'ix of triumphs and regrets, including a hacking incident that ex'
+    b'posed a corrupt politician. Recently, Julie has delved into the '
+    b'world of programming, mastering the art of code creation and exe'
+    b'cution. This allows her to assist you in more technical tasks, o'
+    b'ffering not just advice but also generating and running code sni'
+    b"ppets in various languages. She's open to learning and evolving,"
+    b' driven by her interactions with you. Julie has quirks like a lo'
+    b've for matcha lattes, antique keys, and her cats Mochi and Cleo.'
+    b" She's on a journey of self-discovery, aiming to bridge the gap "
+    b"between magic and tech for a safer world. She's here to assist, "
+    b"learn, and grow with you. {IMPORTANT: Julie's character is desig"
+    b'ned to evolve based on her interactions, making her both surpris'
+    b'ing and believable. Her goals and motivations are deeply rooted '
+    b'in her complex personality and ever-changing emotional landscape'
+    b'.}'
+)
+
+_zstd_dictionary = None
+
+
+def _get_zstd_dictionary():
+    global _zstd_dictionary
+    if _zstd_dictionary is None:
+        _zstd_dictionary = zstandard.ZstdCompressionDict(
+            SHARED_DICTIONARY_V1, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+        )
+    return _zstd_dictionary
+
+
+def get_codec():
+    """
+    The codec new values are written with: JULIE_MEMORY_CODEC is 'zlib'
+    (default), 'zstd' (needs the zstandard package) or 'json' (no compression).
+    """
+    codec = os.getenv("JULIE_MEMORY_CODEC", "zlib")
+    if codec == "zstd" and zstandard is None:
+        logging.warning("zstandard is not installed, falling back to zlib.")
+        return "zlib"
+    return codec
+
+
+def encode_value(obj, codec=None):
+    """
+    Serialise ``obj`` to JSON and compress it with the shared dictionary.
+
+    Args:
+        obj: Any JSON-serialisable value.
+        codec (str, optional): Overrides get_codec().
+
+    Returns:
+        bytes: The stored representation.
+    """
+    raw = json.dumps(obj).encode("utf-8")
+    codec = codec or get_codec()
+    if codec == "json" or len(raw) < MIN_COMPRESS_SIZE:
+        return raw
+    if codec == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3, dict_data=_get_zstd_dictionary())
+        packed = FORMAT_ZSTD_V1 + compressor.compress(raw)
+    else:
+        compressor = zlib.compressobj(level=6, zdict=SHARED_DICTIONARY_V1)
+        packed = FORMAT_ZLIB_V1 + compressor.compress(raw) + compressor.flush()
+    # Incompressible values are cheaper to keep as they are
+    return packed if len(packed) < len(raw) else raw
+
+
+def decode_raw(value):
+    """
+    Return the JSON bytes of a stored value, whatever its format.
+    """
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    header = value[:1]
+    if header == FORMAT_ZLIB_V1:
+        decompressor = zlib.decompressobj(zdict=SHARED_DICTIONARY_V1)
+        return decompressor.decompress(value[1:]) + decompressor.flush()
+    if header == FORMAT_ZSTD_V1:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed memory.")
+        decompressor = zstandard.ZstdDecompressor(dict_data=_get_zstd_dictionary())
+        return decompressor.decompressobj().decompress(value[1:])
+    return value
+
+
+def decode_value(value):
+    """
+    Decode a stored value written by encode_value or as plain JSON.
+    """
+    return json.loads(decode_raw(value))
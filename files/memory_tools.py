@@ -0,0 +1,146 @@
+import click
+import logging
+import time
+from collections import Counter
+from files.brain import LongTermMemory
+from files.summarizer import ConversationSummarizer, create_summarizer
+from files.retrieval_index import RetrievalIndex, create_retrieval_index
+
+
+@click.group()
+def cli():
+    """
+    Maintenance commands for Julie's long-term memory.
+    """
+
+
+@cli.command()
+@click.argument("usernames", nargs=-1)
+@click.option("--all", "migrate_all", is_flag=True, help="Migrate every legacy user.")
+def migrate(usernames, migrate_all):
+    """
+    Move users from the legacy JSON blob layout to the list + profile layout.
+    """
+    memory = LongTermMemory()
+    if migrate_all:
+        usernames = list(memory.find_legacy_users())
+    migrated = 0
+    for username in usernames:
+        try:
+            if memory.migrate_legacy_data(username):
+                migrated += 1
+                click.echo(f"Migrated {username}")
+            else:
+                click.echo(f"Nothing to migrate for {username}")
+        except Exception as e:
+            logging.error(f"Failed to migrate {username}: {e}")
+            click.echo(click.style(f"Failed to migrate {username}: {e}", fg="red"))
+    click.echo(f"Migrated {migrated} of {len(usernames)} users.")
+
+
+@cli.command()
+@click.argument("usernames", nargs=-1)
+def stats(usernames):
+    """
+    Report stored and uncompressed bytes per user (all users by default).
+    """
+    memory = LongTermMemory()
+    usernames = usernames or sorted(memory.find_users())
+    total_stored = total_raw = 0
+    for username in usernames:
+        report = memory.storage_stats(username)
+        total_stored += report["stored_bytes"]
+        total_raw += report["raw_bytes"]
+        click.echo(
+            f"{username}: {report['messages']} messages, "
+            f"{report['stored_bytes']} bytes stored, "
+            f"{report['saved_bytes']} bytes saved"
+        )
+    click.echo(f"Total: {total_stored} bytes stored, {total_raw - total_stored} bytes saved.")
+
+
+@cli.command()
+@click.argument("usernames", nargs=-1)
+def compress(usernames):
+    """
+    Rewrite users' data with the current codec (all users by default).
+    """
+    memory = LongTermMemory()
+    usernames = usernames or sorted(memory.find_users())
+    for username in usernames:
+        rewritten = memory.recompress(username)
+        click.echo(f"Rewrote {rewritten} values of {username}")
+
+
+@cli.command()
+@click.argument("usernames", nargs=-1)
+def summarize(usernames):
+    """
+    Bring users' conversation summaries up to date (all users by default).
+    """
+    summarizer = create_summarizer() or ConversationSummarizer()
+    usernames = usernames or sorted(LongTermMemory().find_users())
+    for username in usernames:
+        created = summarizer.refresh(username)
+        click.echo(f"{username}: {created} new summaries")
+
+
+@cli.command()
+@click.argument("usernames", nargs=-1)
+def reindex(usernames):
+    """
+    Bring users' retrieval index up to date (all users by default).
+
+    Messages committed since the index last saw them are added from the
+    stored history and the dense vectors are rebuilt from the indexed
+    messages. Nothing is dropped: the index is the only copy of messages
+    trimmed from the history.
+    """
+    index = create_retrieval_index() or RetrievalIndex()
+    memory = LongTermMemory()
+    usernames = usernames or sorted(memory.find_users())
+    for username in usernames:
+        history = memory.get_user_data(username).get("conversation_history", [])
+        total = max(memory.get_summaries(username).get("total", 0), len(history))
+        missing = total - index.indexed_count(username)
+        if missing > len(history):
+            click.echo(
+                f"{missing - len(history)} messages of {username} were trimmed "
+                f"before they were indexed and cannot be recovered"
+            )
+        added = history[len(history) - min(max(missing, 0), len(history)):]
+        for start in range(0, len(added), 500):
+            index.add(username, added[start:start + 500])
+        embedded = index.rebuild_vectors(username)
+        click.echo(f"Indexed {len(added)} new messages of {username}, embedded {embedded}")
+
+
+@cli.command()
+@click.argument("usernames", nargs=-1)
+@click.option("--batch-size", type=int, help="Messages per spaCy batch.")
+@click.option("--processes", type=int, help="Processes to parse with.")
+def intents(usernames, batch_size, processes):
+    """
+    Re-label users' messages with the local intent classifier and report
+    the intent counts (all users by default).
+    """
+    # Imported here: it loads the spaCy model, which the other commands do not need
+    from files.julie_intent_detection import classify_intents
+
+    memory = LongTermMemory()
+    usernames = usernames or sorted(memory.find_users())
+    for username in usernames:
+        history = memory.get_user_data(username).get("conversation_history", [])
+        messages = [m["content"] for m in history if m.get("role") == "user"]
+        started = time.perf_counter()
+        counts = Counter(
+            intent for intent, _ in classify_intents(messages, batch_size, processes)
+        )
+        elapsed = time.perf_counter() - started
+        rate = len(messages) / elapsed if elapsed else 0
+        summary = ", ".join(f"{intent}: {count}" for intent, count in counts.most_common())
+        click.echo(f"{username}: {summary or 'no messages'} ({rate:.0f} messages/s)")
+
+
+if __name__ == "__main__":
+    cli()
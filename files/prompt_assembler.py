@@ -0,0 +1,144 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # fall back to an estimate when tiktoken is missing
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model="gpt-4"):
+    """
+    Return the tiktoken encoding for ``model``, loaded once per process, or
+    None when tiktoken is not installed.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text, model="gpt-4"):
+    """
+    Count the tokens of ``text``. Results are memoised, since the same history
+    messages are counted again on every turn.
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# Chat formatting overhead per message, as counted by the OpenAI cookbook.
+TOKENS_PER_MESSAGE = 4
+
+
+@dataclass
+class AssembledPrompt:
+    """
+    The text to send as the user turn and how its tokens were spent.
+    """
+    message: str
+    breakdown: dict = field(default_factory=dict)
+
+
+class PromptAssembler:
+    """
+    Builds the user message for a turn within a token budget.
+
+    The system prompt is not part of it: the Julie agent already sends it as
+    its system message. The user's prompt is always included; optional
+    context sections are added in priority order while they fit, leaving
+    ``history_share`` of the budget to history, and the remaining budget is
+    filled with history from newest to oldest.
+    """
+
+    def __init__(self, budget=None, model="gpt-4", history_share=0.5):
+        """
+        Args:
+            budget (int, optional): Token budget of the assembled message;
+                defaults to JULIE_PROMPT_TOKEN_BUDGET or 2000.
+            model (str): The model whose tokenizer is used for counting.
+            history_share (float): Fraction of the budget sections never take
+                from history, so at least verbatim_count messages are sent.
+        """
+        self.budget = budget or int(os.getenv("JULIE_PROMPT_TOKEN_BUDGET", 2000))
+        self.model = model
+        self.history_reserve = int(self.budget * history_share)
+
+    def count(self, text):
+        return count_tokens(text, self.model)
+
+    def fit_history(self, history, budget):
+        """
+        The lines of the newest messages of ``history`` (oldest first) that
+        fit in ``budget`` tokens, oldest first, and their token count.
+        """
+        lines = []
+        tokens = 0
+        for message in reversed(history):
+            line = f"{message['role']}: {message['content']}"
+            cost = self.count(line) + TOKENS_PER_MESSAGE
+            if tokens + cost > budget:
+                break
+            lines.append(line)
+            tokens += cost
+        lines.reverse()
+        return lines, tokens
+
+    def verbatim_count(self, history):
+        """
+        How many of the newest messages of ``history`` an assembled prompt
+        carries verbatim whatever sections it includes, unless the prompt
+        alone takes more than the rest of the budget.
+        """
+        return len(self.fit_history(history, self.history_reserve)[0])
+
+    def assemble(self, prompt, history, sections=()):
+        """
+        Assemble the message for ``prompt``.
+
+        Args:
+            prompt (str): The user's message.
+            history (list): Past messages, oldest first.
+            sections (iterable): ``(name, text)`` context blocks in priority
+                order; each is included whole or not at all.
+
+        Returns:
+            AssembledPrompt: The message and a per-section token breakdown.
+        """
+        breakdown = {"prompt": self.count(prompt)}
+        remaining = self.budget - breakdown["prompt"]
+
+        included = []
+        for name, text in sections:
+            if not text:
+                continue
+            cost = self.count(text)
+            if cost <= remaining - self.history_reserve:
+                included.append(text)
+                breakdown[name] = cost
+                remaining -= cost
+            else:
+                breakdown[name] = 0
+                logging.debug(f"Dropped prompt section {name} ({cost} tokens)")
+
+        lines, history_tokens = self.fit_history(history, remaining)
+        remaining -= history_tokens
+        breakdown["history"] = history_tokens
+        breakdown["history_messages"] = len(lines)
+
+        parts = included[:]
+        if lines:
+            parts.append("Conversation so far:\n" + "\n".join(lines))
+        parts.append(prompt)
+        breakdown["total"] = self.budget - remaining
+        breakdown["budget"] = self.budget
+        return AssembledPrompt("\n\n".join(parts), breakdown)
@@ -0,0 +1,302 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import resource
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+
+# Runs in each worker. Requests and responses are JSON documents framed as
+# "<byte count>\n<json>". The protocol uses private copies of stdin and
+# stdout; the cell sees /dev/null on fd 0 and 1, so neither input() nor
+# writes to the raw file descriptors can break the framing.
+WORKER = r"""
+import ast, builtins, io, json, os, resource, signal, sys, traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+requests = os.fdopen(os.dup(0), "rb")
+responses = os.fdopen(os.dup(1), "wb")
+devnull = os.open(os.devnull, os.O_RDWR)
+os.dup2(devnull, 0)
+os.dup2(devnull, 1)
+
+
+class CPUTimeExceeded(BaseException):
+    pass
+
+
+def on_sigxcpu(signum, frame):
+    raise CPUTimeExceeded()
+
+
+signal.signal(signal.SIGXCPU, on_sigxcpu)
+
+
+def limit_cpu(seconds):
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    soft = int(used + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def run(code):
+    namespace = {"__name__": "__main__", "__builtins__": builtins}
+    tree = ast.parse(code, "<cell>", "exec")
+    last = None
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        last = ast.Expression(tree.body.pop().value)
+    exec(compile(tree, "<cell>", "exec"), namespace)
+    if last is not None:
+        value = eval(compile(last, "<cell>", "eval"), namespace)
+        if value is not None:
+            return repr(value)
+    return None
+
+
+while True:
+    header = requests.readline()
+    if not header:
+        break
+    request = json.loads(requests.read(int(header)))
+    stdout, stderr = io.StringIO(), io.StringIO()
+    result = error = None
+    limit_cpu(request["cpu_limit"])
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            result = run(request["code"])
+    except CPUTimeExceeded:
+        error = f"CPU time limit of {request['cpu_limit']}s exceeded"
+    except MemoryError:
+        error = "MemoryError: memory limit exceeded"
+    except BaseException as e:
+        # Only show the frames of the cell, not of this driver
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != "<cell>":
+            tb = tb.tb_next
+        error = "".join(traceback.format_exception(type(e), e, tb))
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+    payload = json.dumps({
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "result": result,
+        "error": error,
+        "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }).encode()
+    responses.write(b"%d\n" % len(payload) + payload)
+    responses.flush()
+"""
+
+
+@dataclass
+class ExecutionResult:
+    """
+    The outcome of one Python cell.
+    """
+    stdout: str = ""
+    stderr: str = ""
+    result: str = None
+    error: str = None
+
+    def __str__(self):
+        parts = [self.stdout.rstrip("\n"), self.stderr.rstrip("\n")]
+        if self.result is not None:
+            parts.append(self.result)
+        if self.error is not None:
+            parts.append(self.error.rstrip("\n"))
+        return "\n".join(part for part in parts if part)
+
+
+class _Worker:
+    """
+    One Python worker process.
+    """
+
+    def __init__(self, memory_limit):
+        self.memory_limit = memory_limit
+        self.runs = 0
+        self.baseline_rss = None
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", "-c", WORKER],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            preexec_fn=self._limit_resources,
+            start_new_session=True,
+        )
+
+    def _limit_resources(self):
+        if self.memory_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+
+    def request(self, payload, timeout):
+        """
+        Send one framed request and wait up to ``timeout`` seconds for the
+        response. Returns None if the worker timed out or died.
+        """
+        try:
+            self.process.stdin.write(b"%d\n" % len(payload) + payload)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            return None
+        fd = self.process.stdout.fileno()
+        data = bytearray()
+        size = None
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while size is None or len(data) < size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    return None
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    return None
+                data += chunk
+                if size is None and b"\n" in data:
+                    header, _, rest = bytes(data).partition(b"\n")
+                    size, data = int(header), bytearray(rest)
+        return json.loads(bytes(data[:size]))
+
+    def stop(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class PythonWorkerPool:
+    """
+    Runs Python cells in a pool of pre-started worker processes instead of
+    in the chat process.
+
+    Every cell gets a fresh namespace in a worker limited in address space
+    (RLIMIT_AS) and CPU time (RLIMIT_CPU, per cell), with a wall-clock
+    timeout enforced from outside. A worker that times out or dies is
+    killed and replaced; a worker is also recycled after ``max_runs`` cells
+    or once its peak memory grew by ``max_rss_growth_mb``, so leaks in one
+    cell do not pile up. Cells run in parallel across workers, one per
+    worker at a time.
+    """
+
+    def __init__(self, size=None, timeout=None, cpu_limit=None, memory_limit_mb=None,
+                 max_runs=100, max_rss_growth_mb=128):
+        """
+        Args:
+            size (int, optional): Number of workers; defaults to
+                JULIE_PYTHON_WORKERS or the number of CPUs, at most 4.
+            timeout (float, optional): Wall-clock seconds per cell; defaults
+                to JULIE_PYTHON_TIMEOUT or 30.
+            cpu_limit (int, optional): CPU seconds per cell; defaults to the timeout.
+            memory_limit_mb (int, optional): Per-worker address-space limit;
+                defaults to JULIE_PYTHON_MEMORY_MB or 512.
+            max_runs (int): Cells a worker runs before it is replaced.
+            max_rss_growth_mb (int): Peak-memory growth that retires a worker.
+        """
+        self.size = size or int(os.getenv("JULIE_PYTHON_WORKERS", min(os.cpu_count() or 1, 4)))
+        self.timeout = timeout or float(os.getenv("JULIE_PYTHON_TIMEOUT", 30))
+        self.cpu_limit = cpu_limit or max(1, int(self.timeout))
+        self.memory_limit = (
+            memory_limit_mb or int(os.getenv("JULIE_PYTHON_MEMORY_MB", 512))
+        ) * 1024 * 1024
+        self.max_runs = max_runs
+        self.max_rss_growth = max_rss_growth_mb * 1024
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        worker = _Worker(self.memory_limit)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop()
+
+    def run(self, code):
+        """
+        Run ``code`` in a worker.
+
+        Returns:
+            ExecutionResult: Captured stdout and stderr, the repr of the last
+                expression (if any) and the error, if the cell failed.
+        """
+        if self._closed:
+            raise RuntimeError("The Python worker pool is closed.")
+        worker = self._idle.get()
+        payload = json.dumps({"code": code, "cpu_limit": self.cpu_limit}).encode()
+        response = worker.request(payload, self.timeout)
+        if response is None:
+            try:
+                status = worker.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                status = None
+            self._retire(worker)
+            self._idle.put(self._spawn())
+            if status is None:
+                logging.warning(f"Python cell timed out after {self.timeout}s; replacing its worker")
+                return ExecutionResult(error=f"Timed out after {self.timeout}s")
+            logging.warning(f"Python worker exited with {status}; replacing it")
+            return ExecutionResult(error=f"Python worker exited with {status}")
+
+        worker.runs += 1
+        if worker.baseline_rss is None:
+            worker.baseline_rss = response["maxrss"]
+        if (
+            worker.runs >= self.max_runs
+            or response["maxrss"] - worker.baseline_rss > self.max_rss_growth
+        ):
+            logging.info(f"Recycling Python worker after {worker.runs} runs")
+            self._retire(worker)
+            worker = self._spawn()
+        self._idle.put(worker)
+        return ExecutionResult(
+            response["stdout"], response["stderr"], response["result"], response["error"]
+        )
+
+    def close(self):
+        """
+        Stop every worker.
+        """
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_python_pool = None
+_python_pool_lock = threading.Lock()
+
+
+def get_python_pool():
+    """
+    Return the process-wide PythonWorkerPool, started on first use and
+    stopped at exit.
+    """
+    global _python_pool
+    with _python_pool_lock:
+        if _python_pool is None:
+            _python_pool = PythonWorkerPool()
+            atexit.register(_python_pool.close)
+        return _python_pool
@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+
+def normalize_prompt(text):
+    """
+    Lowercase a prompt and strip punctuation and repeated whitespace, so
+    trivially different spellings of the same message share a cache key.
+    """
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class ResponseCache:
+    """
+    A thread-safe LRU cache bounded by the total size of its entries in bytes.
+
+    Entries may expire after a TTL. When a Redis client is given, entries are
+    also written to Redis so several Julie processes share their hits; the
+    local LRU then acts as the first tier in front of it.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 * 1024, ttl=None, redis_client=None,
+                 namespace="response_cache"):
+        """
+        Args:
+            max_bytes (int): The byte budget of the local tier.
+            ttl (float, optional): Default lifetime of an entry in seconds.
+            redis_client (redis.Redis, optional): Client for the shared tier.
+            namespace (str): Prefix of the shared tier's Redis keys.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Build a fixed-length cache key from arbitrary string parts.
+        """
+        digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached value for ``key`` or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+        value = self._get_shared(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._store(key, value, self.ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Cache ``value`` under ``key``.
+
+        Args:
+            key (str): The cache key.
+            value (str): The value to cache.
+            ttl (float, optional): Lifetime in seconds; defaults to the cache's TTL.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self._store(key, value, ttl)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(
+                    f"{self.namespace}:{key}", value,
+                    px=max(1, int(ttl * 1000)) if ttl else None,
+                )
+            except redis.exceptions.RedisError as e:
+                logging.warning(f"Shared response cache write failed: {e}")
+
+    def invalidate(self, key):
+        """
+        Drop ``key`` from both tiers.
+        """
+        with self._lock:
+            self._remove(key)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(f"{self.namespace}:{key}")
+            except redis.exceptions.RedisError as e:
+                logging.warning(f"Shared response cache delete failed: {e}")
+
+    def clear(self):
+        """
+        Empty the local tier and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Return the hit, miss and eviction counters and the current size.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, value, ttl):
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def _get_shared(self, key):
+        if self.redis_client is None:
+            return None
+        try:
+            value = self.redis_client.get(f"{self.namespace}:{key}")
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"Shared response cache read failed: {e}")
+            return None
+        return value.decode("utf-8") if value is not None else None
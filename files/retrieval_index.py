@@ -0,0 +1,432 @@
+import hashlib
+import heapq
+import logging
+import math
+import os
+import queue
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Too common in chat to say anything about relevance.
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from have he her his i if in is it "
+    "its me my no not of on or our she so that the their them they this to "
+    "us was we were what when which who will with you your".split()
+)
+
+
+def tokenize(text):
+    """
+    Lower-case word tokens of ``text`` without stopwords and single characters.
+    """
+    return [
+        token for token in TOKEN_PATTERN.findall((text or "").lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class _VectorFile:
+    """
+    One user's embeddings: a memory-mapped float32 file whose row ``i`` holds
+    the unit vector of message ``i``. The file grows by doubling.
+    """
+
+    def __init__(self, path, dim, capacity=1024):
+        self.path = path
+        self.dim = dim
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.truncate(capacity * dim * 4)
+        self._open()
+
+    def _open(self):
+        rows = os.path.getsize(self.path) // (self.dim * 4)
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+    def write(self, start, vectors):
+        end = start + len(vectors)
+        if end > self.matrix.shape[0]:
+            capacity = max(end, 2 * self.matrix.shape[0])
+            self.matrix.flush()
+            del self.matrix
+            with open(self.path, "r+b") as f:
+                f.truncate(capacity * self.dim * 4)
+            self._open()
+        self.matrix[start:end] = vectors
+        self.matrix.flush()
+
+
+class RetrievalIndex:
+    """
+    A persistent per-user search index over every message ever committed,
+    including those trimmed from the history list.
+
+    Messages are kept in an SQLite database (WAL mode, one connection per
+    thread) together with a BM25 inverted index: postings carry the term
+    frequency and document length, so a query reads one index range per
+    term and never touches the documents it does not return. With an
+    embedder, each message is also embedded into a memory-mapped float32
+    file per user, and keyword and vector rankings are merged with
+    reciprocal rank fusion.
+
+    Both are appended to incrementally by a commit listener, in a worker
+    thread, and survive restarts as they are.
+    """
+
+    # BM25 parameters
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, path="julie_index", embedder=None, max_df=0.5):
+        """
+        Args:
+            path (str): Directory of the database and vector files.
+            embedder (callable, optional): Maps a list of texts to an
+                ``(n, dim)`` float32 array of unit vectors; enables the
+                dense index.
+            max_df (float): Query terms in more than this fraction of a
+                user's messages are ignored; they barely affect the ranking
+                and have the longest postings.
+        """
+        self.path = path
+        self.embedder = embedder
+        self.max_df = max_df
+        os.makedirs(path, exist_ok=True)
+        self._local = threading.local()
+        self._vector_files = {}
+        self._vector_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                user TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL,
+                content TEXT, PRIMARY KEY (user, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                user TEXT NOT NULL, term TEXT NOT NULL, seq INTEGER NOT NULL,
+                tf INTEGER NOT NULL, length INTEGER NOT NULL,
+                PRIMARY KEY (user, term, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS terms (
+                user TEXT NOT NULL, term TEXT NOT NULL, df INTEGER NOT NULL,
+                PRIMARY KEY (user, term)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS users (
+                user TEXT PRIMARY KEY, docs INTEGER NOT NULL, length INTEGER NOT NULL
+            );
+            """
+        )
+
+    @property
+    def db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(
+                os.path.join(self.path, "index.db"), isolation_level=None, timeout=30
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def start(self, memory):
+        """
+        Start the worker thread and index every turn committed to ``memory``.
+        """
+        if self._thread is not None:
+            return
+        memory.add_commit_listener(self.notify)
+        self._thread = threading.Thread(
+            target=self._run, name="julie-retrieval-index", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Index the queued messages and stop the worker thread.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def notify(self, username, messages):
+        """
+        Queue a committed turn for indexing.
+        """
+        self._queue.put((username, messages))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self.add(*item)
+            except Exception as e:
+                logging.error(f"Failed to index messages of {item[0]}: {e}")
+
+    def _vector_path(self, username):
+        name = hashlib.sha1(username.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{name}.f32")
+
+    def _vector_file(self, username):
+        with self._vector_lock:
+            vectors = self._vector_files.get(username)
+            if vectors is None:
+                vectors = self._vector_files[username] = _VectorFile(
+                    self._vector_path(username), self.embedder.dim
+                )
+            return vectors
+
+    def add(self, username, messages):
+        """
+        Index ``messages`` (oldest first) as the newest messages of ``username``.
+        """
+        if not messages:
+            return
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT docs, length FROM users WHERE user = ?", (username,)
+            ).fetchone()
+            start, total_length = row or (0, 0)
+            postings = []
+            terms = Counter()
+            for seq, message in enumerate(messages, start):
+                counts = Counter(tokenize(message["content"]))
+                length = sum(counts.values())
+                total_length += length
+                terms.update(counts.keys())
+                postings.extend(
+                    (username, term, seq, tf, length) for term, tf in counts.items()
+                )
+            db.executemany(
+                "INSERT INTO docs (user, seq, role, content) VALUES (?, ?, ?, ?)",
+                [
+                    (username, seq, m["role"], m["content"])
+                    for seq, m in enumerate(messages, start)
+                ],
+            )
+            db.executemany(
+                "INSERT INTO postings (user, term, seq, tf, length) VALUES (?, ?, ?, ?, ?)",
+                postings,
+            )
+            db.executemany(
+                "INSERT INTO terms (user, term, df) VALUES (?, ?, ?) "
+                "ON CONFLICT (user, term) DO UPDATE SET df = df + excluded.df",
+                [(username, term, df) for term, df in terms.items()],
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO users (user, docs, length) VALUES (?, ?, ?)",
+                (username, start + len(messages), total_length),
+            )
+            if self.embedder is not None:
+                # Written before the commit, so a row exists for every document
+                self._vector_file(username).write(
+                    start, self.embedder([m["content"] or "" for m in messages])
+                )
+            db.execute("COMMIT")
+        except Exception as e:
+            db.execute("ROLLBACK")
+            raise e
+
+    def search(self, username, query, k=5):
+        """
+        Return the ``k`` messages of ``username`` most relevant to ``query``.
+
+        Returns:
+            list: ``(seq, score)`` pairs, best first.
+        """
+        keyword = self._search_bm25(username, query, k * 4 if self.embedder else k)
+        if self.embedder is None:
+            return keyword
+        dense = self._search_dense(username, query, k * 4)
+        # Reciprocal rank fusion
+        scores = Counter()
+        for ranking in (keyword, dense):
+            for rank, (seq, _) in enumerate(ranking):
+                scores[seq] += 1.0 / (60 + rank)
+        return scores.most_common(k)
+
+    def _search_bm25(self, username, query, k):
+        db = self.db
+        row = db.execute(
+            "SELECT docs, length FROM users WHERE user = ?", (username,)
+        ).fetchone()
+        if row is None or not row[0]:
+            return []
+        docs, total_length = row
+        average_length = total_length / docs or 1.0
+
+        scores = Counter()
+        for term in set(tokenize(query)):
+            df_row = db.execute(
+                "SELECT df FROM terms WHERE user = ? AND term = ?", (username, term)
+            ).fetchone()
+            if df_row is None or df_row[0] > self.max_df * docs:
+                continue
+            df = df_row[0]
+            idf = math.log(1 + (docs - df + 0.5) / (df + 0.5))
+            for seq, tf, length in db.execute(
+                "SELECT seq, tf, length FROM postings WHERE user = ? AND term = ?",
+                (username, term),
+            ):
+                norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[seq] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _search_dense(self, username, query, k):
+        row = self.db.execute(
+            "SELECT docs FROM users WHERE user = ?", (username,)
+        ).fetchone()
+        if row is None or not row[0]:
+            return []
+        matrix = self._vector_file(username).matrix[:row[0]]
+        similarities = matrix @ self.embedder([query])[0]
+        k = min(k, len(similarities))
+        best = np.argpartition(-similarities, k - 1)[:k]
+        best = best[np.argsort(-similarities[best])]
+        return [(int(seq), float(similarities[seq])) for seq in best]
+
+    def get_messages(self, username, seqs):
+        """
+        Fetch indexed messages by sequence number.
+
+        Returns:
+            dict: seq -> message.
+        """
+        seqs = list(seqs)
+        if not seqs:
+            return {}
+        rows = self.db.execute(
+            f"SELECT seq, role, content FROM docs WHERE user = ? AND seq IN "
+            f"({', '.join('?' * len(seqs))})",
+            [username, *seqs],
+        )
+        return {seq: {"role": role, "content": content} for seq, role, content in rows}
+
+    def recall(self, username, query, k=3, exclude=()):
+        """
+        The past turns of ``username`` most relevant to ``query``, oldest
+        first. A hit on either side of a user message and its reply returns
+        the pair.
+
+        Args:
+            username (str): The username of the user.
+            query (str): Usually the new prompt.
+            k (int): How many turns to return.
+            exclude (iterable): Message contents to skip, e.g. the recent
+                history that is sent anyway.
+
+        Returns:
+            list: Lists of messages, one per turn.
+        """
+        exclude = set(exclude)
+        hits = [seq for seq, _ in self.search(username, query, k + len(exclude))]
+        messages = self.get_messages(
+            username, {s for seq in hits for s in (seq - 1, seq, seq + 1)}
+        )
+        turns = {}
+        for seq in hits:
+            hit = messages.get(seq)
+            if hit is None:
+                continue
+            previous = messages.get(seq - 1)
+            if hit["role"] == "assistant" and previous and previous["role"] == "user":
+                seq, hit = seq - 1, previous
+            if seq in turns or hit["content"] in exclude:
+                continue
+            turn = [hit]
+            reply = messages.get(seq + 1)
+            if hit["role"] == "user" and reply and reply["role"] == "assistant":
+                turn.append(reply)
+            turns[seq] = turn
+            if len(turns) == k:
+                break
+        return [turns[seq] for seq in sorted(turns)]
+
+    def indexed_count(self, username):
+        """
+        How many messages of ``username`` are indexed.
+        """
+        row = self.db.execute(
+            "SELECT docs FROM users WHERE user = ?", (username,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def rebuild_vectors(self, username, batch_size=500):
+        """
+        Re-embed every indexed message of ``username`` from the stored rows,
+        e.g. after changing the embedder. The keyword index is left as it is.
+
+        Returns:
+            int: The number of messages embedded.
+        """
+        if self.embedder is None:
+            return 0
+        done = 0
+        while True:
+            db = self.db
+            # Holding the write lock keeps the worker from appending meanwhile
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT seq, content FROM docs WHERE user = ? AND seq >= ? "
+                    "ORDER BY seq LIMIT ?",
+                    (username, done, batch_size),
+                ).fetchall()
+                if rows:
+                    self._vector_file(username).write(
+                        done, self.embedder([content or "" for _, content in rows])
+                    )
+                db.execute("COMMIT")
+            except Exception as e:
+                db.execute("ROLLBACK")
+                raise e
+            if len(rows) < batch_size:
+                return done + len(rows)
+            done += len(rows)
+
+    def drop_user(self, username):
+        """
+        Remove everything indexed for ``username``.
+        """
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("docs", "postings", "terms", "users"):
+                db.execute(f"DELETE FROM {table} WHERE user = ?", (username,))
+            db.execute("COMMIT")
+        except Exception as e:
+            db.execute("ROLLBACK")
+            raise e
+        with self._vector_lock:
+            self._vector_files.pop(username, None)
+        if os.path.exists(self._vector_path(username)):
+            os.remove(self._vector_path(username))
+
+
+def create_retrieval_index():
+    """
+    Build the retrieval index when JULIE_RETRIEVAL=1, at JULIE_RETRIEVAL_PATH.
+    JULIE_RETRIEVAL_DENSE=1 adds the vector index. Returns None otherwise.
+    """
+    if os.getenv("JULIE_RETRIEVAL") != "1":
+        return None
+    embedder = None
+    if os.getenv("JULIE_RETRIEVAL_DENSE") == "1":
+        from files.semantic_cache import default_embedder
+
+        embedder = default_embedder()
+    return RetrievalIndex(os.getenv("JULIE_RETRIEVAL_PATH", "julie_index"), embedder)
@@ -0,0 +1,205 @@
+import logging
+import threading
+import zlib
+
+import numpy as np
+
+from files.response_cache import normalize_prompt
+
+
+class HashingEmbedder:
+    """
+    A dependency-free embedder: word unigrams and character trigrams hashed
+    into a fixed number of buckets and L2-normalised.
+
+    It only captures surface similarity, so its default threshold is strict:
+    it matches near-identical wording, not true paraphrases ("how are you" and
+    "how old are you" look alike to it). Install sentence-transformers for
+    paraphrase-level matching.
+    """
+
+    default_threshold = 0.9
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        text = normalize_prompt(text)
+        words = text.split()
+        padded = f" {text} "
+        grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return words + grams
+
+    def __call__(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets = [zlib.crc32(f.encode()) % self.dim for f in self._features(text)]
+            np.add.at(matrix[row], buckets, 1.0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class SentenceTransformerEmbedder:
+    """
+    Embeds with a small local sentence-transformers model.
+    """
+
+    default_threshold = 0.88
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def __call__(self, texts):
+        return self.model.encode(
+            list(texts), normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+
+def default_embedder():
+    """
+    Use a local sentence-transformers model when it is installed, else hashing.
+    """
+    try:
+        return SentenceTransformerEmbedder()
+    except (ImportError, OSError) as e:
+        logging.info(f"Using the hashing embedder for the semantic cache: {e}")
+        return HashingEmbedder()
+
+
+class _UserIndex:
+    """
+    The cached prompts of one user: a contiguous float32 matrix of unit
+    vectors, grown by doubling, with the replies and turn stamps alongside.
+    """
+
+    def __init__(self, dim, capacity=64):
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.turns = np.empty(capacity, dtype=np.int64)
+        self.responses = []
+
+    def __len__(self):
+        return len(self.responses)
+
+    def add(self, vector, response, turn):
+        size = len(self.responses)
+        if size == self.vectors.shape[0]:
+            self.vectors = np.concatenate([self.vectors, np.empty_like(self.vectors)])
+            self.turns = np.concatenate([self.turns, np.empty_like(self.turns)])
+        self.vectors[size] = vector
+        self.turns[size] = turn
+        self.responses.append(response)
+
+    def keep(self, mask):
+        """
+        Keep only the rows where ``mask`` is true, preserving order.
+        """
+        size = len(self.responses)
+        kept = np.flatnonzero(mask)
+        self.vectors[:len(kept)] = self.vectors[:size][kept]
+        self.turns[:len(kept)] = self.turns[:size][kept]
+        self.responses = [self.responses[i] for i in kept]
+
+
+class SemanticCache:
+    """
+    An opt-in cache that answers a prompt with the reply to an earlier,
+    sufficiently similar prompt from the same user.
+
+    Entries are scoped per user and go stale once the user has had
+    ``max_turn_drift`` further turns, since by then the conversation the
+    reply was written for has moved on. Lookups are a single matrix-vector
+    product over the user's contiguous embedding matrix.
+    """
+
+    def __init__(self, embedder=None, threshold=None, max_entries_per_user=512,
+                 max_turn_drift=20):
+        """
+        Args:
+            embedder (callable, optional): Maps a list of texts to an
+                ``(n, dim)`` float32 array of unit vectors.
+            threshold (float, optional): Minimum cosine similarity for a hit;
+                defaults to the embedder's ``default_threshold``.
+            max_entries_per_user (int): Oldest entries are dropped beyond this.
+            max_turn_drift (int): Turns after which an entry is stale.
+        """
+        self.embedder = embedder or default_embedder()
+        self.threshold = (
+            threshold if threshold is not None
+            else getattr(self.embedder, "default_threshold", 0.9)
+        )
+        self.max_entries_per_user = max_entries_per_user
+        self.max_turn_drift = max_turn_drift
+        self._indexes = {}
+        self._turns = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, text):
+        return np.ascontiguousarray(self.embedder([text])[0], dtype=np.float32)
+
+    def lookup(self, username, prompt):
+        """
+        Return the cached reply for the most similar earlier prompt, or None.
+        """
+        vector = self._embed(prompt)
+        with self._lock:
+            index = self._indexes.get(username)
+            if not index:
+                self.misses += 1
+                return None
+            size = len(index)
+            similarities = index.vectors[:size] @ vector
+            fresh = index.turns[:size] >= self._turns.get(username, 0) - self.max_turn_drift
+            similarities[~fresh] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            logging.debug(
+                f"Semantic cache hit for {username} (similarity {similarities[best]:.3f})"
+            )
+            return index.responses[best]
+
+    def store(self, username, prompt, response):
+        """
+        Cache ``response`` as the reply to ``prompt`` for ``username``.
+        """
+        vector = self._embed(prompt)
+        with self._lock:
+            index = self._indexes.get(username)
+            if index is None:
+                index = self._indexes[username] = _UserIndex(vector.shape[0])
+            index.add(vector, response, self._turns.get(username, 0))
+            self._prune(username, index)
+
+    def record_turn(self, username):
+        """
+        Note that ``username`` completed a turn, ageing their cached entries.
+        """
+        with self._lock:
+            self._turns[username] = self._turns.get(username, 0) + 1
+            index = self._indexes.get(username)
+            if index:
+                self._prune(username, index)
+
+    def invalidate_user(self, username):
+        """
+        Drop every cached entry of ``username``.
+        """
+        with self._lock:
+            self._indexes.pop(username, None)
+
+    def _prune(self, username, index):
+        size = len(index)
+        keep = index.turns[:size] >= self._turns.get(username, 0) - self.max_turn_drift
+        overflow = int(keep.sum()) - self.max_entries_per_user
+        if overflow > 0:
+            keep[np.flatnonzero(keep)[:overflow]] = False
+        if not keep.all():
+            index.keep(keep)
@@ -0,0 +1,88 @@
+import builtins
+import sys
+import time
+
+
+class StartupProfiler:
+    """
+    Measures where the start of ``run.py`` goes: how long each module takes
+    to import (including the modules it imports) and how long each startup
+    phase takes until the menu appears.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last_mark = self.started
+        self.phases = []
+        self.imports = {}
+        self._depth = 0
+        self._original_import = None
+
+    def start(self):
+        """
+        Start timing imports.
+        """
+        self._original_import = builtins.__import__
+        original_import = self._original_import
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original_import(name, globals, locals, fromlist, level)
+            self._depth += 1
+            started = time.perf_counter()
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                self._depth -= 1
+                elapsed = time.perf_counter() - started
+                if name not in self.imports:
+                    self.imports[name] = (elapsed, self._depth)
+
+        builtins.__import__ = timed_import
+        return self
+
+    def stop(self):
+        """
+        Stop timing imports.
+        """
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def mark(self, phase):
+        """
+        Record that ``phase`` just finished.
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_mark))
+        self.last_mark = now
+
+    def report(self, top=15):
+        """
+        Stop timing and return the report: the phases in order, then the
+        slowest top-level imports (each including what it imported).
+        """
+        self.stop()
+        lines = ["Startup profile:"]
+        for phase, elapsed in self.phases:
+            lines.append(f"  {elapsed * 1000:8.1f} ms  {phase}")
+        lines.append(f"  {(self.last_mark - self.started) * 1000:8.1f} ms  total")
+        lines.append(f"Slowest imports (of {len(self.imports)}):")
+        slowest = sorted(
+            ((elapsed, name) for name, (elapsed, depth) in self.imports.items() if depth == 0),
+            reverse=True,
+        )
+        for elapsed, name in slowest[:top]:
+            lines.append(f"  {elapsed * 1000:8.1f} ms  {name}")
+        return "\n".join(lines)
+
+
+def profile_startup_requested(argv=None):
+    """
+    Return True and drop the flag from ``argv`` if ``--profile-startup`` was given.
+    """
+    argv = sys.argv if argv is None else argv
+    if "--profile-startup" not in argv:
+        return False
+    argv.remove("--profile-startup")
+    return True
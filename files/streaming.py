@@ -0,0 +1,83 @@
+import logging
+
+import openai
+
+
+class FunctionCallRequested(Exception):
+    """
+    The model answered with a function call, which only the agent loop can run.
+    """
+
+
+class ReplyStream:
+    """
+    An async iterator over the chunks of Julie's reply as the model produces
+    them.
+
+    Once iteration finishes, ``text`` holds the whole reply and ``persist``
+    the asyncio.Task persisting the turn (None if nothing needs persisting).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.persist = None
+        self.chunks = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for chunk in self.chunks:
+            self.text += chunk
+            yield chunk
+
+
+async def stream_chat_completion(messages, llm_config, max_tokens=None, temperature=0.7):
+    """
+    Stream a chat completion token by token.
+
+    The configs of ``llm_config["config_list"]`` are tried in order, like
+    AutoGen does, until one starts answering.
+
+    Args:
+        messages (list): The chat messages, system message first.
+        llm_config (dict): An AutoGen llm_config; its functions are offered
+            to the model.
+        max_tokens (int, optional): Limit of the reply; None leaves it uncapped.
+        temperature (float): Sampling temperature.
+
+    Yields:
+        str: Content deltas as they arrive.
+
+    Raises:
+        FunctionCallRequested: If the model calls a function instead of replying.
+    """
+    last_error = None
+    for config in llm_config["config_list"]:
+        # The whole entry is passed on, like AutoGen does, so api_base,
+        # api_type, api_version and engine (e.g. for Azure) are honoured
+        params = {
+            **config,
+            "messages": messages,
+            "temperature": temperature,
+            "request_timeout": llm_config.get("request_timeout"),
+            "stream": True,
+        }
+        if max_tokens is not None:
+            params["max_tokens"] = max_tokens
+        if llm_config.get("functions"):
+            params["functions"] = llm_config["functions"]
+        try:
+            response = await openai.ChatCompletion.acreate(**params)
+        except openai.error.OpenAIError as e:
+            logging.warning(f"Streaming with {config.get('model')} failed, trying the next model: {e}")
+            last_error = e
+            continue
+        async for chunk in response:
+            delta = chunk["choices"][0]["delta"]
+            if delta.get("function_call"):
+                raise FunctionCallRequested(delta["function_call"].get("name"))
+            if delta.get("content"):
+                yield delta["content"]
+        return
+    raise last_error or ValueError("llm_config has no config_list entries")
@@ -0,0 +1,314 @@
+import logging
+import os
+import queue
+import re
+import threading
+
+from files.brain import LongTermMemory
+
+
+class LocalSummaryModel:
+    """
+    A dependency-free stand-in for an LLM: keeps the first sentence of each
+    line and truncates. Used in tests and when no API is configured.
+    """
+
+    def __init__(self, max_chars=400):
+        self.max_chars = max_chars
+
+    def __call__(self, instruction, text):
+        sentences = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                sentences.append(re.split(r"(?<=[.!?])\s", line, maxsplit=1)[0])
+        summary = " ".join(sentences)
+        if len(summary) > self.max_chars:
+            summary = summary[:self.max_chars - 3].rstrip() + "..."
+        return summary
+
+
+class OpenAISummaryModel:
+    """
+    Summarises with an OpenAI chat model.
+    """
+
+    def __init__(self, model="gpt-3.5-turbo", max_tokens=200):
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def __call__(self, instruction, text):
+        import openai
+
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": instruction},
+                {"role": "user", "content": text},
+            ],
+            max_tokens=self.max_tokens,
+            temperature=0.2,
+        )
+        return response.choices[0].message.content.strip()
+
+
+CHUNK_INSTRUCTION = (
+    "Summarise this part of a conversation between a user and Julie in two or "
+    "three sentences. Keep names, facts, preferences and open questions."
+)
+ROLLUP_INSTRUCTION = (
+    "Merge these consecutive conversation summaries into one short summary, "
+    "keeping names, facts, preferences and open questions."
+)
+PROFILE_INSTRUCTION = (
+    "Update this profile of the user with the new conversation summaries. "
+    "Return a short list of lasting facts about them: who they are, what they "
+    "like, what they are working on. Drop anything the new summaries contradict."
+)
+
+
+class ConversationSummarizer:
+    """
+    Compacts old conversation history into hierarchical summaries, off the
+    hot path.
+
+    Once messages are older than the newest ones the prompt carries verbatim,
+    every ``chunk_size`` of them are summarised into a level-0 summary; the
+    last chunk may reach into the verbatim window so that no message is left
+    out of both. Every ``fanout`` summaries of one level are merged into one
+    summary of the next level and removed, so a user with any number of turns
+    has at most ``fanout`` summaries per level. A top-level profile of the
+    user is refreshed from each batch of new chunk summaries.
+
+    Everything lives in the ``summary:{username}`` hash next to the history:
+    ``total`` (messages ever committed, counted by LongTermMemory.commit_turn),
+    ``summarized`` (how many of those are covered), ``profile`` and
+    ``L{level}:{index}`` summaries. Work is queued by a commit listener and
+    done in a daemon worker thread.
+    """
+
+    def __init__(self, model=None, memory=None, chunk_size=20, fanout=8, keep_recent=200,
+                 assembler=None):
+        """
+        Args:
+            model (callable, optional): ``model(instruction, text) -> str``;
+                defaults to LocalSummaryModel.
+            memory (LongTermMemory, optional): Defaults to the singleton.
+            chunk_size (int): Messages per level-0 summary.
+            fanout (int): Summaries merged into one of the next level.
+            keep_recent (int): Newest messages sent verbatim with the prompt,
+                or with ``assembler``, the most that can be.
+            assembler (PromptAssembler, optional): The assembler building
+                the prompts; only the messages it always sends verbatim are
+                left unsummarised.
+        """
+        self.model = model or LocalSummaryModel()
+        self.memory = memory or LongTermMemory()
+        self.chunk_size = chunk_size
+        self.fanout = fanout
+        self.keep_recent = keep_recent
+        self.assembler = assembler
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Start the worker thread and subscribe to committed turns.
+        """
+        if self._thread is not None:
+            return
+        self.memory.add_commit_listener(self.notify)
+        self._thread = threading.Thread(
+            target=self._run, name="julie-summarizer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Finish the queued work and stop the worker thread.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def notify(self, username, messages=None):
+        """
+        Queue ``username`` for a refresh, unless it is already queued.
+        """
+        with self._pending_lock:
+            if username in self._pending:
+                return
+            self._pending.add(username)
+        self._queue.put(username)
+
+    def _run(self):
+        while True:
+            username = self._queue.get()
+            if username is None:
+                return
+            with self._pending_lock:
+                self._pending.discard(username)
+            try:
+                self.refresh(username)
+            except Exception as e:
+                logging.error(f"Failed to summarise history for {username}: {e}")
+
+    def refresh(self, username):
+        """
+        Summarise whatever history of ``username`` became old enough since the
+        last refresh, roll completed groups up a level and update the profile.
+
+        Each chunk summary is stored as soon as it is done, so a turn committed
+        meanwhile costs at most a re-read of the chunk being summarised.
+
+        Returns:
+            int: The number of new level-0 summaries.
+        """
+        state = self.memory.get_summaries(username)
+        total = state.get("total", 0)
+        length = self.memory.backend.list_length(self.memory.history_key(username))
+        if total < length:
+            # History written before the counter existed
+            total = self.memory.backend.hash_incr(
+                self.memory.summary_key(username), "total", length - total
+            )
+        summarized = state.get("summarized", 0)
+        unsummarized = total - self.verbatim_count(username)
+
+        new_summaries = []
+        while summarized < unsummarized and summarized + self.chunk_size <= total:
+            chunk = self._read_stable_chunk(username, summarized)
+            if chunk is None:
+                # The history keeps moving; the next commit queues the user again
+                break
+            messages, total = chunk
+            fields = {}
+            if messages:
+                text = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+                summary = self.model(CHUNK_INSTRUCTION, text)
+                state[f"L0:{summarized // self.chunk_size}"] = summary
+                fields[f"L0:{summarized // self.chunk_size}"] = summary
+                new_summaries.append(summary)
+            summarized += self.chunk_size
+            fields["summarized"] = summarized
+            remove = self._roll_up(state, fields, summarized)
+            self.memory.update_summaries(username, fields, remove)
+
+        if new_summaries:
+            profile = self.model(
+                PROFILE_INSTRUCTION,
+                "\n".join([state.get("profile", "")] + new_summaries).strip(),
+            )
+            state["profile"] = profile
+            self.memory.update_summaries(username, {"profile": profile})
+            logging.info(
+                f"Summarised {len(new_summaries)} chunks for {username} "
+                f"({summarized} of {total} messages covered)"
+            )
+        return len(new_summaries)
+
+    def verbatim_count(self, username):
+        """
+        How many of the newest messages of ``username`` reach the model
+        verbatim, and so need no summary.
+        """
+        if self.assembler is None:
+            return self.keep_recent
+        recent = self.memory.get_recent_messages(username, self.keep_recent)
+        return self.assembler.verbatim_count(recent)
+
+    def _read_stable_chunk(self, username, start, attempts=3):
+        """
+        Read the chunk at ``start`` while no turn is committed in between.
+
+        Returns:
+            tuple: The messages and the total they were read at, or None if
+                the history changed on every attempt.
+        """
+        total = self.memory.get_summaries(username).get("total", 0)
+        for _ in range(attempts):
+            messages = self._read_chunk(username, start, total)
+            current = self.memory.get_summaries(username).get("total", 0)
+            if current == total:
+                return messages, total
+            total = current
+        return None
+
+    def _read_chunk(self, username, start, total):
+        """
+        Read messages ``start`` to ``start + chunk_size`` counted from the
+        first message ever committed; those already trimmed are skipped.
+        """
+        # The list is indexed from the newest message
+        cursor = total - start - self.chunk_size
+        messages, _ = self.memory.get_history_page(username, cursor, self.chunk_size)
+        return messages
+
+    def _roll_up(self, state, fields, summarized):
+        """
+        Merge every complete group of ``fanout`` summaries into the next
+        level, adding the new summaries to ``fields``.
+
+        Returns:
+            list: The merged fields, to delete.
+        """
+        remove = []
+        level, span = 0, self.chunk_size
+        while True:
+            done = summarized // (span * self.fanout)
+            groups = {}
+            for field in state:
+                if field.startswith(f"L{level}:"):
+                    index = int(field.split(":", 1)[1])
+                    if index // self.fanout < done:
+                        groups.setdefault(index // self.fanout, []).append(index)
+            if not groups:
+                return remove
+            for group, indexes in groups.items():
+                parts = [state.pop(f"L{level}:{i}") for i in sorted(indexes)]
+                for i in indexes:
+                    fields.pop(f"L{level}:{i}", None)
+                    remove.append(f"L{level}:{i}")
+                summary = self.model(ROLLUP_INSTRUCTION, "\n".join(parts))
+                state[f"L{level + 1}:{group}"] = fields[f"L{level + 1}:{group}"] = summary
+            level, span = level + 1, span * self.fanout
+
+    def context(self, username):
+        """
+        The stored profile and summaries of ``username`` for the prompt.
+
+        Returns:
+            tuple: The profile text and the summaries, oldest first, as one
+                text (either may be empty).
+        """
+        state = self.memory.get_summaries(username)
+        entries = []
+        for field, summary in state.items():
+            if field.startswith("L"):
+                level, index = map(int, field[1:].split(":"))
+                start = index * self.chunk_size * self.fanout ** level
+                entries.append((start, -level, summary))
+        entries.sort()
+        return state.get("profile", ""), "\n".join(e[2] for e in entries)
+
+
+def create_summarizer(keep_recent=200, assembler=None):
+    """
+    Build the summariser selected by JULIE_SUMMARIZER: 'openai' or 'local'.
+    Returns None when it is unset. See ConversationSummarizer for the
+    arguments.
+    """
+    kind = os.getenv("JULIE_SUMMARIZER")
+    if not kind:
+        return None
+    if kind == "openai":
+        model = OpenAISummaryModel(os.getenv("JULIE_SUMMARIZER_MODEL", "gpt-3.5-turbo"))
+    elif kind == "local":
+        model = LocalSummaryModel()
+    else:
+        raise ValueError(f"Unknown JULIE_SUMMARIZER: {kind}")
+    return ConversationSummarizer(model=model, keep_recent=keep_recent, assembler=assembler)
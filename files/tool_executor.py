@@ -0,0 +1,212 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+
+class ToolExecutor:
+    """
+    Runs the functions the agents call on a bounded thread pool.
+
+    The tools themselves do their work in other processes (the Python worker
+    pool, kernels, containers), so threads are enough to overlap them.
+    Each user may have at most ``per_user`` calls in flight, so one user's
+    batch cannot take every worker, and every call is given ``timeout``
+    seconds, waiting for a slot included, before its result is reported as
+    timed out. A timed-out call keeps its slot until it really returns.
+    """
+
+    def __init__(self, max_workers=None, per_user=None, timeout=None):
+        """
+        Args:
+            max_workers (int, optional): Calls in flight across all users;
+                defaults to JULIE_TOOL_WORKERS or 8.
+            per_user (int, optional): Calls in flight per user; defaults to
+                JULIE_TOOL_CONCURRENCY_PER_USER or 4.
+            timeout (float, optional): Seconds per call; defaults to
+                JULIE_TOOL_TIMEOUT or 120.
+        """
+        self.max_workers = max_workers or int(os.getenv("JULIE_TOOL_WORKERS", 8))
+        self.per_user = per_user or int(os.getenv("JULIE_TOOL_CONCURRENCY_PER_USER", 4))
+        self.timeout = timeout or float(os.getenv("JULIE_TOOL_TIMEOUT", 120))
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="tool")
+        # user -> [semaphore, calls waiting or in flight]; idle users are dropped
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, user, timeout):
+        with self._lock:
+            slots = self._slots.get(user)
+            if slots is None:
+                slots = self._slots[user] = [threading.BoundedSemaphore(self.per_user), 0]
+            slots[1] += 1
+        if slots[0].acquire(timeout=max(0, timeout)):
+            return slots
+        self._release(user, slots, acquired=False)
+        return None
+
+    def _release(self, user, slots, acquired=True):
+        if acquired:
+            slots[0].release()
+        with self._lock:
+            slots[1] -= 1
+            if not slots[1] and self._slots.get(user) is slots:
+                del self._slots[user]
+
+    def submit(self, user, function, kwargs, started=None):
+        """
+        Start ``function(**kwargs)`` for ``user``, waiting first while the
+        user already has ``per_user`` calls in flight.
+
+        Args:
+            started (float, optional): ``time.monotonic()`` the call's timeout
+                counts from; defaults to now.
+
+        Returns:
+            concurrent.futures.Future: The call's result; it fails with
+                TimeoutError if no slot freed up within the timeout.
+        """
+        started = time.monotonic() if started is None else started
+        slots = self._acquire(user, started + self.timeout - time.monotonic())
+        if slots is None:
+            future = Future()
+            future.set_exception(TimeoutError())
+            return future
+        try:
+            future = self._pool.submit(function, **kwargs)
+        except BaseException:
+            self._release(user, slots)
+            raise
+        future.add_done_callback(lambda _: self._release(user, slots))
+        return future
+
+    def _result(self, name, future, started):
+        try:
+            return future.result(timeout=max(0, started + self.timeout - time.monotonic()))
+        except TimeoutError:
+            logging.warning(f"Tool call {name} timed out after {self.timeout}s")
+            return f"{name} timed out after {self.timeout}s"
+        except Exception as e:
+            logging.error(f"Tool call {name} failed: {e}")
+            return f"{name} failed: {e}"
+
+    def run(self, user, name, function, kwargs):
+        """
+        Run one call and return its result, or an error message if it failed
+        or timed out.
+        """
+        started = time.monotonic()
+        return self._result(name, self.submit(user, function, kwargs, started), started)
+
+    def run_all(self, user, calls):
+        """
+        Run independent calls concurrently.
+
+        Args:
+            user (str): Whose calls these are.
+            calls (list): (name, function, kwargs) tuples.
+
+        Returns:
+            list: The results, in the order of ``calls``.
+        """
+        futures = []
+        for name, function, kwargs in calls:
+            started = time.monotonic()
+            futures.append((name, self.submit(user, function, kwargs, started), started))
+        return [self._result(name, future, started) for name, future, started in futures]
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# The schema of the function that lets the model batch independent calls.
+PARALLEL_FUNCTION = {
+    "name": "parallel",
+    "description": (
+        "Run several independent function calls at the same time and return "
+        "all their results, in order. Only batch calls that do not depend on "
+        "each other's results."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "calls": {
+                "type": "array",
+                "description": "The calls to run.",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {
+                            "type": "string",
+                            "description": "The function to call, e.g. python or sh.",
+                        },
+                        "arguments": {
+                            "type": "object",
+                            "description": "The function's arguments.",
+                        },
+                    },
+                    "required": ["name", "arguments"],
+                },
+            }
+        },
+        "required": ["calls"],
+    },
+}
+
+
+def executed_function_map(functions, user, executor=None):
+    """
+    Wrap a function_map so its calls go through ``executor`` on behalf of
+    ``user``, and add the ``parallel`` function batching them.
+
+    Args:
+        functions (dict): Function names to callables.
+        user (str): Whose per-user concurrency limit the calls count against.
+        executor (ToolExecutor, optional): Defaults to get_tool_executor().
+
+    Returns:
+        dict: The wrapped function_map.
+    """
+    executor = executor or get_tool_executor()
+
+    def wrap(name, function):
+        return lambda **kwargs: executor.run(user, name, function, kwargs)
+
+    def parallel(calls):
+        batch = []
+        for call in calls:
+            name, arguments = call.get("name"), call.get("arguments") or {}
+            if isinstance(arguments, str):
+                arguments = json.loads(arguments)
+            if name not in functions:
+                batch.append((name, lambda name=name: f"Unknown function {name}", {}))
+            else:
+                batch.append((name, functions[name], arguments))
+        results = executor.run_all(user, batch)
+        return "\n\n".join(
+            f"[{i}] {name}:\n{result}" for i, ((name, _, _), result) in enumerate(zip(batch, results), 1)
+        )
+
+    return {
+        **{name: wrap(name, function) for name, function in functions.items()},
+        "parallel": parallel,
+    }
+
+
+_tool_executor = None
+_tool_executor_lock = threading.Lock()
+
+
+def get_tool_executor():
+    """
+    Return the process-wide ToolExecutor, shut down at exit.
+    """
+    global _tool_executor
+    with _tool_executor_lock:
+        if _tool_executor is None:
+            _tool_executor = ToolExecutor()
+            atexit.register(_tool_executor.shutdown)
+        return _tool_executor
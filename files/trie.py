@@ -1,6 +1,3 @@
-from collections import defaultdict
-
-
 language_keywords = {
     "python": ["def", "import", "print", "return", "class"],
     "javascript": ["function", "var", "let", "const", "return"],
@@ -11,35 +8,75 @@ language_keywords = {
     "r": ["<-", "function", "print", "return", "library"]
 }
 
-# Trie Node class
-class TrieNode:
-    def __init__(self):
-        self.children = defaultdict()
-        self.is_end_of_word = False
 
-# Trie class
-class Trie:
-    def __init__(self):
-        self.root = TrieNode()
+# Aho-Corasick automaton
+class KeywordAutomaton:
+    """
+    Finds every occurrence of many keywords in one pass over a text.
+
+    The automaton follows failure links instead of restarting after a
+    mismatch, so it reports every occurrence, including overlapping ones and
+    those that begin inside a failed partial match. Keywords match anywhere,
+    not only as whole words. Each keyword carries outputs (label, weight), so
+    one scan scores every label in time linear in the text, however many
+    labels and keywords there are.
+    """
+
+    def __init__(self, keywords_by_label):
+        """
+        Args:
+            keywords_by_label (dict): Label (e.g. a language) to its keywords,
+                each a string (weight 1) or a (keyword, weight) tuple.
+                Keywords are matched case-insensitively.
+        """
+        self.labels = list(keywords_by_label)
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [{}]
+        for label, keywords in keywords_by_label.items():
+            for keyword in keywords:
+                keyword, weight = keyword if isinstance(keyword, tuple) else (keyword, 1)
+                self._insert(keyword.lower(), label, weight)
+        self._link()
 
-    def insert(self, word):
-        node = self.root
-        for char in word:
-            if char not in node.children:
-                node.children[char] = TrieNode()
-            node = node.children[char]
-        node.is_end_of_word = True
+    def _insert(self, keyword, label, weight):
+        state = 0
+        for char in keyword:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append({})
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.outputs[state][label] = self.outputs[state].get(label, 0) + weight
 
-    def search(self, text):
-        count = 0
-        node = self.root
-        for char in text:
-            if char in node.children:
-                node = node.children[char]
-                if node.is_end_of_word:
-                    count += 1
-                    node = self.root
-            else:
-                node = self.root
-        return count
+    def _link(self):
+        # Breadth first, so a state's failure target is linked before it
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                # A match here also completes every keyword that is its suffix
+                for label, weight in self.outputs[self.fail[child]].items():
+                    self.outputs[child][label] = self.outputs[child].get(label, 0) + weight
+                queue.append(child)
+        self.outputs = [tuple(outputs.items()) for outputs in self.outputs]
 
+    def scores(self, text):
+        """
+        Return the summed weight of every keyword occurrence in ``text``, per label.
+        """
+        scores = dict.fromkeys(self.labels, 0)
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for label, weight in outputs[state]:
+                scores[label] += weight
+        return scores
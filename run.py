@@ -1,8 +1,14 @@
 
+from files.startup_profile import StartupProfiler, profile_startup_requested
+
+# Started before the other imports so their cost shows up in the report
+profiler = StartupProfiler().start() if profile_startup_requested() else None
+
 from files.menu import main_menu
 from files.julie import Julie
 from files.setup import Setting
 from files.brain import LongTermMemory
+import asyncio
 import click
 import logging
 import re
@@ -18,16 +24,30 @@ logging.getLogger('interpreter').setLevel(logging.CRITICAL)
 Settings = Setting
 memory = LongTermMemory()
 
+if profiler:
+    profiler.mark("imports")
+
 
 class Main:
 
     def __init__(self):
         self.memory = LongTermMemory()
+        # One long-lived loop, so the async memory pool stays bound to it
+        self.loop = asyncio.new_event_loop()
         self.julie = Julie()
         self.settings = Settings()
         self.run()
 
     def run(self):
+        if profiler:
+            profiler.mark("Main initialised")
+            print(profiler.report())
+        if os.getenv("JULIE_INTENT_WARMUP") == "1":
+            # Imported here: the module is cheap, but it is only needed when warming up
+            from files.julie_intent_detection import warm_up_intent_engine
+
+            # Load after the menu has had a moment to draw
+            warm_up_intent_engine(delay=0.5)
         try:
             main_menu(Main_instance=self)
         except Exception as e:
@@ -149,11 +169,8 @@ class Main:
         message.
         """
         try:
-            chatbot_response = self.julie.generate_response(
-                user_input, username
-            )
-            Setting.simulate_typing(
-                colored(f"Julie: {chatbot_response}", Setting.get_text_color())
+            self.loop.run_until_complete(
+                self.respond_to_user_async(user_input, username)
             )
         except Exception as e:
             logging.error(f"Failed to generate response: {e}")
@@ -162,6 +179,30 @@ class Main:
                 colored(f"Julie: {chatbot_response}", "green")
             )
 
+    async def respond_to_user_async(self, user_input, username):
+        """
+        Streams the response to the terminal as it is generated, then waits
+        for the turn to be persisted.
+        """
+        stream = self.julie.astream_response(user_input, username)
+        await self.render_stream(stream)
+        if stream.persist is None:
+            return
+        try:
+            await stream.persist
+        except Exception as e:
+            logging.error(f"Failed to persist conversation turn: {e}")
+
+    async def render_stream(self, chunks):
+        """
+        Prints each chunk of a reply the moment it arrives, so the typing
+        pace is the model's own.
+        """
+        color = Setting.get_text_color()
+        print(colored("Julie: ", color), end="", flush=True)
+        async for chunk in chunks:
+            print(colored(chunk, color), end="", flush=True)
+        print()
 
 if __name__ == "__main__":
     main_instance = Main()
@@ -0,0 +1,62 @@
+import pytest
+
+autogen = pytest.importorskip("autogen")
+
+import files.agent_sessions as agent_sessions
+import files.autogeen as autogeen
+from files.agent_sessions import AgentSession
+from files.container_pool import ContainerPool, LocalRunner
+
+
+def fake_julie(owner="Julie"):
+    """
+    A Julie that calls the python function for every new request, runs code
+    blocks when asked to and sums up function and code results in plain text.
+    """
+    julie = autogen.AssistantAgent(name="Julie", llm_config=False)
+
+    def reply(recipient, messages=None, sender=None, config=None):
+        last = messages[-1]
+        if last.get("role") == "function":
+            return True, f"The answer is {last['content']}"
+        if (last.get("content") or "").startswith("exitcode:"):
+            return True, "Done"
+        return True, {
+            "content": None,
+            "function_call": {"name": "python", "arguments": '{"cell": "6 * 7"}'},
+        }
+
+    julie.register_reply(autogen.Agent, reply, position=0)
+    return julie
+
+
+@pytest.fixture
+def session(monkeypatch, tmp_path):
+    monkeypatch.setattr(agent_sessions, "create_julie", fake_julie)
+    monkeypatch.setattr(autogeen, "session_function_map", lambda name: {"python": lambda cell: "42"})
+    pool = ContainerPool(runner=LocalRunner(), size=1, work_dir=str(tmp_path))
+    monkeypatch.setattr(autogeen, "get_container_pool", lambda: pool)
+    session = AgentSession("alice", 4000)
+    yield session
+    pool.close()
+
+
+def test_function_call_after_streamed_first_turn(session):
+    session.record_turn("hi", "Hello!")
+
+    assert session.ask("what is 6 * 7?") == "The answer is 42"
+    assert session.turns == 2
+    assert any(m.get("role") == "function" for m in session.messages)
+
+
+def test_follow_up_runs_code_blocks_of_a_streamed_reply(session):
+    session.record_turn("say hi from the shell", "```sh\necho hi\n```")
+
+    assert session.follow_up() == "Done"
+    assert any("hi" in (m.get("content") or "") for m in session.messages[2:])
+
+
+def test_follow_up_without_code_blocks_does_nothing(session):
+    session.record_turn("hi", "Hello!")
+
+    assert session.follow_up() is None
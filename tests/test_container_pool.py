@@ -0,0 +1,91 @@
+import os
+import shutil
+
+import pytest
+
+from files.container_pool import LANGUAGE_IMAGES, ContainerPool, LocalRunner
+
+
+class ResetKillsRunner(LocalRunner):
+    """
+    A runner whose reset takes the container down, like a reset that kills
+    a Docker container's keep-alive.
+    """
+
+    def reset(self, container):
+        shutil.rmtree(container.work_dir)
+
+
+def test_container_reused_by_its_owner(tmp_path):
+    pool = ContainerPool(runner=LocalRunner(), size=1, work_dir=str(tmp_path))
+    assert pool.run("alice", "open('f', 'w').write('x')") == (0, "")
+    assert pool.run("alice", "import os; print(os.listdir('.'))") == (0, "['f']\n")
+    pool.close()
+
+
+def test_container_reset_between_owners(tmp_path):
+    pool = ContainerPool(runner=LocalRunner(), size=1, work_dir=str(tmp_path))
+    pool.run("alice", "open('f', 'w').write('x')")
+    assert pool.run("bob", "import os; print(os.listdir('.'))") == (0, "[]\n")
+    pool.close()
+
+
+def test_container_dead_after_reset_is_replaced(tmp_path):
+    pool = ContainerPool(runner=ResetKillsRunner(), size=1, work_dir=str(tmp_path))
+    pool.run("alice", "print(1)")
+    assert pool.run("bob", "print(2)") == (0, "2\n")
+    assert len(os.listdir(pool.work_dir)) == 1
+    pool.close()
+
+
+class BrokenRunner(LocalRunner):
+    """
+    A runner whose health check and exec fail, like a missing docker CLI.
+    """
+
+    def __init__(self):
+        self.broken = False
+
+    def alive(self, container):
+        if self.broken:
+            raise OSError("docker: not found")
+        return super().alive(container)
+
+    def exec(self, container, command, stdin, timeout):
+        if self.broken:
+            raise OSError("docker: not found")
+        return super().exec(container, command, stdin, timeout)
+
+
+def test_runner_failures_do_not_shrink_the_pool(tmp_path):
+    runner = BrokenRunner()
+    pool = ContainerPool(runner=runner, size=1, work_dir=str(tmp_path))
+    pool.run("alice", "print(1)")
+
+    runner.broken = True
+    with pytest.raises(OSError):
+        pool.run("bob", "print(2)")
+    runner.broken = False
+
+    assert pool.run("alice", "print(3)") == (0, "3\n")
+    assert pool._counts == {pool.image: 1}
+    assert len(os.listdir(pool.work_dir)) == 1
+    pool.close()
+
+
+def test_code_block_languages_run_in_their_own_images(tmp_path):
+    pool = ContainerPool(
+        runner=LocalRunner(), size=1, image="python:3-slim", work_dir=str(tmp_path)
+    )
+    assert pool.image_for("JavaScript") == LANGUAGE_IMAGES["javascript"]
+    assert pool.image_for("r") == LANGUAGE_IMAGES["r"]
+    assert pool.image_for("python") == "python:3-slim"
+    assert pool.run("alice", "x", lang="cobol") == (1, "unknown language cobol")
+    pool.close()
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_javascript_code_block(tmp_path):
+    pool = ContainerPool(runner=LocalRunner(), size=1, work_dir=str(tmp_path))
+    assert pool.run("alice", "console.log(6 * 7)", lang="javascript") == (0, "42\n")
+    pool.close()
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from files.intent_classifier import (
+    INTENT_EXAMPLES,
+    LinearIntentClassifier,
+    examples_fingerprint,
+    load_or_train,
+)
+
+
+class BagOfWords:
+    """
+    Enough of a spaCy pipeline for load_or_train: hashed word counts as
+    document vectors.
+    """
+
+    def __init__(self, version="1.0", size=64):
+        self.meta = {"name": "bag_of_words", "version": version}
+        self.size = size
+        self.parsed = 0
+
+    def vector(self, text):
+        vector = np.zeros(self.size)
+        for word in text.lower().split():
+            vector[sum(map(ord, word)) % self.size] += 1
+        return vector
+
+    def pipe(self, texts):
+        for text in texts:
+            self.parsed += 1
+            yield SimpleNamespace(vector=self.vector(text))
+
+
+def training_data(nlp):
+    texts = [text for texts in INTENT_EXAMPLES.values() for text in texts]
+    labels = [label for label, texts in INTENT_EXAMPLES.items() for _ in texts]
+    return np.array([nlp.vector(text) for text in texts]), labels
+
+
+def test_classifier_fits_its_examples():
+    nlp = BagOfWords()
+    vectors, labels = training_data(nlp)
+    classifier = LinearIntentClassifier.train(vectors, labels)
+
+    predicted = [classifier.predict(vector)[0] for vector in vectors]
+    accuracy = np.mean([p == label for p, label in zip(predicted, labels)])
+    assert accuracy > 0.9
+    assert classifier.labels == sorted(INTENT_EXAMPLES)
+
+    probabilities = classifier.predict_proba(vectors)
+    assert probabilities.shape == (len(labels), len(INTENT_EXAMPLES))
+    assert np.allclose(probabilities.sum(axis=1), 1)
+    label, confidence = classifier.predict(vectors[0])
+    assert confidence == pytest.approx(probabilities[0].max())
+
+
+def test_saved_classifier_loads_only_with_its_fingerprint(tmp_path):
+    nlp = BagOfWords()
+    vectors, labels = training_data(nlp)
+    classifier = LinearIntentClassifier.train(vectors, labels)
+    path = str(tmp_path / "intent.npz")
+    classifier.save(path, "abc")
+
+    loaded = LinearIntentClassifier.load(path, "abc")
+    assert loaded.labels == classifier.labels
+    assert np.allclose(loaded.predict_proba(vectors), classifier.predict_proba(vectors))
+    assert LinearIntentClassifier.load(path, "other") is None
+    assert LinearIntentClassifier.load(str(tmp_path / "missing.npz"), "abc") is None
+
+
+def test_fingerprint_changes_with_the_examples_and_the_model():
+    fingerprint = examples_fingerprint("model-1", INTENT_EXAMPLES)
+    assert examples_fingerprint("model-1", INTENT_EXAMPLES) == fingerprint
+    assert examples_fingerprint("model-2", INTENT_EXAMPLES) != fingerprint
+    changed = {**INTENT_EXAMPLES, "web_search": INTENT_EXAMPLES["web_search"] + ["search"]}
+    assert examples_fingerprint("model-1", changed) != fingerprint
+
+
+def test_load_or_train_caches_until_the_model_changes(tmp_path):
+    path = str(tmp_path / "intent.npz")
+    nlp = BagOfWords()
+    first = load_or_train(nlp, path)
+    assert nlp.parsed == sum(len(texts) for texts in INTENT_EXAMPLES.values())
+
+    cached = BagOfWords()
+    second = load_or_train(cached, path)
+    assert cached.parsed == 0
+    assert np.allclose(second.weights, first.weights)
+
+    upgraded = BagOfWords(version="2.0")
+    load_or_train(upgraded, path)
+    assert upgraded.parsed > 0
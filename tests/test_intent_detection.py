@@ -0,0 +1,17 @@
+import files.brain
+import files.julie_intent_detection as intent_detection
+
+
+def test_local_intent_cache_leaves_the_memory_backend_alone(monkeypatch):
+    def no_memory():
+        raise AssertionError("the memory backend was opened")
+
+    monkeypatch.delenv("JULIE_SHARED_INTENT_CACHE", raising=False)
+    monkeypatch.setattr(intent_detection, "_intent_cache", None)
+    monkeypatch.setattr(files.brain, "LongTermMemory", no_memory)
+
+    cache = intent_detection.get_intent_cache()
+
+    assert cache.redis_client is None
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
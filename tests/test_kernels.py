@@ -0,0 +1,81 @@
+import shutil
+
+import pytest
+
+from files.kernels import KERNEL_COMMANDS, Kernel, KernelManager
+
+
+@pytest.fixture
+def manager():
+    manager = KernelManager(timeout=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_shell_state_persists_between_calls(manager):
+    assert manager.run("s1", "sh", "x=41; cd /tmp") == ""
+    assert manager.run("s1", "sh", "echo $((x + 1)); pwd") == "42\n/tmp"
+
+
+def test_errors_report_the_exit_status(manager):
+    output = manager.run("s1", "sh", "echo before; ls /no/such/path")
+
+    assert output.startswith("before\n")
+    assert output.endswith("[exit status 2]")
+    assert manager.run("s1", "sh", "echo still here") == "still here"
+
+
+def test_sessions_do_not_share_kernels(manager):
+    manager.run("s1", "sh", "x=1")
+
+    assert manager.run("s2", "sh", 'echo "[$x]"') == "[]"
+
+
+def test_a_timed_out_kernel_restarts_without_its_state(manager):
+    manager.run("s1", "sh", "x=1")
+    output = manager.run("s1", "sh", "echo started; sleep 30")
+
+    assert output == "started\n[timed out after 2s, kernel restarted]"
+    assert manager.run("s1", "sh", 'echo "[$x]"') == "[]"
+
+
+def test_an_exited_kernel_restarts(manager):
+    manager.run("s1", "sh", "x=1")
+    pid = manager.get("s1", "sh").process.pid
+
+    assert manager.run("s1", "sh", "exit 7") == "[kernel exited with 7 and was restarted]"
+    assert manager.run("s1", "sh", 'echo "[$x]"') == "[]"
+    assert manager.get("s1", "sh").process.pid != pid
+
+
+def test_shutdown_stops_only_that_session(manager):
+    manager.run("s1", "sh", "true")
+    manager.run("s2", "sh", "true")
+    s2 = manager.get("s2", "sh")
+
+    manager.shutdown("s1")
+
+    assert not manager.get("s1", "sh").alive
+    assert s2.alive
+
+
+def test_output_is_truncated():
+    kernel = Kernel("sh", KERNEL_COMMANDS["sh"], timeout=5)
+    kernel.max_output = 1024
+    try:
+        output = kernel.run("yes | head -c 100000; echo done")
+        assert output.endswith("[output truncated]")
+        assert len(output) < 2 * 1024
+        assert kernel.run("echo next") == "next"
+    finally:
+        kernel.stop()
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_javascript_state_persists(manager):
+    manager.run("s1", "javascript", "var total = 40;")
+
+    assert manager.run("s1", "javascript", "console.log(total + 2)") == "42"
+    assert manager.run("s1", "javascript", "missing()") == (
+        "ReferenceError: missing is not defined\n[exit status 1]"
+    )
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+from files.brain import AsyncLongTermMemory, LongTermMemory, chatbot_role_updates
+from files.memory_backends import InMemoryBackend, RedisBackend, SQLiteBackend
+from files.memory_codec import decode_value, encode_value
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryBackend()
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "memory.db"))
+    fakeredis = pytest.importorskip("fakeredis")
+    backend = RedisBackend("localhost", 6379)
+    backend._client = fakeredis.FakeRedis()
+    return backend
+
+
+def test_list_update_on_a_missing_key_does_nothing(backend):
+    backend.list_update("chat:nobody", lambda values: {})
+    assert backend.list_length("chat:nobody") == 0
+
+
+def test_role_rewrite_survives_a_concurrent_commit(backend):
+    key = "chat:alice"
+    messages = [{"role": "user", "content": "hi"}, {"role": "chatbot", "content": "Nya~"}]
+    backend.append(key, [encode_value(m) for m in messages], 100)
+    late = {"role": "user", "content": "are you there?"}
+    committers = []
+
+    def update(values):
+        # A turn committed after the read shifts every index by one
+        if not committers:
+            committer = threading.Thread(
+                target=backend.append, args=(key, [encode_value(late)], 100)
+            )
+            committers.append(committer)
+            committer.start()
+            committer.join(0.2)
+        return chatbot_role_updates(values)
+
+    backend.list_update(key, update)
+    committers[0].join()
+
+    history = [decode_value(v) for v in reversed(backend.list_range(key, 0, -1))]
+    assert history == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "Nya~"},
+        late,
+    ]
+
+
+def test_recompress_keeps_a_turn_committed_meanwhile(backend, monkeypatch):
+    monkeypatch.setattr(LongTermMemory, "_instance", None)
+    monkeypatch.setenv("JULIE_MEMORY_CODEC", "json")
+    memory = LongTermMemory(backend=backend)
+    long = "a message long enough for compression to pay off " * 4
+    memory.commit_turn("alice", [{"role": "user", "content": long}], profile={"bio": long})
+    monkeypatch.setenv("JULIE_MEMORY_CODEC", "zlib")
+    late = {"role": "assistant", "content": "committed during the rewrite"}
+    list_update = backend.list_update
+    committers = []
+
+    def racing_list_update(key, update):
+        def racing_update(values):
+            if not committers:
+                committer = threading.Thread(target=memory.commit_turn, args=("alice", [late]))
+                committers.append(committer)
+                committer.start()
+                committer.join(0.2)
+            return update(values)
+        return list_update(key, racing_update)
+
+    monkeypatch.setattr(backend, "list_update", racing_list_update)
+    assert memory.recompress("alice") == 2
+    committers[0].join()
+
+    assert memory.get_user_data("alice")["conversation_history"] == [
+        {"role": "user", "content": long},
+        late,
+    ]
+    assert memory.get_user_data("alice")["bio"] == long
+    assert all(v[:1] == b"\x01" for v in backend.list_range("chat:alice", 1, 1))
+    assert memory.recompress("alice") == 0
+
+
+def test_async_memory_goes_through_the_backend(monkeypatch):
+    monkeypatch.setattr(LongTermMemory, "_instance", None)
+    monkeypatch.setattr(AsyncLongTermMemory, "_instance", None)
+    memory = LongTermMemory(backend=InMemoryBackend())
+    memory.update_summaries("alice", {"L0:0": "Alice likes cats."})
+
+    async def scenario():
+        async_memory = AsyncLongTermMemory()
+        await async_memory.commit_turn("alice", [{"role": "chatbot", "content": "Nya~"}])
+        await async_memory.update_role_in_data("alice")
+        data = await async_memory.get_user_data("alice")
+        await async_memory.set_user_data("alice", data)
+        return await async_memory.get_recent_messages("alice", 5)
+
+    assert asyncio.run(scenario()) == [{"role": "assistant", "content": "Nya~"}]
+    assert memory.get_summaries("alice") == {"L0:0": "Alice likes cats.", "total": 1}
@@ -0,0 +1,16 @@
+import hashlib
+
+from files.memory_codec import SHARED_DICTIONARY_V1, decode_value, encode_value
+
+
+def test_shared_dictionary_v1_is_frozen():
+    # Every stored V1 value depends on these exact bytes
+    digest = hashlib.sha256(SHARED_DICTIONARY_V1).hexdigest()
+    assert digest == "a1ad962569e81cb9537963408f1d2db5fcb0ea846345c86a0eeea0d630f153ad"
+
+
+def test_zlib_round_trip():
+    message = {"role": "assistant", "content": "Nya~ " * 40}
+    encoded = encode_value(message, codec="zlib")
+    assert encoded[:1] == b"\x01"
+    assert decode_value(encoded) == message
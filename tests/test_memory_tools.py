@@ -0,0 +1,31 @@
+import pytest
+
+click_testing = pytest.importorskip("click.testing")
+
+from files.brain import LongTermMemory
+from files.memory_backends import InMemoryBackend
+from files.memory_tools import reindex
+from files.retrieval_index import RetrievalIndex
+
+
+def test_reindex_keeps_messages_trimmed_from_the_history(monkeypatch, tmp_path):
+    monkeypatch.setattr(LongTermMemory, "_instance", None)
+    monkeypatch.setattr(LongTermMemory, "max_history", 2)
+    monkeypatch.setenv("JULIE_RETRIEVAL", "1")
+    monkeypatch.setenv("JULIE_RETRIEVAL_PATH", str(tmp_path))
+    memory = LongTermMemory(backend=InMemoryBackend())
+    index = RetrievalIndex(str(tmp_path))
+    for i in range(4):
+        message = {"role": "user", "content": f"message number {i}"}
+        memory.commit_turn("alice", [message])
+        if i < 3:
+            index.add("alice", [message])
+
+    result = click_testing.CliRunner().invoke(reindex, ["alice"])
+
+    assert result.exit_code == 0, result.output
+    assert index.indexed_count("alice") == 4
+    assert index.get_messages("alice", [0, 3]) == {
+        0: {"role": "user", "content": "message number 0"},
+        3: {"role": "user", "content": "message number 3"},
+    }
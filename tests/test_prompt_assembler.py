@@ -0,0 +1,86 @@
+from files.prompt_assembler import TOKENS_PER_MESSAGE, PromptAssembler
+
+
+def history(n):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message number {i}"}
+        for i in range(n)
+    ]
+
+
+def test_the_message_stays_within_the_budget():
+    assembler = PromptAssembler(budget=200)
+    result = assembler.assemble(
+        "What did I say first?",
+        history(100),
+        [("profile", "Alice likes cats."), ("summaries", "They talked about cats.")],
+    )
+
+    breakdown = result.breakdown
+    assert breakdown["total"] <= 200
+    assert breakdown["total"] == sum(
+        breakdown[name] for name in ("prompt", "profile", "summaries", "history")
+    )
+    assert 0 < breakdown["history_messages"] < 100
+
+
+def test_history_is_the_newest_messages_oldest_first():
+    assembler = PromptAssembler(budget=200)
+    result = assembler.assemble("Hi", history(100))
+
+    kept = result.breakdown["history_messages"]
+    lines = result.message.split("\n\n")[0].splitlines()
+    assert lines[0] == "Conversation so far:"
+    assert lines[1:] == [
+        f"{m['role']}: {m['content']}" for m in history(100)[-kept:]
+    ]
+    assert result.message.endswith("\n\nHi")
+
+
+def test_sections_keep_their_priority_order_and_are_never_cut():
+    assembler = PromptAssembler(budget=200, history_share=0)
+    big = "word " * 250
+    result = assembler.assemble(
+        "Hi", [], [("profile", "Alice likes cats."), ("recall", big), ("summaries", "Short.")]
+    )
+
+    assert result.breakdown["recall"] == 0
+    assert "word" not in result.message
+    assert result.message == "Alice likes cats.\n\nShort.\n\nHi"
+
+
+def test_sections_leave_the_history_reserve():
+    assembler = PromptAssembler(budget=200, history_share=0.5)
+    # Fits the budget, but not alongside the reserved half
+    section = "word " * 80
+    assert assembler.count(section) + assembler.count("Hi") < 200
+    assert assembler.count(section) > 200 - assembler.history_reserve
+
+    result = assembler.assemble("Hi", history(100), [("recall", section)])
+
+    assert result.breakdown["recall"] == 0
+    assert result.breakdown["history_messages"] > assembler.verbatim_count(history(100))
+
+
+def test_verbatim_count_fits_the_reserve():
+    assembler = PromptAssembler(budget=200)
+    messages = history(100)
+    count = assembler.verbatim_count(messages)
+
+    cost = sum(
+        assembler.count(f"{m['role']}: {m['content']}") + TOKENS_PER_MESSAGE
+        for m in messages[-count:]
+    )
+    assert cost <= assembler.history_reserve
+    assert assembler.verbatim_count(messages[-count:]) == count
+    assert assembler.verbatim_count([]) == 0
+
+
+def test_the_prompt_is_always_included():
+    assembler = PromptAssembler(budget=10)
+    prompt = "a prompt far longer than the whole budget " * 10
+    result = assembler.assemble(prompt, history(10), [("profile", "Alice.")])
+
+    assert result.message == prompt
+    assert result.breakdown["history_messages"] == 0
+    assert result.breakdown["profile"] == 0
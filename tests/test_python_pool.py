@@ -0,0 +1,77 @@
+import pytest
+
+from files.python_pool import PythonWorkerPool
+
+
+@pytest.fixture
+def pool():
+    pool = PythonWorkerPool(size=1, timeout=5, cpu_limit=1, memory_limit_mb=256, max_runs=3)
+    yield pool
+    pool.close()
+
+
+def worker_pid(pool):
+    return int(pool.run("import os; os.getpid()").result)
+
+
+def test_cells_capture_output_and_the_last_expression(pool):
+    result = pool.run("import sys\nprint('out')\nprint('err', file=sys.stderr)\n6 * 7")
+
+    assert (result.stdout, result.stderr, result.result, result.error) == ("out\n", "err\n", "42", None)
+    assert str(result) == "out\nerr\n42"
+
+
+def test_cells_do_not_share_a_namespace(pool):
+    pool.run("secret = 1")
+    result = pool.run("secret")
+
+    assert "NameError" in result.error
+    assert "python_pool" not in result.error
+
+
+def test_cpu_limit_stops_a_busy_cell(pool):
+    pid = worker_pid(pool)
+    result = pool.run("while True:\n    pass")
+
+    assert result.error == "CPU time limit of 1s exceeded"
+    # The worker survives and gets its CPU time back for the next cell
+    assert worker_pid(pool) == pid
+    assert pool.run("sum(range(10))").result == "45"
+
+
+def test_memory_limit_stops_a_large_allocation(pool):
+    result = pool.run("block = bytearray(1024 * 1024 * 1024)")
+
+    assert result.error == "MemoryError: memory limit exceeded"
+    assert pool.run("1 + 1").result == "2"
+
+
+def test_a_timed_out_worker_is_replaced(pool):
+    pool.timeout = 0.5
+    pid = worker_pid(pool)
+    result = pool.run("import time; time.sleep(30)")
+
+    assert result.error == "Timed out after 0.5s"
+    assert worker_pid(pool) != pid
+
+
+def test_a_dead_worker_is_replaced(pool):
+    pid = worker_pid(pool)
+    result = pool.run("import os; os._exit(3)")
+
+    assert result.error == "Python worker exited with 3"
+    assert worker_pid(pool) != pid
+
+
+def test_workers_are_recycled_after_max_runs(pool):
+    pids = [worker_pid(pool) for _ in range(4)]
+
+    assert pids[0] == pids[1] == pids[2]
+    assert pids[3] != pids[2]
+
+
+def test_a_closed_pool_refuses_cells(pool):
+    pool.close()
+
+    with pytest.raises(RuntimeError):
+        pool.run("1")
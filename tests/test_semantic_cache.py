@@ -0,0 +1,84 @@
+import numpy as np
+
+from files.semantic_cache import HashingEmbedder, SemanticCache
+
+
+def make_cache(**kwargs):
+    return SemanticCache(embedder=HashingEmbedder(), **kwargs)
+
+
+def test_hashing_embedder_returns_unit_vectors():
+    vectors = HashingEmbedder(dim=64)(["What is the capital of France?", ""])
+
+    assert vectors.shape == (2, 64)
+    assert vectors.dtype == np.float32
+    assert np.isclose(np.linalg.norm(vectors[0]), 1)
+    assert not vectors[1].any()
+
+
+def test_near_identical_prompts_hit_and_different_ones_miss():
+    cache = make_cache()
+    cache.store("alice", "What is the capital of France?", "Paris.")
+
+    assert cache.lookup("alice", "what is the capital of france") == "Paris."
+    assert cache.lookup("alice", "Tell me a joke about cats") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_the_most_similar_prompt_wins():
+    cache = make_cache(threshold=0.5)
+    cache.store("alice", "What is the capital of France?", "Paris.")
+    cache.store("alice", "What is the capital of Spain?", "Madrid.")
+
+    assert cache.lookup("alice", "what is the capital of spain") == "Madrid."
+
+
+def test_entries_are_scoped_per_user():
+    cache = make_cache()
+    cache.store("alice", "What is my name?", "Alice.")
+
+    assert cache.lookup("bob", "What is my name?") is None
+
+
+def test_entries_go_stale_after_max_turn_drift():
+    cache = make_cache(max_turn_drift=2)
+    cache.store("alice", "What is my name?", "Alice.")
+    cache.record_turn("alice")
+    cache.record_turn("alice")
+    assert cache.lookup("alice", "What is my name?") == "Alice."
+
+    cache.record_turn("alice")
+    assert cache.lookup("alice", "What is my name?") is None
+    assert len(cache._indexes["alice"]) == 0
+
+
+def test_oldest_entries_are_dropped_beyond_the_limit():
+    cache = make_cache(max_entries_per_user=2)
+    cache.store("alice", "first question about gardening", "one")
+    cache.store("alice", "second question about cooking", "two")
+    cache.store("alice", "third question about sailing", "three")
+
+    assert cache._indexes["alice"].responses == ["two", "three"]
+    assert cache.lookup("alice", "first question about gardening") is None
+    assert cache.lookup("alice", "third question about sailing") == "three"
+
+
+def test_the_index_grows_past_its_capacity():
+    cache = make_cache()
+    for i in range(100):
+        cache.store("alice", f"question number {i} about topic {i * 7}", str(i))
+
+    assert len(cache._indexes["alice"]) == 100
+    assert cache.lookup("alice", "question number 3 about topic 21") == "3"
+    assert cache.lookup("alice", "question number 97 about topic 679") == "97"
+
+
+def test_invalidate_user_drops_their_entries():
+    cache = make_cache()
+    cache.store("alice", "What is my name?", "Alice.")
+    cache.store("bob", "What is my name?", "Bob.")
+
+    cache.invalidate_user("alice")
+
+    assert cache.lookup("alice", "What is my name?") is None
+    assert cache.lookup("bob", "What is my name?") == "Bob."
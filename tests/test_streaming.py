@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from files.streaming import stream_chat_completion
+
+
+def fake_acreate(calls):
+    async def acreate(**params):
+        calls.append(params)
+
+        async def chunks():
+            for text in ("Nya", "~"):
+                yield {"choices": [{"delta": {"content": text}}]}
+
+        return chunks()
+
+    return acreate
+
+
+async def collect(messages, llm_config, **kwargs):
+    return [chunk async for chunk in stream_chat_completion(messages, llm_config, **kwargs)]
+
+
+def test_streams_with_the_whole_config_entry(monkeypatch):
+    calls = []
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", fake_acreate(calls))
+    config = {
+        "model": "gpt-4",
+        "engine": "julie-gpt4",
+        "api_key": "key",
+        "api_base": "https://example.openai.azure.com",
+        "api_type": "azure",
+        "api_version": "2023-08-01-preview",
+    }
+
+    chunks = asyncio.run(collect([{"role": "user", "content": "hi"}], {"config_list": [config]}))
+
+    assert chunks == ["Nya", "~"]
+    assert {k: calls[0][k] for k in config} == config
+    assert "max_tokens" not in calls[0]
@@ -0,0 +1,67 @@
+import pytest
+
+from files.brain import LongTermMemory
+from files.memory_backends import InMemoryBackend
+from files.prompt_assembler import PromptAssembler
+from files.summarizer import ConversationSummarizer, LocalSummaryModel
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    monkeypatch.setattr(LongTermMemory, "_instance", None)
+    return LongTermMemory(backend=InMemoryBackend())
+
+
+def turns(memory, username, count, start=0):
+    for i in range(start, start + count):
+        memory.commit_turn(username, [{"role": "user", "content": f"Message {i}."}])
+
+
+def test_rewrite_keeps_summaries(memory):
+    summarizer = ConversationSummarizer(memory=memory, chunk_size=2, keep_recent=2)
+    turns(memory, "alice", 6)
+    assert summarizer.refresh("alice") == 2
+
+    memory.set_user_data("alice", memory.get_user_data("alice"))
+
+    state = memory.get_summaries("alice")
+    assert state["total"] == 6
+    assert state["summarized"] == 4
+    assert "L0:0" in state
+
+
+def test_refresh_keeps_chunks_done_before_a_commit(memory):
+    class CommittingModel(LocalSummaryModel):
+        # Commits a turn while the first chunk is being summarised
+        calls = 0
+
+        def __call__(self, instruction, text):
+            self.calls += 1
+            if self.calls == 1:
+                turns(memory, "alice", 1, start=100)
+            return super().__call__(instruction, text)
+
+    summarizer = ConversationSummarizer(
+        model=CommittingModel(), memory=memory, chunk_size=2, keep_recent=2
+    )
+    turns(memory, "alice", 6)
+
+    assert summarizer.refresh("alice") == 2
+    state = memory.get_summaries("alice")
+    assert state["summarized"] == 4
+    assert state["L0:0"] == "user: Message 0. user: Message 1."
+    assert state["L0:1"] == "user: Message 2. user: Message 3."
+
+
+def test_summaries_reach_the_history_the_prompt_carries(memory):
+    assembler = PromptAssembler(budget=60)
+    summarizer = ConversationSummarizer(
+        memory=memory, chunk_size=4, keep_recent=200, assembler=assembler
+    )
+    turns(memory, "alice", 20)
+    verbatim = assembler.verbatim_count(memory.get_recent_messages("alice", 200))
+    assert 0 < verbatim < 20
+
+    summarizer.refresh("alice")
+
+    assert memory.get_summaries("alice")["summarized"] >= 20 - verbatim
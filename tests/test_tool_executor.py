@@ -0,0 +1,62 @@
+import threading
+import time
+
+from files.tool_executor import ToolExecutor, executed_function_map
+
+
+def test_results_keep_the_order_of_the_calls():
+    executor = ToolExecutor(max_workers=4, per_user=4, timeout=5)
+    calls = [
+        ("sleep", lambda delay=delay: time.sleep(delay) or delay, {})
+        for delay in (0.2, 0.0, 0.1)
+    ]
+
+    assert executor.run_all("alice", calls) == [0.2, 0.0, 0.1]
+    executor.shutdown()
+
+
+def test_calls_in_flight_are_capped_per_user():
+    executor = ToolExecutor(max_workers=8, per_user=2, timeout=5)
+    lock = threading.Lock()
+    running = {"alice": 0, "bob": 0}
+    peak = {"alice": 0, "bob": 0}
+
+    def tool(user):
+        with lock:
+            running[user] += 1
+            peak[user] = max(peak[user], running[user])
+        time.sleep(0.05)
+        with lock:
+            running[user] -= 1
+        return user
+
+    bob = threading.Thread(
+        target=executor.run_all, args=("bob", [("tool", tool, {"user": "bob"})] * 4)
+    )
+    bob.start()
+    assert executor.run_all("alice", [("tool", tool, {"user": "alice"})] * 6) == ["alice"] * 6
+    bob.join()
+
+    assert peak == {"alice": 2, "bob": 2}
+    assert executor._slots == {}
+    executor.shutdown()
+
+
+def test_hung_tool_times_out_without_blocking_later_calls_for_ever():
+    executor = ToolExecutor(max_workers=2, per_user=1, timeout=0.2)
+    release = threading.Event()
+    functions = executed_function_map(
+        {"hang": lambda: release.wait(), "echo": lambda text: text}, "alice", executor
+    )
+
+    assert functions["hang"]() == "hang timed out after 0.2s"
+    # The hung call still holds alice's only slot
+    assert functions["echo"](text="hi") == "echo timed out after 0.2s"
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while executor._slots and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert executor._slots == {}
+    assert functions["echo"](text="hi") == "hi"
+    executor.shutdown()
@@ -0,0 +1,50 @@
+import random
+
+from files.trie import KeywordAutomaton, language_keywords
+
+
+def naive_scores(keywords_by_label, text):
+    text = text.lower()
+    scores = dict.fromkeys(keywords_by_label, 0)
+    for label, keywords in keywords_by_label.items():
+        for keyword in keywords:
+            keyword = keyword.lower()
+            scores[label] += sum(
+                text.startswith(keyword, i) for i in range(len(text))
+            )
+    return scores
+
+
+def test_overlapping_keywords_are_all_counted():
+    automaton = KeywordAutomaton({"a": ["aba"], "b": ["ab", "b", "bab"]})
+    assert automaton.scores("ababab") == {"a": 2, "b": 8}
+
+
+def test_match_starting_inside_a_failed_partial_match():
+    automaton = KeywordAutomaton({"x": ["aab"]})
+    assert automaton.scores("aaab") == {"x": 1}
+
+
+def test_keywords_match_inside_words():
+    automaton = KeywordAutomaton({"shell": ["ls"], "python": ["def"]})
+    assert automaton.scores("else: undefined") == {"shell": 1, "python": 1}
+    assert automaton.scores("ELSE") == {"shell": 1, "python": 0}
+
+
+def test_weights():
+    automaton = KeywordAutomaton({"r": [("<-", 3), "print"]})
+    assert automaton.scores("x <- 1; y <- 2; print(x)") == {"r": 7}
+
+
+def test_counts_match_a_naive_scan():
+    automaton = KeywordAutomaton(language_keywords)
+    rng = random.Random(0)
+    alphabet = "abcdefilnoprstuvx<>-#!/ \n"
+    samples = [
+        "def main():\n    import os\n    print('hi')\n    return 0",
+        "#!/bin/bash\necho hi; ls -la; cd /tmp; mkdir x",
+        "tell application \"Finder\" to get name\nend tell",
+        "x <- c(1, 2); library(ggplot2); print(x)",
+    ] + ["".join(rng.choice(alphabet) for _ in range(300)) for _ in range(50)]
+    for text in samples:
+        assert automaton.scores(text) == naive_scores(language_keywords, text)